@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import os
+import time
+from utils import search
+from utils.archive import _from_row
+from utils.database import Database
+from utils.migrations import run_migrations
+from utils.ticket_archive import read_archive
+
+# Adds tickets closed before full-text search existed to the /search index.
+# Sources, per ticket not yet in search_indexed: its structured archive
+# (ticket_archives) if it has one, otherwise the live message archive
+# (archived_messages) of its channel. Tickets with neither are skipped; this
+# tool never calls Discord. Progress is committed per ticket, so it can be
+# stopped and re-run at any time, including while the bot is running.
+
+BATCH = 100
+
+async def archived_tickets(db: Database) -> int:
+    count = 0
+    while True:
+        rows = await db.fetchall(
+            "SELECT ticket_id, guild_id, panel_id, owner_id, data FROM ticket_archives WHERE ticket_id NOT IN (SELECT ticket_id FROM search_indexed) ORDER BY ticket_id LIMIT ?",
+            (BATCH,),
+        )
+        for row in rows:
+            ticket = dict(row)
+            _, records = read_archive(ticket.pop("data"))
+            await db.transaction(search.replace_ticket, ticket, [r for record in records if (r := search.index_row(ticket, record))])
+            count += 1
+        if len(rows) < BATCH:
+            return count
+
+async def live_tickets(db: Database) -> int:
+    count, last_id = 0, 0
+    while True:
+        tickets = await db.fetchall(
+            """
+            SELECT ticket_id, guild_id, panel_id, owner_id, channel_id FROM tickets
+            WHERE status = 'closed' AND channel_id != 0 AND ticket_id > ?
+              AND ticket_id NOT IN (SELECT ticket_id FROM search_indexed)
+              AND ticket_id NOT IN (SELECT ticket_id FROM ticket_archives)
+            ORDER BY ticket_id LIMIT ?
+            """,
+            (last_id, BATCH),
+        )
+        for ticket in map(dict, tickets):
+            messages = await db.fetchall("SELECT * FROM archived_messages WHERE channel_id = ? AND deleted = 0 ORDER BY message_id", (ticket["channel_id"],))
+            if messages:
+                await db.transaction(search.replace_ticket, ticket, [r for row in messages if (r := search.index_row(ticket, _from_row(row)))])
+                count += 1
+        if len(tickets) < BATCH:
+            return count
+        last_id = tickets[-1]["ticket_id"]
+
+async def main():
+    parser = argparse.ArgumentParser(description="Add existing closed tickets to the /search index.")
+    parser.add_argument("--db", default=os.path.join("db", "database.sqlite"))
+    parser.add_argument("--rebuild", action="store_true", help="drop the index and build it again from scratch")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    await db.connect()
+    try:
+        await run_migrations(db)
+        if args.rebuild:
+            def clear(conn):
+                conn.execute("DELETE FROM ticket_search")
+                conn.execute("DELETE FROM search_indexed")
+            await db.transaction(clear)
+        start = time.perf_counter()
+        archived = await archived_tickets(db)
+        live = await live_tickets(db)
+        # Merge the index's segments; fewer segments make queries faster.
+        await db.execute("INSERT INTO ticket_search (ticket_search) VALUES ('optimize')")
+        print(f"Indexed {archived} archived and {live} other closed tickets in {time.perf_counter() - start:.1f}s")
+    finally:
+        await db.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
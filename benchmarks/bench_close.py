@@ -0,0 +1,196 @@
+"""Latency and REST calls of closing and re-opening tickets.
+
+Usage: python -m benchmarks.bench_close [--tickets 200] [--latency 0.05] [--concurrency 20]
+
+Opens --tickets tickets through the real cogs, then closes and re-opens all of
+them with the Close and Re-Open buttons, --concurrency at a time, with every
+fake REST call taking --latency seconds. The same is done with the serial
+flow the cogs used before (rename, then the owner's overwrite, then the status
+message, each waiting for the last). Both flows make the same three calls per
+ticket; the cogs make them at the same time. Prints per flow the latency
+percentiles and the REST calls per ticket by route. Finally closes tickets in a guild where
+channel edits fail, and checks every close was rolled back: the ticket is
+still open, its message was put back and no transcript job was queued. Last,
+presses Delete on closed tickets before their transcript jobs have run, and
+checks every transcript was still uploaded before its channel went.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+import discord
+from benchmarks.fakes import FakeBot, FakeGuild, FakeHTTP, FakeInteraction, FakeInteractionMessage
+from cogs.ticket_commands import TicketCommands
+from cogs.ticket_system import TicketSystem
+from utils.database import Database
+from utils.migrations import run_migrations
+
+GUILD_ID = 1000
+CATEGORY_ID = 2000
+SUPPORT_ROLE_ID = 3000
+PANEL_MESSAGE_ID = 4000
+TRANSCRIPT_CHANNEL_ID = 4100
+STAFF_ID = 500
+
+# The flows as they were before the close/re-open pipeline, for comparison.
+async def serial_close(bot, interaction, closed_by):
+    ticket = await bot.cache.ticket(interaction.channel.id)
+    await bot.cache.update_ticket(interaction.channel.id, status='closed')
+    await interaction.channel.edit(name=f"closed-{ticket['ticket_num']:04d}")
+    if (owner := interaction.guild.get_member(ticket['owner_id'])):
+        await interaction.channel.set_permissions(owner, send_messages=False, read_messages=True)
+    embed = discord.Embed(title="Ticket Closed", description=f"Ticket closed by {closed_by.mention}.", color=discord.Color.red())
+    await interaction.message.edit(content=None, embed=embed, view=bot.get_cog('TicketSystem').ClosedTicketView())
+    await bot.jobs.enqueue('ticket_transcript', {'ticket_id': ticket['ticket_id']}, guild_id=interaction.guild.id)
+
+async def serial_open(bot, interaction):
+    ticket = await bot.cache.ticket(interaction.channel.id)
+    await bot.cache.update_ticket(interaction.channel.id, status='open')
+    await interaction.channel.edit(name=f"ticket-{ticket['ticket_num']:04d}")
+    if (owner := interaction.guild.get_member(ticket['owner_id'])):
+        await interaction.channel.set_permissions(owner, send_messages=True, read_messages=True)
+    embed = discord.Embed(title="Ticket Re-Opened", description=f"Ticket re-opened by {interaction.user.mention}.", color=discord.Color.green())
+    await interaction.message.edit(content=None, embed=embed, view=bot.get_cog('TicketSystem').OpenTicketView())
+
+async def setup(db: Database, http: FakeHTTP, tickets: int):
+    guild = FakeGuild(GUILD_ID, FakeHTTP())
+    guild.add_role(SUPPORT_ROLE_ID, "Support")
+    guild.add_category(CATEGORY_ID)
+    guild.add_text_channel(TRANSCRIPT_CHANNEL_ID, "transcripts")
+    bot = FakeBot(db, (guild,))
+    await bot.add_cog(TicketSystem(bot))
+    await bot.add_cog(TicketCommands(bot))
+    await bot.cache.save_panel(None, {
+        "guild_id": GUILD_ID, "panel_name": "Support", "message_id": PANEL_MESSAGE_ID, "channel_id": 1,
+        "category_id": CATEGORY_ID, "transcript_channel_id": TRANSCRIPT_CHANNEL_ID, "welcome_message": "Hello!",
+    }, [SUPPORT_ROLE_ID])
+    staff = guild.add_member(STAFF_ID, roles=(SUPPORT_ROLE_ID,))
+    for i in range(tickets):
+        owner = guild.add_member(10_000 + i)
+        await TicketSystem.CreateTicketView().create_ticket.callback(FakeInteraction(bot, owner, message=FakeInteractionMessage(PANEL_MESSAGE_ID)))
+    channels = [c for c in guild.channels.values() if getattr(c, "category_id", None) == CATEGORY_ID]
+    # Only the close and re-open calls are measured.
+    guild.http = http
+    return bot, guild, staff, channels
+
+def button(bot, staff, channel) -> FakeInteraction:
+    interaction = FakeInteraction(bot, staff, channel=channel, message=FakeInteractionMessage(channel.id + 1, channel))
+    interaction.response._done = True
+    return interaction
+
+async def timed(make, channels: list, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(channel):
+        async with semaphore:
+            start = time.perf_counter()
+            await make(channel)
+            latencies.append(time.perf_counter() - start)
+    await asyncio.gather(*(one(channel) for channel in channels))
+    return latencies
+
+def summary(latencies: list[float], http: FakeHTTP, tickets: int) -> dict:
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1),
+        "rest_per_ticket": round(http.total / tickets, 2),
+        "rest_calls": dict(http.calls),
+    }
+
+async def measure(path: str, args, flow: str) -> list[dict]:
+    db = Database(path)
+    await db.connect()
+    await run_migrations(db)
+    try:
+        bot, guild, staff, channels = await setup(db, FakeHTTP(), args.tickets)
+        commands = bot.get_cog("TicketCommands")
+        flows = {
+            "serial": (lambda c: serial_close(bot, button(bot, staff, c), staff), lambda c: serial_open(bot, button(bot, staff, c))),
+            "pipeline": (lambda c: commands.execute_close(button(bot, staff, c), staff), lambda c: commands.execute_open(button(bot, staff, c))),
+        }
+        rows = []
+        for action, make in zip(("close", "reopen"), flows[flow]):
+            guild.http = http = FakeHTTP(args.latency)
+            latencies = await timed(make, channels, args.concurrency)
+            rows.append({"flow": flow, "action": action, "tickets": len(channels), **summary(latencies, http, len(channels))})
+        return rows
+    finally:
+        await db.close()
+
+async def rollback(path: str, args) -> dict:
+    db = Database(path)
+    await db.connect()
+    await run_migrations(db)
+    try:
+        http = FakeHTTP(args.latency, failing=frozenset({"channel_edit"}))
+        bot, guild, staff, channels = await setup(db, http, min(args.tickets, 20))
+        commands = bot.get_cog("TicketCommands")
+        interactions = [button(bot, staff, c) for c in channels]
+        await asyncio.gather(*(commands.execute_close(i, staff) for i in interactions))
+        open_tickets = (await db.fetchone("SELECT COUNT(*) FROM tickets WHERE status = 'open'"))[0]
+        jobs = (await db.fetchone("SELECT COUNT(*) FROM jobs WHERE kind = 'ticket_transcript'"))[0]
+        return {
+            "flow": "pipeline", "action": "close (channel edit failing)", "tickets": len(channels),
+            "still_open": open_tickets, "transcript_jobs": jobs,
+            "messages_restored": http.calls["message_edit"] == 2 * len(channels),
+            "errors_reported": sum(any(str(sent).startswith("Could not close") for sent in i.sent) for i in interactions),
+            "rest_calls": dict(http.calls),
+        }
+    finally:
+        await db.close()
+
+async def delete_first(path: str, args) -> dict:
+    db = Database(path)
+    await db.connect()
+    await run_migrations(db)
+    try:
+        http = FakeHTTP(args.latency)
+        bot, guild, staff, channels = await setup(db, http, min(args.tickets, 20))
+        commands = bot.get_cog("TicketCommands")
+        # The job workers are not started, so every transcript job is still queued when Delete is pressed.
+        await asyncio.gather(*(commands.execute_close(button(bot, staff, c), staff) for c in channels))
+        queued = (await db.fetchone("SELECT COUNT(*) FROM jobs WHERE kind = 'ticket_transcript' AND status = 'pending'"))[0]
+        interactions = [FakeInteraction(bot, staff, channel=c) for c in channels]
+        await asyncio.gather(*(TicketSystem.ClosedTicketView().delete_ticket.callback(i) for i in interactions))
+        done = (await db.fetchone("SELECT COUNT(*) FROM jobs WHERE kind = 'ticket_transcript' AND status = 'done'"))[0]
+        try:
+            await commands.transcript_job({"channel_id": channels[0].id, "ticket_num": 1})
+            orphan_raises = False
+        except RuntimeError:
+            orphan_raises = True
+        return {
+            "flow": "pipeline", "action": "delete before transcript job", "tickets": len(channels),
+            "jobs_queued": queued, "jobs_done": done,
+            "transcripts_uploaded": len(guild.get_channel(TRANSCRIPT_CHANNEL_ID).sent),
+            "channels_deleted": sum(c.deleted for c in channels),
+            "archives_saved": (await db.fetchone("SELECT COUNT(*) FROM ticket_archives"))[0],
+            "job_for_deleted_channel_raises": orphan_raises,
+        }
+    finally:
+        await db.close()
+
+async def run(args) -> list[dict]:
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for flow in ("serial", "pipeline"):
+            rows += await measure(os.path.join(tmp, f"{flow}.db"), args, flow)
+        rows.append(await rollback(os.path.join(tmp, "rollback.db"), args))
+        rows.append(await delete_first(os.path.join(tmp, "delete.db"), args))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    for row in asyncio.run(run(args)):
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Ticket creation under concurrent button clicks.
+
+Usage: python -m benchmarks.bench_create_ticket [--users 100] [--clicks 5] [--latency 0.05] [--create-latency 0.3] [--pool 0]
+
+Fires users * clicks "Create Ticket" clicks at once through the real
+TicketSystem cog against a temporary database, with every Discord REST call
+delayed by --latency seconds. Checks that each user ends up with exactly one
+open ticket and one channel, then reports throughput for users * clicks
+distinct users clicking once each. With --pool N, the distinct-user run is
+repeated with N channels pre-created for the panel, to compare click latency
+with and without the warm channel pool.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from benchmarks.fakes import FakeBot, FakeGuild, FakeHTTP, FakeInteraction, FakeInteractionMessage
+from cogs.ticket_system import TicketSystem
+from utils.database import Database
+from utils.migrations import run_migrations
+from utils.ratelimit import ROUTE_LIMITS, RouteScheduler
+
+GUILD_ID = 1000
+CATEGORY_ID = 2000
+SUPPORT_ROLE_ID = 3000
+PANEL_MESSAGE_ID = 4000
+
+async def setup(path: str, latency: float, create_latency: float, pool: int = 0):
+    db = Database(path)
+    await db.connect()
+    await run_migrations(db)
+    guild = FakeGuild(GUILD_ID, FakeHTTP(latency, {"channel_create": create_latency}))
+    guild.add_role(SUPPORT_ROLE_ID, "Support")
+    guild.add_category(CATEGORY_ID)
+    bot = FakeBot(db, (guild,))
+    await bot.add_cog(TicketSystem(bot))
+    panel_id = await bot.cache.save_panel(None, {
+        "guild_id": GUILD_ID, "panel_name": "Support", "message_id": PANEL_MESSAGE_ID, "channel_id": 1,
+        "category_id": CATEGORY_ID, "transcript_channel_id": 1, "welcome_message": "Hello!", "pool_size": pool,
+    }, [SUPPORT_ROLE_ID])
+    if pool:
+        # Fill the pool up front, as it would be long before a launch-day rush.
+        http, guild.http = guild.http, FakeHTTP()
+        bot.pool.rest = RouteScheduler(route_limits={**ROUTE_LIMITS, "channel_create": (pool, 1)}, global_limit=(pool, 1))
+        bot.pool.refill(guild, await bot.cache.panel(panel_id))
+        await bot.pool._refills[panel_id]
+        guild.http, bot.pool.rest = http, bot.rest
+    return bot, guild
+
+async def click(bot, member, latencies: list) -> str:
+    interaction = FakeInteraction(bot, member, message=FakeInteractionMessage(PANEL_MESSAGE_ID))
+    start = time.perf_counter()
+    await TicketSystem.CreateTicketView().create_ticket.callback(interaction)
+    latencies.append(time.perf_counter() - start)
+    return interaction.sent[-1]
+
+async def run(users: int, clicks: int, latency: float, create_latency: float, pool: int = 0) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        bot, guild = await setup(os.path.join(tmp, "tickets.db"), latency, create_latency, pool)
+        members = [guild.add_member(10_000 + i) for i in range(users)]
+        start = time.perf_counter()
+        latencies = []
+        replies = await asyncio.gather(*(click(bot, m, latencies) for m in members for _ in range(clicks)))
+        elapsed = time.perf_counter() - start
+        pool_stats = dict(bot.pool.stats.get(1).__dict__) if pool else None
+        await bot.pool.close()
+        rows = await bot.db.fetchall("SELECT owner_id, COUNT(*) AS n FROM tickets WHERE status = 'open' GROUP BY owner_id")
+        nums = await bot.db.fetchall("SELECT ticket_num FROM tickets")
+        channels = sum(1 for c in guild.channels.values() if hasattr(c, "history"))
+        await bot.db.close()
+    return {
+        "clicks": users * clicks,
+        "seconds": elapsed,
+        "tickets": sum(r["n"] for r in rows),
+        "duplicates": sum(r["n"] - 1 for r in rows),
+        "channels": channels,
+        "unique_numbers": len({r["ticket_num"] for r in nums}) == len(nums),
+        "created_replies": sum(r.startswith("Your ticket has been created") for r in replies),
+        "rest_calls": dict(guild.http.calls),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": statistics.quantiles(latencies, n=20)[-1] * 1000 if len(latencies) > 1 else latencies[0] * 1000,
+        "pool": pool_stats,
+    }
+
+def report(label: str, result: dict):
+    rate = result["tickets"] / result["seconds"] if result["seconds"] else 0
+    print(f"{label}: {result['clicks']} clicks -> {result['tickets']} tickets, {result['channels']} channels, "
+          f"{result['duplicates']} duplicates, unique numbers={result['unique_numbers']} "
+          f"in {result['seconds']:.2f}s ({rate:.0f} tickets/s)")
+    print(f"  click latency p50 {result['p50_ms']:.0f}ms, p95 {result['p95_ms']:.0f}ms")
+    if result["pool"]:
+        print(f"  pool hits {result['pool']['hits']}, misses {result['pool']['misses']}")
+    print(f"  REST calls: {result['rest_calls']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--clicks", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--create-latency", type=float, default=0.3)
+    parser.add_argument("--pool", type=int, default=0)
+    args = parser.parse_args()
+
+    burst = asyncio.run(run(args.users, args.clicks, args.latency, args.create_latency))
+    report(f"{args.users} users x {args.clicks} clicks", burst)
+    assert burst["tickets"] == burst["channels"] == args.users and burst["duplicates"] == 0, "duplicate tickets created"
+    assert burst["created_replies"] == args.users * args.clicks, "coalesced clicks did not all see the created ticket"
+
+    distinct = asyncio.run(run(args.users * args.clicks, 1, args.latency, args.create_latency))
+    report(f"{args.users * args.clicks} users x 1 click", distinct)
+
+    if args.pool:
+        pooled = asyncio.run(run(args.users * args.clicks, 1, args.latency, args.create_latency, args.pool))
+        report(f"{args.users * args.clicks} users x 1 click, pool of {args.pool}", pooled)
+
+if __name__ == "__main__":
+    main()
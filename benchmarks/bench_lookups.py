@@ -0,0 +1,82 @@
+"""Lookup latency for the bot's hot queries as ticket history grows.
+
+Usage: python -m benchmarks.bench_lookups [--sizes 1000,10000,100000,1000000] [--no-index]
+
+With the migration indexes in place the per-lookup time should stay flat
+across sizes; with --no-index it grows linearly (full table scans).
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from utils.database import Database
+from utils.migrations import run_migrations
+
+PANELS_PER_GUILD = 5
+GUILDS = 200
+
+QUERIES = {
+    "ticket_by_channel": ("SELECT 1 FROM tickets WHERE channel_id = ?", lambda r, n: (10_000_000 + r.randrange(n),)),
+    "panel_roles_by_channel": ("SELECT p.support_role_ids FROM panels p JOIN tickets t ON p.panel_id = t.panel_id WHERE t.channel_id = ?", lambda r, n: (10_000_000 + r.randrange(n),)),
+    "open_ticket_for_owner": ("SELECT 1 FROM tickets WHERE owner_id = ? AND status = 'open' AND panel_id = ?", lambda r, n: (r.randrange(n // 3 + 1), r.randrange(GUILDS * PANELS_PER_GUILD) + 1)),
+    "panel_by_message": ("SELECT * FROM panels WHERE message_id = ?", lambda r, n: (500_000 + r.randrange(GUILDS * PANELS_PER_GUILD),)),
+    "panels_by_guild": ("SELECT panel_id, panel_name FROM panels WHERE guild_id = ?", lambda r, n: (r.randrange(GUILDS),)),
+}
+
+async def build(path: str, tickets: int, indexed: bool):
+    db = Database(path)
+    await db.connect()
+    await run_migrations(db)
+    await db.close()
+    conn = sqlite3.connect(path)
+    if not indexed:
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'").fetchall():
+            conn.execute(f"DROP INDEX {name}")
+    conn.executemany(
+        "INSERT INTO panels (guild_id, panel_name, message_id, channel_id, support_role_ids, category_id, transcript_channel_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((i // PANELS_PER_GUILD, f"panel-{i}", 500_000 + i, 1, "1,2,3", 1, 1) for i in range(GUILDS * PANELS_PER_GUILD)),
+    )
+    conn.executemany(
+        "INSERT INTO tickets (guild_id, panel_id, channel_id, owner_id, status, ticket_num) VALUES (?, ?, ?, ?, ?, ?)",
+        ((i % GUILDS, i % (GUILDS * PANELS_PER_GUILD) + 1, 10_000_000 + i, i // 3, "open" if i % 10 == 0 else "closed", i) for i in range(tickets)),
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+def measure(path: str, tickets: int, lookups: int) -> dict:
+    conn = sqlite3.connect(path)
+    rng = random.Random(42)
+    results = {}
+    for name, (sql, make_params) in QUERIES.items():
+        params = [make_params(rng, tickets) for _ in range(lookups)]
+        start = time.perf_counter()
+        for p in params:
+            conn.execute(sql, p).fetchall()
+        results[name] = (time.perf_counter() - start) / lookups * 1e6
+    conn.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--no-index", action="store_true", help="drop the migration indexes to compare against full scans")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    print(f"{'tickets':>10} " + " ".join(f"{name:>24}" for name in QUERIES) + "   (us/lookup)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"bench-{size}.sqlite")
+            asyncio.run(build(path, size, indexed=not args.no_index))
+            # Full scans at 1M rows are slow; keep --no-index runs bounded.
+            lookups = args.lookups if not args.no_index else max(10, args.lookups * 1000 // size)
+            results = measure(path, size, lookups)
+            print(f"{size:>10} " + " ".join(f"{results[name]:>24.1f}" for name in QUERIES))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Cost of rendering Discord markdown in transcripts against plain escaped text.
+
+Usage: python -m benchmarks.bench_markdown [--messages 20000] [--repeat 5]
+
+Two corpora: the plain conversation text of fakes.conversation_messages, and
+the same conversations with markdown in most messages (emphasis, code spans
+and fences, spoilers, quotes, links, custom emoji and user, role and channel
+mentions). For each corpus prints the best time per message of html.escape
+(the renderer before markdown support) and of markdown.render_markdown, their
+ratio, and the same for whole transcripts rendered with transcript.render_batch.
+Mention resolution runs against a guild that counts its lookups, which should
+equal the number of distinct ids mentioned, however often they appear.
+
+Finally renders adversarial messages of about 4,000 characters (unclosed
+markers repeated, deep nesting) and prints the best time for each. Any that
+takes longer than --bound milliseconds is marked as failed and the exit
+status is 1: short transcripts render on the event loop, so a single message
+must not be able to stall it.
+"""
+import argparse
+import html
+import json
+import random
+import sys
+import time
+from benchmarks.fakes import FakeTextChannel, conversation_messages
+from utils.markdown import Mentions, render_markdown
+from utils.records import record_from_message
+from utils import transcript
+from utils.transcript import render_batch
+
+USERS = [300_000_000_000_000_000 + i for i in range(20)]
+ROLES = [400_000_000_000_000_000 + i for i in range(5)]
+CHANNELS = [500_000_000_000_000_000 + i for i in range(5)]
+
+class Named:
+    def __init__(self, name: str):
+        self.name = self.display_name = name
+
+class CountingGuild:
+    def __init__(self):
+        self.lookups = 0
+
+    def _get(self, id: int, prefix: str):
+        self.lookups += 1
+        return Named(f"{prefix}{id % 1000}")
+
+    def get_member(self, id: int):
+        return self._get(id, "user")
+
+    def get_role(self, id: int):
+        return self._get(id, "role")
+
+    def get_channel(self, id: int):
+        return self._get(id, "channel")
+
+def decorate(text: str, rng: random.Random) -> str:
+    words = text.split()
+    roll = rng.random()
+    if roll < 0.15:
+        words.insert(rng.randrange(len(words) + 1), f"<@{rng.choice(USERS)}>")
+    if rng.random() < 0.25:
+        i = rng.randrange(len(words))
+        words[i] = rng.choice(("**{}**", "*{}*", "__{}__", "~~{}~~", "||{}||", "`{}`", "_{}_")).format(words[i])
+    if rng.random() < 0.05:
+        words.append(f"<:blob{rng.randrange(10)}:{600_000_000_000_000_000 + rng.randrange(10)}>")
+    if rng.random() < 0.03:
+        words.append(f"<@&{rng.choice(ROLES)}> <#{rng.choice(CHANNELS)}>")
+    if rng.random() < 0.04:
+        words.append("https://example.com/help/article?id=%d" % rng.randrange(1000))
+    text = " ".join(words)
+    if roll > 0.97:
+        text = f"```py\nprint({text!r})\n```"
+    elif roll > 0.94:
+        text = f"> {text}\nthanks"
+    return text
+
+def corpus(count: int, formatted: bool) -> list:
+    rng = random.Random(1)
+    channel = FakeTextChannel(id=1, name="ticket-0001")
+    records = []
+    for message in conversation_messages(count, seed=1):
+        message.channel = channel
+        if formatted and message.content:
+            message.content = decorate(message.content, rng)
+        records.append(record_from_message(message))
+    return records
+
+def best(repeat: int, func) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def escaped_batch(records: list, repeat: int) -> float:
+    # render_batch as it was before markdown: message text only HTML-escaped.
+    original = transcript.render_markdown
+    transcript.render_markdown = lambda text, mentions=None: html.escape(text)
+    try:
+        return best(repeat, lambda: render_batch(records))
+    finally:
+        transcript.render_markdown = original
+
+# Near the 4,000 character limit of a message.
+ADVERSARIAL = {
+    "unclosed_italic": " *x" * 1333,
+    "unclosed_bold": " **x" * 1000,
+    "unclosed_underline": " __x" * 1000,
+    "unclosed_strike": " ~~x" * 1000,
+    "unclosed_spoiler": " ||x" * 1000,
+    "unclosed_code": " `x" * 1333,
+    "stars": "*" * 4000,
+    "star_space": "* " * 2000,
+    "mixed_markers": " *_~|`x" * 570,
+    "nested_emphasis": "*a **b** c* " * 333,
+}
+
+def adversarial(args) -> list[dict]:
+    rows = []
+    for name, text in ADVERSARIAL.items():
+        elapsed = best(args.repeat, lambda: render_markdown(text))
+        rows.append({"adversarial": name, "chars": len(text), "ms": round(elapsed * 1000, 2), "ok": elapsed * 1000 <= args.bound})
+    return rows
+
+def run(args) -> list[dict]:
+    rows = []
+    for name, formatted in (("plain", False), ("formatted", True)):
+        records = corpus(args.messages, formatted)
+        texts = [r.content for r in records]
+        guild = CountingGuild()
+        mentions = Mentions(guild)
+        for record in records:
+            mentions.scan(record)
+        names = mentions.names
+        escape = best(args.repeat, lambda: [html.escape(t) for t in texts])
+        markdown = best(args.repeat, lambda: [render_markdown(t, names) for t in texts])
+        batch = best(args.repeat, lambda: render_batch(records, mentions=names))
+        escaped = escaped_batch(records, args.repeat)
+        rows.append({
+            "corpus": name,
+            "messages": len(records),
+            "escape_us_per_message": round(escape / len(texts) * 1e6, 2),
+            "markdown_us_per_message": round(markdown / len(texts) * 1e6, 2),
+            "ratio": round(markdown / escape, 2),
+            "transcript_escaped_ms": round(escaped * 1000, 1),
+            "transcript_markdown_ms": round(batch * 1000, 1),
+            "transcript_ratio": round(batch / escaped, 2),
+            "distinct_mentions": len(names),
+            "mention_lookups": guild.lookups,
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--bound", type=float, default=20.0, help="milliseconds allowed per adversarial message")
+    args = parser.parse_args()
+    for row in run(args):
+        print(json.dumps(row))
+    rows = adversarial(args)
+    for row in rows:
+        print(json.dumps(row))
+    if not all(row["ok"] for row in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
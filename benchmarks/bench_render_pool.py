@@ -0,0 +1,99 @@
+"""Event loop lag while several large transcripts render at once.
+
+Usage: python -m benchmarks.bench_render_pool [--messages 100000] [--tickets 4]
+           [--workers 1,2,4] [--style full]
+
+Renders --tickets transcripts of --messages messages concurrently, first on
+the event loop and then through a RenderPool of thread and process workers
+for each --workers count. Messages come from an async source that yields to
+the loop between pages, like reads from the archive. A heartbeat task wakes
+every 5ms throughout and records how late it ran. Prints, per mode, the wall
+time and the heartbeat's lag percentiles, and whether the HTML matched the
+on-loop rendering. Pool start-up (spawning processes) happens before timing.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from benchmarks.fakes import FakeTextChannel, conversation_messages
+from utils.records import record_from_message
+from utils.render_pool import RenderPool
+from utils.transcript import STYLES, render_batch, stream_records
+
+PAGE = 100
+INTERVAL = 0.005
+
+def build(count: int, seed: int) -> list:
+    channel = FakeTextChannel(id=seed, name=f"ticket-{seed:04d}")
+    records = []
+    for message in conversation_messages(count, seed=seed):
+        message.channel = channel
+        records.append(record_from_message(message))
+    return records
+
+async def source(records: list):
+    for i in range(0, len(records), PAGE):
+        await asyncio.sleep(0)
+        for record in records[i:i + PAGE]:
+            yield record
+
+async def render(name: str, records: list, style: str, pool) -> str:
+    digest = hashlib.sha256()
+
+    async def write(chunk: str):
+        digest.update(chunk.encode("utf-8"))
+
+    await stream_records(name, source(records), write, style=style, pool=pool)
+    return digest.hexdigest()
+
+async def heartbeat(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        before = time.perf_counter()
+        await asyncio.sleep(INTERVAL)
+        lags.append(max(0.0, time.perf_counter() - before - INTERVAL))
+
+async def measure(tickets: list, style: str, pool) -> tuple[dict, list]:
+    if pool is not None:
+        # Start the workers (and, for processes, import the renderer in them) untimed.
+        await asyncio.gather(*(asyncio.get_running_loop().run_in_executor(pool.executor(), render_batch, tickets[0][:1], style) for _ in range(pool.workers)))
+    lags: list[float] = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    start = time.perf_counter()
+    digests = await asyncio.gather(*(render(f"ticket-{i:04d}", records, style, pool) for i, records in enumerate(tickets)))
+    seconds = time.perf_counter() - start
+    stop.set()
+    await beat
+    lags.sort()
+    pct = lambda q: round(lags[min(len(lags) - 1, int(q * len(lags)))] * 1000, 2) if lags else None
+    return {"seconds": round(seconds, 2), "lag_p50_ms": pct(0.50), "lag_p99_ms": pct(0.99), "lag_max_ms": round(lags[-1] * 1000, 2) if lags else None}, digests
+
+async def run(args) -> list[dict]:
+    tickets = [build(args.messages, seed) for seed in range(args.tickets)]
+    rows = []
+    result, baseline = await measure(tickets, args.style, None)
+    rows.append({"mode": "loop", "workers": 0, **result})
+    for kind in ("thread", "process"):
+        for workers in args.workers:
+            pool = RenderPool(workers, kind=kind)
+            try:
+                result, digests = await measure(tickets, args.style, pool)
+            finally:
+                pool.close()
+            # Chunk boundaries differ, so only the full style is byte-identical to on-loop rendering.
+            rows.append({"mode": kind, "workers": workers, **result, "identical": digests == baseline if args.style == "full" else None})
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--tickets", type=int, default=4)
+    parser.add_argument("--workers", type=lambda s: [int(n) for n in s.split(",")], default=[1, 2, 4])
+    parser.add_argument("--style", choices=STYLES, default="full")
+    args = parser.parse_args()
+    for row in asyncio.run(run(args)):
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Latency of /search queries over a large synthetic full-text index.
+
+Usage: python -m benchmarks.bench_search [--messages 2000000] [--guilds 50] [--queries 50] [--db search.db]
+
+Fills ticket_search with --messages messages spread over --guilds guilds (3
+panels each, tickets of ~40 messages) whose words follow a Zipf-like
+distribution over a 20,000 word vocabulary, then times utils.search.search for
+several query shapes, each run --queries times against random guilds. Prints
+index build time and size, and p50/p95/max latency per query shape, with the
+share of searches whose matches were all ranked (complete_pct). With
+--db the index is built in that file, or reused if the file already exists.
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import discord
+from benchmarks.fakes import START, WORDS, snowflake
+from utils import search
+from utils.database import Database
+from utils.migrations import run_migrations
+
+VOCABULARY = 20_000
+
+def vocabulary(rng: random.Random) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = list(dict.fromkeys(WORDS + ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(VOCABULARY)]))
+    return words[:VOCABULARY]
+
+def build(path: str, args) -> dict:
+    rng = random.Random(0)
+    words = vocabulary(rng)
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    start = time.perf_counter()
+    when, ticket_id, written = START, 0, 0
+    while written < args.messages:
+        rows = []
+        for _ in range(250):
+            ticket_id += 1
+            guild = rng.randrange(args.guilds)
+            ticket = {"guild_id": 10_000 + guild, "panel_id": guild * 3 + rng.randrange(3), "owner_id": 1_000_000 + rng.randrange(5000), "ticket_id": ticket_id}
+            scope = search._scope(**ticket)
+            for _ in range(rng.randint(20, 60)):
+                when += datetime.timedelta(seconds=rng.randint(1, 30))
+                text = " ".join(rng.choices(words, cum_weights=cumulative, k=rng.randint(3, 30)))
+                rows.append((snowflake(when, written), text, scope, ticket_id, 100 + rng.randrange(50)))
+                written += 1
+        with conn:
+            conn.executemany(search.INSERT_SQL, rows)
+    conn.execute("INSERT INTO ticket_search (ticket_search) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+    return {"messages": written, "tickets": ticket_id, "build_seconds": round(time.perf_counter() - start, 1), "words": words, "end": when}
+
+async def prepare(path: str, args) -> dict:
+    if os.path.exists(path):
+        with sqlite3.connect(path) as conn:
+            last = conn.execute("SELECT MAX(rowid), COUNT(*) FROM ticket_search").fetchone()
+        return {"messages": last[1], "reused": True, "end": discord.utils.snowflake_time(last[0])}
+    db = Database(path)
+    await db.connect()
+    await run_migrations(db)
+    await db.close()
+    return build(path, args)
+
+async def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, "search.db")
+        info = await prepare(path, args)
+        words = vocabulary(random.Random(0))
+        info.pop("words", None)
+        info["db_mb"] = round(os.path.getsize(path) / 2**20)
+        end = info.pop("end")
+
+        db = Database(path)
+        await db.connect()
+        rng = random.Random(1)
+        shapes = {
+            "common_word": lambda g: dict(text=words[0]),
+            "mid_word": lambda g: dict(text=words[200]),
+            "rare_word": lambda g: dict(text=words[rng.randrange(5000, len(words))]),
+            "two_words": lambda g: dict(text=f"{words[rng.randrange(50)]} {words[rng.randrange(50, 2000)]}"),
+            "phrase": lambda g: dict(text=f'"{words[0]} {words[1]}"'),
+            "prefix": lambda g: dict(text=words[rng.randrange(20, 200)][:3] + "*"),
+            "panel_filter": lambda g: dict(text=words[rng.randrange(100)], panel_ids=[(g - 10_000) * 3]),
+            "owner_filter": lambda g: dict(text=words[rng.randrange(100)], owner_id=1_000_000 + rng.randrange(5000)),
+            "date_range": lambda g: dict(text=words[rng.randrange(100)], after=end - datetime.timedelta(days=30), before=end - datetime.timedelta(days=10)),
+        }
+        results = {}
+        for name, make in shapes.items():
+            latencies, hits, complete = [], 0, 0
+            for _ in range(args.queries):
+                guild = 10_000 + rng.randrange(args.guilds)
+                start = time.perf_counter()
+                found = await search.search(db, guild, **make(guild))
+                latencies.append(time.perf_counter() - start)
+                hits += len(found.hits)
+                complete += found.complete
+            latencies.sort()
+            results[name] = {
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+                "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+                "max_ms": round(latencies[-1] * 1000, 2),
+                "avg_hits": round(hits / args.queries, 1),
+                "complete_pct": round(complete * 100 / args.queries),
+            }
+        await db.close()
+    return {"index": info, "queries": results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2_000_000)
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--db")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""End-to-end benchmark of the ticket flow against fake Discord objects.
+
+Usage: python -m benchmarks.bench_suite [--guilds 10] [--panels 3] [--tickets 1000]
+           [--concurrency 50] [--messages 50,500,5000] [--transcripts 10]
+           [--latency 0] [--output results.json] [--baseline previous.json]
+
+Builds --guilds guilds with --panels panels each, then drives the real cogs
+through every stage of a ticket's life against a temporary database:
+create_ticket, is_support_staff, claim, execute_close, execute_open, and
+generate_transcript_file (first render, then an incremental re-render) for
+--transcripts tickets at each message count. Operations run --concurrency at
+a time, and every fake REST call sleeps for --latency seconds. Panels have
+inactivity auto-close and unclaimed reminders on, so creating, claiming,
+closing and re-opening include arming and cancelling their timers.
+
+Results are printed (and written to --output) as JSON: per operation the
+count, throughput, latency percentiles and the peak traced Python memory
+during that phase. With --baseline, the change in throughput and p95 latency
+against an earlier run is printed as well, so runs from different commits
+can be compared.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.fakes import FakeBot, FakeGuild, FakeHTTP, FakeInteraction, FakeInteractionMessage
+from cogs.automation import TicketAutomation
+from cogs.ticket_commands import TicketCommands, is_support_staff
+from cogs.ticket_system import TicketSystem
+from utils.database import Database
+from utils.migrations import run_migrations
+from utils.transcript import generate_transcript_file
+
+SUPPORT_MEMBER_ID = 500
+ROLE_BASE = 1_000_000
+
+class Phase:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: list[float] = []
+        self.errors = 0
+
+    async def timed(self, coro):
+        start = time.perf_counter()
+        try:
+            await coro
+        except Exception:
+            self.errors += 1
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    def result(self, seconds: float, peak: int) -> dict:
+        latencies = sorted(self.latencies)
+        pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else None
+        return {
+            "count": len(latencies),
+            "errors": self.errors,
+            "seconds": round(seconds, 4),
+            "throughput_per_s": round(len(latencies) / seconds, 1) if seconds else None,
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else None,
+            "p50_ms": round(pct(0.50), 3) if latencies else None,
+            "p95_ms": round(pct(0.95), 3) if latencies else None,
+            "p99_ms": round(pct(0.99), 3) if latencies else None,
+            "max_ms": round(latencies[-1] * 1000, 3) if latencies else None,
+            "peak_traced_kb": peak // 1024,
+        }
+
+async def run_phase(name: str, coros: list, concurrency: int, results: dict):
+    phase = Phase(name)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(coro):
+        async with semaphore:
+            await phase.timed(coro)
+
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(coro) for coro in coros))
+    results[name] = phase.result(time.perf_counter() - start, tracemalloc.get_traced_memory()[1])
+
+async def build(path: str, args) -> tuple[FakeBot, list[FakeGuild]]:
+    db = Database(path)
+    await db.connect()
+    await run_migrations(db)
+    guilds = [FakeGuild(10_000 + g, FakeHTTP(args.latency)) for g in range(args.guilds)]
+    bot = FakeBot(db, guilds)
+    await bot.add_cog(TicketSystem(bot))
+    await bot.add_cog(TicketCommands(bot))
+    await bot.add_cog(TicketAutomation(bot))
+    for guild in guilds:
+        transcripts = guild.add_text_channel(guild.id + 1, "transcripts")
+        for p in range(args.panels):
+            role = guild.add_role(ROLE_BASE + guild.id * 100 + p, f"support-{p}")
+            category = guild.add_category(guild.id + 10 + p)
+            await bot.cache.save_panel(None, {
+                "guild_id": guild.id, "panel_name": f"Panel {p}", "message_id": guild.id * 100 + p, "channel_id": 1,
+                "category_id": category.id, "transcript_channel_id": transcripts.id, "welcome_message": "Hello!", "is_claimable": 1,
+                "auto_close_hours": 24, "unclaimed_reminder_minutes": 30,
+            }, [role.id])
+        guild.add_member(SUPPORT_MEMBER_ID, roles=tuple(ROLE_BASE + guild.id * 100 + p for p in range(args.panels)))
+    return bot, guilds
+
+def interaction(bot, user, channel=None, message=None, deferred: bool = False) -> FakeInteraction:
+    inter = FakeInteraction(bot, user, channel=channel, message=message)
+    inter.response._done = deferred
+    return inter
+
+async def create(bot, guild, owner_id: int, panel_message_id: int):
+    owner = guild.add_member(owner_id)
+    await TicketSystem.CreateTicketView().create_ticket.callback(interaction(bot, owner, message=FakeInteractionMessage(panel_message_id)))
+
+async def transcript(bot, channel, ticket: dict):
+    file = await generate_transcript_file(channel, db=bot.db, ticket_id=ticket["ticket_id"], archive=bot.archive)
+    file.close()
+
+async def run(args) -> dict:
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        bot, guilds = await build(os.path.join(tmp, "tickets.db"), args)
+        tracemalloc.start()
+
+        creations = []
+        for i in range(args.tickets):
+            guild = guilds[i % len(guilds)]
+            panel = (i // len(guilds)) % args.panels
+            creations.append(create(bot, guild, 1_000_000 + i, guild.id * 100 + panel))
+        await run_phase("create_ticket", creations, args.concurrency, results)
+
+        tickets = [dict(row) for row in await bot.db.fetchall("SELECT * FROM tickets WHERE channel_id != 0 ORDER BY ticket_id")]
+        channels = {t["channel_id"]: bot.get_channel(t["channel_id"]) for t in tickets}
+        staff = {g.id: g.get_member(SUPPORT_MEMBER_ID) for g in guilds}
+        commands = bot.get_cog("TicketCommands")
+
+        def each(make):
+            return [make(channels[t["channel_id"]], staff[t["guild_id"]], t) for t in tickets]
+
+        await run_phase("is_support_staff", each(lambda c, s, t: is_support_staff(interaction(bot, s, channel=c))), args.concurrency, results)
+        await run_phase("claim", each(lambda c, s, t: TicketCommands.claim.callback(commands, interaction(bot, s, channel=c))), args.concurrency, results)
+        await run_phase("execute_close", each(lambda c, s, t: commands.execute_close(interaction(bot, s, channel=c, message=FakeInteractionMessage(1, c), deferred=True), s)), args.concurrency, results)
+        await run_phase("execute_open", each(lambda c, s, t: commands.execute_open(interaction(bot, s, channel=c, message=FakeInteractionMessage(1, c), deferred=True))), args.concurrency, results)
+
+        for count in args.messages:
+            sample = tickets[:args.transcripts]
+            for t in sample:
+                channel = channels[t["channel_id"]]
+                channel.message_count, channel.seed = count, t["ticket_id"]
+            await run_phase(f"transcript_{count}_first", [transcript(bot, channels[t["channel_id"]], t) for t in sample], args.concurrency, results)
+            await run_phase(f"transcript_{count}_incremental", [transcript(bot, channels[t["channel_id"]], t) for t in sample], args.concurrency, results)
+            # Start the next size from a clean slate.
+            for t in sample:
+                await bot.cache.delete_ticket(t["channel_id"])
+            tickets = tickets[args.transcripts:]
+
+        tracemalloc.stop()
+        await bot.db.close()
+    return results
+
+def commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current: dict, baseline: dict):
+    print(f"{'operation':<32} {'throughput':>12} {'p95':>12}", file=sys.stderr)
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        change = lambda key: f"{(result[key] - old[key]) / old[key] * 100:+.1f}%" if result[key] is not None and old.get(key) else "n/a"
+        print(f"{name:<32} {change('throughput_per_s'):>12} {change('p95_ms'):>12}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--panels", type=int, default=3)
+    parser.add_argument("--tickets", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--messages", type=lambda s: [int(n) for n in s.split(",")], default=[50, 500, 5000])
+    parser.add_argument("--transcripts", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+    if args.transcripts * len(args.messages) > args.tickets:
+        parser.error("--transcripts x number of --messages sizes must not exceed --tickets")
+
+    results = asyncio.run(run(args))
+    report = {
+        "meta": {
+            "commit": commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
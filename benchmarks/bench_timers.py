@@ -0,0 +1,140 @@
+"""Cost of holding and firing many pending ticket timers.
+
+Usage: python -m benchmarks.bench_timers [--timers 100000] [--idle 5] [--fire 2000]
+           [--rearm 10000]
+
+Persists --timers timers due between one hour and one week from now, then
+measures the TimerScheduler that holds them: how long start() takes to load
+them and how much memory they use; the CPU it uses over --idle seconds of
+waiting; the rate of re-arming (set) and cancelling timers, which write to the
+database; and, for --fire timers due over the next two seconds, how late their
+handlers start. For comparison, the same number of per-ticket sleeping tasks
+is created and measured for memory and idle CPU.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from utils.database import Database
+from utils.migrations import run_migrations
+from utils.timers import Timer, TimerScheduler
+
+GUILD_ID = 10_000
+KIND = "auto_close"
+
+def pct(values: list[float], q: float):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2) if values else None
+
+async def idle_cpu(seconds: float) -> float:
+    cpu, wall = time.process_time(), time.perf_counter()
+    await asyncio.sleep(seconds)
+    return round((time.process_time() - cpu) / (time.perf_counter() - wall) * 100, 3)
+
+async def scheduler_rows(db: Database, args) -> dict:
+    rng = random.Random(1)
+    now = time.time()
+    await db.executemany(
+        "INSERT INTO timers (ticket_id, kind, guild_id, channel_id, due_at, payload) VALUES (?, ?, ?, ?, ?, NULL)",
+        [(i, KIND, GUILD_ID, 1_000_000 + i, now + rng.uniform(3600, 7 * 86400)) for i in range(args.timers)],
+    )
+    scheduler = TimerScheduler(db)
+    fired: list[float] = []
+    done = asyncio.Event()
+
+    async def handler(timer: Timer):
+        fired.append(time.time() - timer.due_at)
+        if len(fired) == args.fire:
+            done.set()
+    scheduler.register(KIND, handler)
+
+    start = time.perf_counter()
+    await scheduler.start()
+    load = time.perf_counter() - start
+    try:
+        idle = await idle_cpu(args.idle)
+
+        # Memory is measured on a second, traced load; tracing would distort the timings.
+        traced = TimerScheduler(db)
+        tracemalloc.start()
+        await traced.start()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        await traced.close()
+        del traced
+
+        ids = rng.sample(range(args.timers), args.rearm)
+        start = time.perf_counter()
+        for ticket_id in ids:
+            await scheduler.set(KIND, ticket_id, GUILD_ID, 1_000_000 + ticket_id, time.time() + rng.uniform(3600, 7 * 86400))
+        rearm = time.perf_counter() - start
+        start = time.perf_counter()
+        for ticket_id in ids:
+            await scheduler.cancel(ticket_id, KIND)
+        cancel = time.perf_counter() - start
+
+        soon = time.time() + 0.5
+        cpu = time.process_time()
+        await scheduler.set_many([Timer(KIND, args.timers + i, GUILD_ID, 1, soon + 2 * i / args.fire) for i in range(args.fire)])
+        await asyncio.wait_for(done.wait(), 30)
+        fire_cpu = time.process_time() - cpu
+    finally:
+        await scheduler.close()
+    return {
+        "mode": "scheduler",
+        "timers": args.timers,
+        "load_ms": round(load * 1000, 1),
+        "memory_mb": round(memory / 1024 / 1024, 1),
+        "idle_cpu_percent": idle,
+        "rearm_per_s": round(args.rearm / rearm),
+        "cancel_per_s": round(args.rearm / cancel),
+        "fired": len(fired),
+        "fire_cpu_ms": round(fire_cpu * 1000, 1),
+        "late_p50_ms": pct(fired, 0.50),
+        "late_p99_ms": pct(fired, 0.99),
+        "late_max_ms": pct(fired, 1.0),
+    }
+
+async def task_per_timer(args) -> dict:
+    rng = random.Random(1)
+    tracemalloc.start()
+    tasks = [asyncio.create_task(asyncio.sleep(rng.uniform(3600, 7 * 86400))) for _ in range(args.timers)]
+    await asyncio.sleep(0)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    try:
+        idle = await idle_cpu(args.idle)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return {"mode": "task_per_timer", "timers": args.timers, "memory_mb": round(memory / 1024 / 1024, 1), "idle_cpu_percent": idle}
+
+async def run(args) -> list[dict]:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "timers.db"))
+        await db.connect()
+        await run_migrations(db)
+        try:
+            rows = [await scheduler_rows(db, args)]
+        finally:
+            await db.close()
+    rows.append(await task_per_timer(args))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timers", type=int, default=100_000)
+    parser.add_argument("--idle", type=float, default=5.0)
+    parser.add_argument("--fire", type=int, default=2000)
+    parser.add_argument("--rearm", type=int, default=10_000)
+    args = parser.parse_args()
+    for row in asyncio.run(run(args)):
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
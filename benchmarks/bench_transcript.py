@@ -0,0 +1,62 @@
+"""Wall time and peak memory of transcript generation on a synthetic ticket.
+
+Usage: python -m benchmarks.bench_transcript [--messages 100000]
+
+Each implementation runs in its own subprocess so peak RSS is not shared.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.fakes import FakeTextChannel
+
+def _rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def _run(impl: str, messages: int) -> dict:
+    if impl == "legacy":
+        from benchmarks.legacy_transcript import generate_transcript_file
+    else:
+        from utils.transcript import generate_transcript_file
+    channel = FakeTextChannel(id=1, name="ticket-0001", message_count=messages)
+    rss_before = _rss_mb()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = await generate_transcript_file(channel)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if isinstance(result, str):
+        size = os.path.getsize(result)
+        os.remove(result)
+    else:
+        size = result.fp.seek(0, os.SEEK_END)
+        result.close()
+    return {"impl": impl, "messages": messages, "seconds": round(elapsed, 3), "peak_traced_mb": round(peak / 2**20, 1), "peak_rss_growth_mb": round(_rss_mb() - rss_before, 1), "output_mb": round(size / 2**20, 1)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--impl", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.impl:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            print(json.dumps(asyncio.run(_run(args.impl, args.messages))))
+        return
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for impl in ("legacy", "streaming"):
+        out = subprocess.run([sys.executable, "-m", "benchmarks.bench_transcript", "--impl", impl, "--messages", str(args.messages)], cwd=root, env={**os.environ, "PYTHONPATH": root}, check=True, capture_output=True, text=True)
+        print(out.stdout.strip())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Output size of each transcript style on synthetic ticket conversations.
+
+Usage: python -m benchmarks.bench_transcript_size [--messages 50,500,5000] [--tickets 20]
+
+Renders --tickets conversations of each length (see fakes.conversation_messages)
+in every style and prints, per style and length, the mean raw and gzipped
+size, bytes per message and render time, with each style's size relative to
+"full".
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import statistics
+import time
+from benchmarks.fakes import FakeTextChannel, conversation_messages
+from utils.records import record_from_message
+from utils.transcript import STYLES, stream_transcript
+
+async def records(count: int, seed: int, channel: FakeTextChannel):
+    for message in conversation_messages(count, seed=seed):
+        message.channel = channel
+        yield record_from_message(message)
+
+async def render(count: int, seed: int, style: str) -> tuple[bytes, float]:
+    channel = FakeTextChannel(id=1, name=f"ticket-{seed:04d}")
+    parts = []
+
+    async def write(chunk: str):
+        parts.append(chunk.encode("utf-8"))
+
+    start = time.perf_counter()
+    await stream_transcript(channel, write, messages=records(count, seed, channel), style=style)
+    return b"".join(parts), time.perf_counter() - start
+
+async def run(args) -> list[dict]:
+    rows = []
+    for count in args.messages:
+        sizes = {}
+        for style in STYLES:
+            raw, packed, seconds = [], [], []
+            for seed in range(args.tickets):
+                html, elapsed = await render(count, seed, style)
+                raw.append(len(html))
+                packed.append(len(gzip.compress(html, mtime=0)))
+                seconds.append(elapsed)
+            sizes[style] = statistics.fmean(raw)
+            rows.append({
+                "style": style,
+                "messages": count,
+                "raw_kb": round(statistics.fmean(raw) / 1024, 1),
+                "gzip_kb": round(statistics.fmean(packed) / 1024, 1),
+                "bytes_per_message": round(statistics.fmean(raw) / count),
+                "render_ms": round(statistics.fmean(seconds) * 1000, 2),
+                "vs_full": round(sizes[style] / sizes["full"], 3),
+            })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=lambda s: [int(n) for n in s.split(",")], default=[50, 500, 5000])
+    parser.add_argument("--tickets", type=int, default=20)
+    args = parser.parse_args()
+    for row in asyncio.run(run(args)):
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+"""Lightweight stand-ins for the discord.py objects the bot touches.
+
+They implement only the attributes and coroutines the cogs use, so the
+ticket flow can be driven offline at scale.
+"""
+import asyncio
+import datetime
+import itertools
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Optional
+import discord
+
+DISCORD_EPOCH = datetime.datetime(2015, 1, 1, tzinfo=datetime.timezone.utc)
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+WORDS = "the ticket is still not working after i restarted my client please help me with the billing issue thanks a lot for the quick reply".split()
+
+def snowflake(when: datetime.datetime, seq: int = 0) -> int:
+    return (int((when - DISCORD_EPOCH).total_seconds() * 1000) << 22) | (seq & 0x3FFFFF)
+
+@dataclass
+class FakeAsset:
+    url: str
+
+@dataclass
+class FakeUser:
+    id: int
+    display_name: str
+    bot: bool = False
+
+    @property
+    def display_avatar(self) -> FakeAsset:
+        return FakeAsset(f"https://cdn.discordapp.com/avatars/{self.id}/a_{self.id:x}.png")
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+@dataclass
+class FakeAttachment:
+    filename: str
+    url: str
+    content_type: Optional[str] = None
+
+@dataclass
+class FakeEmbedField:
+    name: str
+    value: str
+
+@dataclass
+class FakeEmbed:
+    title: Optional[str] = None
+    description: Optional[str] = None
+    fields: list = field(default_factory=list)
+
+@dataclass
+class FakeMessage:
+    id: int
+    author: FakeUser
+    content: str
+    created_at: datetime.datetime
+    attachments: list = field(default_factory=list)
+    embeds: list = field(default_factory=list)
+    channel: object = None
+    edited_at: Optional[datetime.datetime] = None
+
+    @property
+    def clean_content(self) -> str:
+        return self.content
+
+    async def delete(self):
+        if self.channel:
+            await self.channel.http.request("message_delete")
+
+def synthetic_messages(count: int, authors: int = 4, seed: int = 0, start: datetime.datetime = START):
+    """Yield ``count`` messages lazily: chatty text, some attachments and embeds."""
+    rng = random.Random(seed)
+    users = [FakeUser(id=100000 + i, display_name=f"user{i}") for i in range(authors)]
+    when = start
+    for i in range(count):
+        when += datetime.timedelta(seconds=rng.randint(1, 300))
+        author = users[rng.randrange(authors)]
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 40)))
+        attachments, embeds = [], []
+        if rng.random() < 0.02:
+            attachments.append(FakeAttachment(filename=f"screenshot{i}.png", url=f"https://cdn.discordapp.com/attachments/1/{i}/screenshot{i}.png", content_type="image/png"))
+        if rng.random() < 0.01:
+            embeds.append(FakeEmbed(title="Order <#%d>" % i, description=content, fields=[FakeEmbedField("Status", "Pending & queued")]))
+        yield FakeMessage(id=snowflake(when, i), author=author, content=content, created_at=when, attachments=attachments, embeds=embeds)
+
+def conversation_messages(count: int, seed: int = 0, start: datetime.datetime = START):
+    """Yield ``count`` messages shaped like a real ticket.
+
+    A bot welcome embed, then a customer and one or two staff members taking
+    turns in bursts of short messages, with occasional long pauses.
+    """
+    rng = random.Random(seed)
+    bot = FakeUser(id=900000000000000000 + seed, display_name="Ticket Bot", bot=True)
+    customer = FakeUser(id=300000000000000000 + seed, display_name=f"customer{seed}")
+    staff = [FakeUser(id=200000000000000000 + i, display_name=f"Support Agent {i}") for i in range(rng.randint(1, 2))]
+    when = start
+    yield FakeMessage(id=snowflake(when, 0), author=bot, content="", created_at=when, embeds=[FakeEmbed(title="Ticket opened", description="Support will be with you shortly. Please describe your issue.")])
+    author = customer
+    for i in range(1, count):
+        if rng.random() < 0.35:
+            # Turn change: usually a reply within minutes, sometimes hours later.
+            author = rng.choice(staff) if author is customer else customer
+            when += datetime.timedelta(seconds=rng.randint(3600, 6 * 3600) if rng.random() < 0.05 else rng.randint(20, 900))
+        else:
+            when += datetime.timedelta(seconds=rng.randint(2, 45))
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 25)))
+        attachments = []
+        if rng.random() < 0.03:
+            attachments.append(FakeAttachment(filename=f"screenshot{i}.png", url=f"https://cdn.discordapp.com/attachments/1/{i}/screenshot{i}.png", content_type="image/png"))
+        yield FakeMessage(id=snowflake(when, i), author=author, content=content, created_at=when, attachments=attachments)
+
+class FakeHTTP:
+    """Counts simulated REST calls by route and applies a fixed latency to each.
+
+    ``route_latency`` overrides the latency for individual routes; calls to a
+    route in ``failing`` raise Forbidden after their latency.
+    """
+    def __init__(self, latency: float = 0.0, route_latency: Optional[dict] = None, failing: frozenset = frozenset()):
+        self.latency = latency
+        self.route_latency = route_latency or {}
+        self.failing = failing
+        self.calls: Counter = Counter()
+
+    async def request(self, route: str):
+        self.calls[route] += 1
+        if (latency := self.route_latency.get(route, self.latency)):
+            await asyncio.sleep(latency)
+        if route in self.failing:
+            raise discord.Forbidden(SimpleNamespace(status=403, reason="Forbidden"), {"code": 50013, "message": "Missing Permissions"})
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+_ids = itertools.count(1)
+_UNSET = object()
+_NO_HTTP = FakeHTTP()
+
+def new_id() -> int:
+    return snowflake(datetime.datetime.now(datetime.timezone.utc), next(_ids))
+
+@dataclass(eq=False)
+class FakeRole:
+    id: int
+    name: str = "role"
+
+    @property
+    def mention(self) -> str:
+        return f"<@&{self.id}>"
+
+@dataclass
+class FakePermissions:
+    administrator: bool = False
+
+class FakeMember(FakeUser):
+    def __init__(self, id: int, guild: "FakeGuild", roles: tuple = (), administrator: bool = False, display_name: Optional[str] = None):
+        super().__init__(id=id, display_name=display_name or f"member{id}")
+        self.guild = guild
+        self._roles = list(roles)
+        self.guild_permissions = FakePermissions(administrator)
+
+    __hash__ = object.__hash__
+    __eq__ = object.__eq__
+
+    @property
+    def roles(self) -> list:
+        return [self.guild.get_role(r) for r in self._roles]
+
+    def get_role(self, role_id: int):
+        return self.guild.get_role(role_id) if role_id in self._roles else None
+
+class FakeTextChannel:
+    def __init__(self, id: int, name: str, message_count: int = 0, seed: int = 0, guild: Optional["FakeGuild"] = None, category: Optional["FakeCategory"] = None, start: datetime.datetime = START):
+        self.id = id
+        self.name = name
+        self.message_count = message_count
+        self.seed = seed
+        self.start = start  # timestamp the synthetic history starts from
+        self.guild = guild
+        self.category = category
+        self.overwrites: dict = {}
+        self.sent: list = []
+        self.history_calls = 0
+        self.deleted = False
+        self.last_message_id: Optional[int] = None
+
+    @property
+    def category_id(self) -> Optional[int]:
+        return self.category.id if self.category else None
+
+    @property
+    def http(self) -> FakeHTTP:
+        return self.guild.http if self.guild else _NO_HTTP
+
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+
+    async def history(self, limit: Optional[int] = 100, oldest_first: Optional[bool] = None, after=None, before=None):
+        self.history_calls += 1
+        await self.http.request("history")
+        after_id = getattr(after, "id", after)
+        before_id = getattr(before, "id", before)
+        yielded = 0
+        for message in synthetic_messages(self.message_count, seed=self.seed, start=self.start):
+            if after_id is not None and message.id <= after_id:
+                continue
+            if before_id is not None and message.id >= before_id:
+                break
+            message.channel = self
+            yield message
+            yielded += 1
+            if yielded % 100 == 0:
+                await self.http.request("history")
+            if limit is not None and yielded >= limit:
+                break
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        await self.http.request("message_send")
+        if (file := kwargs.get("file")) is not None:
+            file.close()
+        message = FakeMessage(id=new_id(), author=self.guild.me if self.guild else FakeUser(0, "bot"), content=content or "", created_at=datetime.datetime.now(datetime.timezone.utc), channel=self)
+        message.kwargs = kwargs
+        self.sent.append(message)
+        self.last_message_id = message.id
+        return message
+
+    async def edit(self, **kwargs):
+        await self.http.request("channel_edit")
+        if "name" in kwargs:
+            self.name = kwargs["name"]
+        if "overwrites" in kwargs:
+            self.overwrites = dict(kwargs["overwrites"])
+
+    async def set_permissions(self, target, *, overwrite=_UNSET, **perms):
+        await self.http.request("permissions")
+        if overwrite is None:
+            self.overwrites.pop(target, None)
+        else:
+            self.overwrites[target] = perms if overwrite is _UNSET else overwrite
+
+    async def delete(self, reason: Optional[str] = None):
+        await self.http.request("channel_delete")
+        self.deleted = True
+        if self.guild:
+            self.guild.channels.pop(self.id, None)
+
+    def get_partial_message(self, message_id: int) -> "FakeInteractionMessage":
+        return FakeInteractionMessage(message_id, self)
+
+class FakeCategory:
+    def __init__(self, id: int, guild: "FakeGuild"):
+        self.id = id
+        self.guild = guild
+        self.mention = f"<#{id}>"
+
+    async def create_text_channel(self, name: str, overwrites: Optional[dict] = None, **kwargs) -> FakeTextChannel:
+        await self.guild.http.request("channel_create")
+        channel_id = new_id()
+        # History starts after the channel exists, like it would on Discord.
+        channel = FakeTextChannel(channel_id, name, guild=self.guild, category=self, start=DISCORD_EPOCH + datetime.timedelta(milliseconds=channel_id >> 22))
+        channel.overwrites = dict(overwrites or {})
+        self.guild.channels[channel.id] = channel
+        return channel
+
+class FakeGuild:
+    def __init__(self, id: int, http: Optional[FakeHTTP] = None):
+        self.id = id
+        self.shard_id = 0
+        self.http = http or FakeHTTP()
+        self.roles: dict[int, FakeRole] = {}
+        self.channels: dict[int, object] = {}
+        self.members: dict[int, FakeMember] = {}
+        self.default_role = self.add_role(id, "@everyone")
+        self.me = self.add_member(1, display_name="TicketBot")
+
+    def add_role(self, id: int, name: str = "role") -> FakeRole:
+        role = self.roles[id] = FakeRole(id, name)
+        return role
+
+    def add_member(self, id: int, roles: tuple = (), administrator: bool = False, display_name: Optional[str] = None) -> FakeMember:
+        member = self.members[id] = FakeMember(id, self, roles, administrator, display_name)
+        return member
+
+    def add_category(self, id: int) -> FakeCategory:
+        category = self.channels[id] = FakeCategory(id, self)
+        return category
+
+    def add_text_channel(self, id: int, name: str, **kwargs) -> FakeTextChannel:
+        channel = self.channels[id] = FakeTextChannel(id, name, guild=self, **kwargs)
+        return channel
+
+    def get_role(self, id: int) -> Optional[FakeRole]:
+        return self.roles.get(id)
+
+    def get_channel(self, id: int):
+        return self.channels.get(id)
+
+    def get_member(self, id: int) -> Optional[FakeMember]:
+        return self.members.get(id)
+
+class FakeInteractionMessage:
+    def __init__(self, id: int, channel: Optional[FakeTextChannel] = None):
+        self.id = id
+        self.channel = channel
+        self.content = ""
+        self.embeds: list = []
+        self.components: list = []
+
+    async def edit(self, **kwargs):
+        if self.channel:
+            await self.channel.http.request("message_edit")
+
+    async def delete(self):
+        if self.channel:
+            await self.channel.http.request("message_delete")
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, **kwargs):
+        self._done = True
+        await self.interaction.http.request("interaction_callback")
+
+    async def send_message(self, content: Optional[str] = None, **kwargs):
+        self._done = True
+        self.interaction.sent.append(content if content is not None else kwargs.get("embed"))
+        await self.interaction.http.request("interaction_callback")
+
+    async def edit_message(self, **kwargs):
+        self._done = True
+        await self.interaction.http.request("interaction_callback")
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        self.interaction.sent.append(content if content is not None else kwargs.get("embed"))
+        await self.interaction.http.request("webhook_send")
+        return FakeInteractionMessage(new_id())
+
+class FakeInteraction:
+    def __init__(self, client, user: FakeMember, channel=None, message: Optional[FakeInteractionMessage] = None):
+        self.client = client
+        self.user = user
+        self.guild = user.guild
+        self.channel = channel
+        self.message = message
+        self.extras: dict = {}
+        self.sent: list = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    @property
+    def http(self) -> FakeHTTP:
+        return self.guild.http
+
+class FakeBot:
+    """Just enough of TicketBot for cogs to run: the real data layer plus fake Discord state."""
+    def __init__(self, db, guilds: tuple = ()):
+        from utils.archive import MessageArchive
+        from utils.cache import TicketCache
+        from utils.jobs import JobQueue
+        from utils.pool import ChannelPool
+        from utils.ratelimit import RouteScheduler
+        from utils.timers import TimerScheduler
+        self.db = db
+        self.cache = TicketCache(db)
+        self.archive = MessageArchive(db)
+        self.jobs = JobQueue(db)
+        self.timers = TimerScheduler(db)
+        self.rest = RouteScheduler()
+        self.pool = ChannelPool(db, self.rest)
+        self.transcript_compress = False
+        self.transcript_style = "full"
+        self.transcripts = None
+        self.render_pool = None
+        self.guilds = {g.id: g for g in guilds}
+        self.cogs: dict = {}
+
+    def get_cog(self, name: str):
+        return self.cogs.get(name)
+
+    def get_guild(self, id: int) -> Optional[FakeGuild]:
+        return self.guilds.get(id)
+
+    def get_channel(self, id: int):
+        for guild in self.guilds.values():
+            if (channel := guild.get_channel(id)) is not None:
+                return channel
+        return None
+
+    async def wait_until_ready(self):
+        pass
+
+    async def add_cog(self, cog):
+        self.cogs[type(cog).__name__] = cog
+        if hasattr(cog, "cog_load"):
+            await cog.cog_load()
+
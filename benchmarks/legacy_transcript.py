@@ -0,0 +1,75 @@
+"""The original single-buffer transcript renderer, kept as a baseline for benchmarks."""
+import html
+import aiofiles
+import discord
+
+async def generate_transcript_file(channel: discord.TextChannel):
+    css = """
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <style>
+        body { font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; background-color: #36393f; color: #dcddde; margin: 0; padding: 20px; }
+        .container { max-width: 800px; margin: auto; }
+        .header { text-align: center; border-bottom: 1px solid #4f545c; padding-bottom: 10px; margin-bottom: 20px; }
+        .header h1 { color: #ffffff; }
+        .message-group { display: flex; margin-bottom: 20px; }
+        .avatar { width: 40px; height: 40px; border-radius: 50%; margin-right: 15px; flex-shrink: 0; }
+        .message-content { display: flex; flex-direction: column; width: 100%; }
+        .author-info { display: flex; align-items: center; margin-bottom: 5px; }
+        .author-name { font-weight: bold; color: #ffffff; }
+        .timestamp { color: #72767d; font-size: 0.75em; margin-left: 10px; }
+        .content { white-space: pre-wrap; word-wrap: break-word; }
+        .embed { border-left: 4px solid #4f545c; background-color: #2f3136; padding: 10px; border-radius: 4px; margin-top: 5px; }
+        .embed-title { font-weight: bold; }
+        .embed-description { font-size: 0.9em; }
+        .embed-field { margin-top: 5px; }
+        .embed-field-name { font-weight: bold; }
+        .attachment img { max-width: 100%; height: auto; border-radius: 4px; margin-top: 5px; }
+        .attachment a { color: #00a8fc; }
+    </style>
+    """
+    
+    html_content = f"<!DOCTYPE html><html><head><title>Transcript for #{channel.name}</title>{css}</head><body><div class='container'>"
+    html_content += f"<div class='header'><h1>Transcript for #{channel.name}</h1></div>"
+    
+    async for message in channel.history(limit=None, oldest_first=True):
+        timestamp = message.created_at.strftime('%Y-%m-%d %H:%M:%S UTC')
+        safe_content = html.escape(message.clean_content)
+
+        html_content += f'<div class="message-group">'
+        html_content += f'<img src="{message.author.display_avatar.url}" class="avatar">'
+        html_content += '<div class="message-content">'
+        html_content += f'<div class="author-info"><span class="author-name">{html.escape(message.author.display_name)}</span> <span class="timestamp">{timestamp}</span></div>'
+        if safe_content:
+            html_content += f'<div class="content">{safe_content}</div>'
+        
+        if message.attachments:
+            for attachment in message.attachments:
+                if attachment.content_type and attachment.content_type.startswith('image/'):
+                    html_content += f'<div class="attachment"><a href="{attachment.url}" target="_blank"><img src="{attachment.url}" alt="Attachment"></a></div>'
+                else:
+                    html_content += f'<div class="attachment"><a href="{attachment.url}" target="_blank">{html.escape(attachment.filename)}</a></div>'
+
+        if message.embeds:
+            for embed in message.embeds:
+                html_content += '<div class="embed">'
+                if embed.title:
+                    html_content += f'<div class="embed-title">{html.escape(embed.title)}</div>'
+                if embed.description:
+                    html_content += f'<div class="embed-description">{html.escape(embed.description)}</div>'
+                if embed.fields:
+                    for field in embed.fields:
+                        html_content += '<div class="embed-field">'
+                        html_content += f'<div class="embed-field-name">{html.escape(field.name)}</div>'
+                        html_content += f'<div class="embed-field-value">{html.escape(field.value)}</div>'
+                        html_content += '</div>'
+                html_content += '</div>'
+        
+        html_content += '</div></div>'
+
+    html_content += "</div></body></html>"
+    
+    filename = f"transcript-{channel.name}.html"
+    async with aiofiles.open(filename, 'w', encoding='utf-8') as f:
+        await f.write(html_content)
+    return filename
@@ -4,87 +4,198 @@ import discord
 from discord.ext import commands
 import os
 from dotenv import load_dotenv
-import sqlite3
 import asyncio
+import json
+import traceback
+from utils.database import Database
+from utils.migrations import run_migrations
+from utils.cache import TicketCache
+from utils.archive import MessageArchive
+from utils.jobs import JobQueue
+from utils.ratelimit import GLOBAL_LIMIT, RouteScheduler
+from utils.cluster import ClusterConfig
+from utils.pool import ChannelPool
+from utils.startup import StartupReport, get_state, set_state, tree_fingerprint
+from utils.watchdog import LoopWatchdog
+from utils.transcript import STYLES as TRANSCRIPT_STYLES
+from utils.transcript_store import TranscriptStore
+from utils.render_pool import RenderPool
+from utils.timers import TimerScheduler
+from utils import metrics
 
 load_dotenv()
 
-class TicketBot(commands.Bot):
+class TicketBot(commands.AutoShardedBot):
     def __init__(self):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.members = True
-        super().__init__(command_prefix="!", intents=intents)
+        # Shards to run in this process. launcher.py sets these for each cluster;
+        # when unset, discord.py runs Discord's recommended shard count here.
+        cluster = ClusterConfig.from_env()
+        super().__init__(
+            command_prefix="!", intents=intents, shard_count=cluster.shard_count, shard_ids=list(cluster.shard_ids) if cluster.shard_ids else None,
+            # Time every app command and every Discord REST call (see /botstats and METRICS_PORT).
+            tree_cls=metrics.InstrumentedTree, http_trace=metrics.http_trace(),
+        )
+        self.cluster = cluster
+        self.startup = StartupReport()
         self.db_path = os.path.join('db', 'database.sqlite')
-        # DB connection is no longer stored on the bot object.
-        # Connections will be made on-demand in cogs.
-
-    def setup_database(self):
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS panels (
-                    panel_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    guild_id INTEGER NOT NULL,
-                    panel_name TEXT NOT NULL,
-                    message_id INTEGER,
-                    channel_id INTEGER,
-                    support_role_ids TEXT NOT NULL, -- CHANGED: From support_role_id INTEGER
-                    category_id INTEGER NOT NULL,
-                    transcript_channel_id INTEGER NOT NULL,
-                    is_claimable INTEGER DEFAULT 0,
-                    panel_description TEXT,
-                    button_text TEXT,
-                    welcome_message TEXT
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS tickets (
-                    ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    guild_id INTEGER NOT NULL,
-                    panel_id INTEGER NOT NULL,
-                    channel_id INTEGER NOT NULL,
-                    owner_id INTEGER NOT NULL,
-                    status TEXT NOT NULL,
-                    ticket_num INTEGER NOT NULL,
-                    claimed_by_id INTEGER
-                )
-            ''')
-            conn.commit()
+        # Shared data-access layer used by every cog; opened in setup_hook.
+        self.db = Database(self.db_path, busy_timeout=float(os.getenv('DB_BUSY_TIMEOUT', 30 if cluster.partitioned else 5)))
+        self.cache = TicketCache(self.db, maxsize=int(os.getenv('CACHE_SIZE', 10000)))
+        self.archive = MessageArchive(self.db)
+        self.jobs = JobQueue(self.db, workers=int(os.getenv('JOB_WORKERS', 4)), cluster=cluster)
+        # Deadlines for per-panel ticket automation (see cogs/automation.py).
+        self.timers = TimerScheduler(self.db, cluster)
+        # Paces REST calls made by background work (uploads, bulk operations). The
+        # global limit is per bot token, so clusters split it between them.
+        self.rest = RouteScheduler(global_limit=(max(1, GLOBAL_LIMIT[0] // cluster.cluster_count), GLOBAL_LIMIT[1]))
+        # Pre-created ticket channels for panels with a pool size set (/pool size).
+        self.pool = ChannelPool(self.db, self.rest)
+        # Upload transcripts as .html.gz instead of plain .html.
+        self.transcript_compress = os.getenv('TRANSCRIPT_GZIP', '0') == '1'
+        # "compact" groups consecutive messages per author and dedups avatars and CSS.
+        self.transcript_style = os.getenv('TRANSCRIPT_STYLE', 'full')
+        if self.transcript_style not in TRANSCRIPT_STYLES:
+            raise ValueError(f"TRANSCRIPT_STYLE must be one of {', '.join(TRANSCRIPT_STYLES)}")
+        # Workers that render long transcripts off the event loop (0 renders everything on it).
+        render_workers = int(os.getenv('TRANSCRIPT_RENDER_WORKERS', 2))
+        self.render_pool = RenderPool(render_workers, kind=os.getenv('TRANSCRIPT_RENDER_POOL', 'process')) if render_workers else None
+        # Local, deduplicated copy of every uploaded transcript (TRANSCRIPT_STORE= disables it).
+        store_root = os.getenv('TRANSCRIPT_STORE', 'transcripts')
+        self.transcripts = TranscriptStore(
+            self.db, store_root,
+            retention_days=float(os.getenv('TRANSCRIPT_RETENTION_DAYS', 0)),
+            max_bytes=int(float(os.getenv('TRANSCRIPT_STORE_MAX_MB', 2048)) * 1024 * 1024),
+        ) if store_root else None
 
-    async def setup_hook(self):
-        self.setup_database()
-        
+        self.db.observer = metrics.observe_db
+        metrics.REGISTRY.gauge('ticketbot_cache_entries', 'Entries held by each cache.', ('cache',), lambda: {(name,): s['size'] for name, s in self.cache.stats().items()})
+        metrics.REGISTRY.gauge('ticketbot_cache_hits_total', 'Cache lookups answered from memory.', ('cache',), lambda: {(name,): s['hits'] for name, s in self.cache.stats().items()}, type='counter')
+        metrics.REGISTRY.gauge('ticketbot_cache_misses_total', 'Cache lookups that went to the database.', ('cache',), lambda: {(name,): s['misses'] for name, s in self.cache.stats().items()}, type='counter')
+        metrics.REGISTRY.gauge('ticketbot_gateway_latency_seconds', 'Heartbeat latency per shard.', ('shard',), lambda: {(shard_id,): latency for shard_id, latency in self.latencies})
+        # Prometheus endpoint; each cluster listens on METRICS_PORT + its cluster id.
+        self.metrics_server = metrics.MetricsServer(metrics.REGISTRY, os.getenv('METRICS_HOST', '127.0.0.1'), int(os.getenv('METRICS_PORT')) + cluster.cluster_id) if os.getenv('METRICS_PORT') else None
+        # Event loop stall detector (WATCHDOG=1, see /watchdog); None when disabled.
+        self.watchdog = LoopWatchdog.from_env()
+
+    async def setup_database(self):
+        with self.startup.phase('database'):
+            await self.db.connect()
+            await run_migrations(self.db)
+            # Rows still waiting for a channel were interrupted mid-creation; drop them so
+            # the one-open-ticket constraint does not lock their owners out. Other
+            # clusters may be creating tickets right now, so only touch our own guilds.
+            owned, params = self.cluster.sql_filter()
+            await self.db.execute(f"DELETE FROM tickets WHERE channel_id = 0 AND {owned}", params)
+            await self.cache.warm()
+            self.archive.start()
+
+    async def _load_extension(self, extension: str):
+        with self.startup.phase(extension, into=self.startup.extensions):
+            try:
+                await self.load_extension(extension)
+            except Exception as e:
+                self.startup.failures[extension] = repr(e)
+                print(f'Failed to load extension {extension}.')
+                traceback.print_exception(e)
+
+    async def load_extensions(self):
         initial_extensions = [
             'cogs.panel',
             'cogs.ticket_system',
             'cogs.ticket_commands',
+            'cogs.automation',
+            'cogs.message_archive',
+            'cogs.admin',
+            'cogs.bulk',
+            'cogs.ticket_search',
             'cogs.help'
         ]
-        for extension in initial_extensions:
+        with self.startup.phase('extensions'):
+            await asyncio.gather(*(self._load_extension(extension) for extension in initial_extensions))
+
+    async def sync_commands(self):
+        # Global syncs are heavily rate limited, so only sync when the command tree
+        # differs from what was last uploaded for this application. FORCE_SYNC=1
+        # overrides this, e.g. after commands were changed from another deployment.
+        with self.startup.phase('sync'):
+            key = f'command_tree:{self.application_id}'
+            fingerprint = tree_fingerprint(self.tree)
+            if os.getenv('FORCE_SYNC', '0') != '1' and await get_state(self.db, key) == fingerprint:
+                self.startup.sync = 'unchanged'
+                return
             try:
-                await self.load_extension(extension)
-            except Exception as e:
-                print(f'Failed to load extension {extension}.')
-                print(e)
+                await self.tree.sync()
+            except discord.HTTPException as e:
+                # Keep the old fingerprint so the next start retries.
+                self.startup.sync = 'failed'
+                print(f'Failed to sync application commands: {e}')
+                return
+            await set_state(self.db, key, fingerprint)
+            self.startup.sync = 'synced'
+
+    async def setup_hook(self):
+        # Watch the loop from the start so slow startup work is reported too.
+        if self.watchdog:
+            self.watchdog.start()
+
+        # Cog setup must not depend on the database: extensions are imported and
+        # loaded while migrations and cache warm-up run on the database threads.
+        await asyncio.gather(self.setup_database(), self.load_extensions())
         
         # Views are added here to be persistent across restarts
-        ticket_system_cog = self.get_cog('TicketSystem')
-        if ticket_system_cog:
-            self.add_view(ticket_system_cog.CreateTicketView())
-            self.add_view(ticket_system_cog.OpenTicketView())
-            self.add_view(ticket_system_cog.ClosedTicketView())
-            self.add_view(ticket_system_cog.CloseRequestView())
+        with self.startup.phase('views'):
+            ticket_system_cog = self.get_cog('TicketSystem')
+            if ticket_system_cog:
+                self.add_view(ticket_system_cog.CreateTicketView())
+                self.add_view(ticket_system_cog.OpenTicketView())
+                self.add_view(ticket_system_cog.ClosedTicketView())
+                self.add_view(ticket_system_cog.CloseRequestView())
+
+        if self.metrics_server:
+            await self.metrics_server.start()
+
+        # Start job workers once every cog has registered its handlers; this also
+        # resumes jobs interrupted by a previous shutdown or crash.
+        with self.startup.phase('jobs'):
+            await self.jobs.start()
+            # Store compaction is not tied to a guild, so only the primary cluster runs it.
+            if self.transcripts and self.cluster.primary:
+                await self.transcripts.schedule(self.jobs)
+
+        with self.startup.phase('timers'):
+            await self.timers.start()
+
+        # setup_hook runs once per process (after login, before connecting), so
+        # gateway reconnects never trigger a sync. Commands are global; one
+        # cluster syncing them is enough.
+        if self.cluster.primary:
+            await self.sync_commands()
 
     async def on_ready(self):
-        print(f'Logged in as {self.user} (ID: {self.user.id})')
+        print(f'Logged in as {self.user} (ID: {self.user.id}), cluster {self.cluster.cluster_id} running shards {sorted(self.shards)}')
         print('------')
-        await self.tree.sync()
+        if self.startup.ready():
+            print(f'Startup report: {json.dumps(self.startup.as_dict())}')
+            await self.startup.save(self.db, self.cluster.cluster_id)
 
-    # Removed get_db_connection method
+    async def close(self):
+        await super().close()
+        if self.metrics_server:
+            await self.metrics_server.close()
+        await self.pool.close()
+        await self.jobs.close()
+        await self.timers.close()
+        await self.archive.close()
+        if self.render_pool:
+            self.render_pool.close()
+        await self.db.close()
+        if self.watchdog:
+            await self.watchdog.close()
 
-bot = TicketBot()
-bot.run(os.getenv('DISCORD_TOKEN'))
+# Guarded because transcript render workers are spawned processes, which import this module.
+if __name__ == '__main__':
+    bot = TicketBot()
+    bot.run(os.getenv('DISCORD_TOKEN'))
@@ -0,0 +1,148 @@
+import io
+import os
+from typing import Optional
+import discord
+from discord.ext import commands
+from discord import app_commands
+from utils import metrics
+from utils.ticket_archive import aiter_records, load_ticket_archive
+from utils.transcript import STYLES, records_transcript_file
+
+def _ms(seconds) -> str:
+    return "—" if seconds is None else f"{seconds * 1000:.0f}ms" if seconds < 10 else f"{seconds:.1f}s"
+
+def _size(n) -> str:
+    return "—" if n is None else f"{n / 1024:.0f} KiB" if n < 1024 * 1024 else f"{n / 1024 / 1024:.1f} MiB"
+
+class Admin(commands.Cog):
+    pool = app_commands.Group(name="pool", description="Configure pre-created ticket channels.", default_permissions=discord.Permissions(administrator=True), guild_only=True)
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @app_commands.command(name="jobs", description="Show the status of background jobs.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def jobs(self, interaction: discord.Interaction):
+        stats = await self.bot.jobs.stats(guild_id=interaction.guild.id)
+        counts = stats["counts"]
+        embed = discord.Embed(title="Background Jobs", color=discord.Color.blurple())
+        for status in ("pending", "running", "done", "failed"):
+            embed.add_field(name=status.capitalize(), value=str(counts.get(status, 0)))
+        embed.add_field(name="Workers", value=str(stats["workers"]))
+        if stats["recent"]:
+            lines = []
+            for job in stats["recent"]:
+                error = f" — `{job['last_error'][:80]}`" if job["last_error"] else ""
+                lines.append(f"`#{job['job_id']}` {job['kind']} · {job['status']} · attempt {job['attempts']} · <t:{int(job['updated_at'])}:R>{error}")
+            embed.add_field(name="Recent unfinished jobs", value="\n".join(lines)[:1024], inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="botstats", description="Show handler, database, transcript and Discord API latency.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def botstats(self, interaction: discord.Interaction):
+        embed = discord.Embed(title="Bot Performance", description="Latency since this process started (p50 / p95).", color=discord.Color.blurple())
+        rows = metrics.summarize(metrics.INTERACTION_SECONDS, metrics.INTERACTION_ERRORS)
+        embed.add_field(name="Slowest handlers", inline=False, value="\n".join(
+            f"`{name}` {_ms(r['p50'])} / {_ms(r['p95'])} · {r['count']} calls" + (f" · **{r['errors']} errors**" if r['errors'] else "")
+            for r in rows for kind, name in [r['labels']]
+        )[:1024] or "No interactions yet.")
+        rows = metrics.summarize(metrics.DB_SECONDS, metrics.DB_ERRORS, top=5, key="total")
+        embed.add_field(name="Database (by total time)", inline=False, value="\n".join(
+            f"`{op}` `{query[:60]}` {_ms(r['p50'])} / {_ms(r['p95'])} · {r['count']} calls" + (f" · **{r['errors']} errors**" if r['errors'] else "")
+            for r in rows for op, query in [r['labels']]
+        )[:1024] or "No queries yet.")
+        rows = metrics.summarize(metrics.REST_SECONDS, top=5)
+        rate_limited = sum(n for (route, status), n in metrics.REST_RESPONSES.values.items() if status == "429")
+        waits = metrics.summarize(metrics.REST_QUEUE_SECONDS, top=3)
+        embed.add_field(name="Discord REST", inline=False, value=("\n".join(
+            f"`{method} {route}` {_ms(r['p50'])} / {_ms(r['p95'])} · {r['count']} calls" for r in rows for method, route in [r['labels']]
+        ) + f"\n429 responses: **{int(rate_limited)}**" + "".join(
+            f"\nQueued `{r['labels'][0]}`: {_ms(r['p50'])} / {_ms(r['p95'])}" for r in waits
+        ))[:1024])
+        embed.add_field(name="Transcripts", inline=False, value="\n".join(
+            f"{mode}: {_ms(r['p50'])} / {_ms(r['p95'])} · median {_size(metrics.TRANSCRIPT_BYTES.quantile(0.5, mode))} · {r['count']} rendered"
+            for r in metrics.summarize(metrics.TRANSCRIPT_SECONDS) for (mode,) in [r['labels']]
+        ) or "None rendered yet.")
+        if self.bot.transcripts:
+            store = await self.bot.transcripts.stats()
+            limit = f" of {_size(store['max_bytes'])}" if store['max_bytes'] else ""
+            embed.add_field(name="Transcript store", inline=False, value=(
+                f"{store['transcripts']} transcripts · {_size(store['html_bytes'])} of HTML in {_size(store['stored_bytes'])}{limit} on disk ({store['objects']} objects)"
+            ))
+        embed.add_field(name="Cache hit rate", inline=False, value=" · ".join(f"{name} {stats['hit_rate']:.0%}" for name, stats in self.bot.cache.stats().items()))
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="watchdog", description="Show event loop lag, recent stalls and the hottest handlers.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def watchdog(self, interaction: discord.Interaction):
+        watchdog = self.bot.watchdog
+        if watchdog is None:
+            return await interaction.response.send_message("The loop watchdog is disabled. Set `WATCHDOG=1` (and optionally `WATCHDOG_PROFILE=1`) to enable it.", ephemeral=True)
+        summary = watchdog.summary()
+        embed = discord.Embed(title="Event Loop Watchdog", color=discord.Color.blurple(), description=(
+            f"Lag p50 {_ms(summary['p50'])} · p99 {_ms(summary['p99'])} · max {_ms(summary['max'])}\n"
+            f"**{summary['stalls']}** stalls over {_ms(summary['threshold'])} since this process started"
+        ))
+        embed.add_field(name="Recent stalls", inline=False, value="\n".join(
+            f"<t:{int(stall['at'])}:R> `{stall['handler']}` {_ms(stall['duration'])}" + (f" at `{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}`" if frame else "")
+            for stall in summary['recent'] for frame in [stall['stack'][-1] if stall['stack'] else None]
+        )[:1024] or "None.")
+        if summary['profile']:
+            embed.add_field(name="Hottest handlers (sampled)", inline=False, value="\n".join(
+                f"`{hot['handler']}` ~{_ms(hot['seconds'])} on the loop · " + ", ".join(f"`{leaf}` {n}" for leaf, n in hot['leaves'])
+                for hot in summary['hot']
+            )[:1024] or "No samples yet.")
+        # Full stacks and folded profile stacks; the same stalls are also in the watchdog log.
+        file = discord.File(io.BytesIO(watchdog.dump().encode()), filename="watchdog.txt")
+        await interaction.response.send_message(embed=embed, file=file, ephemeral=True)
+
+    @app_commands.command(name="archived", description="Render the transcript of an archived ticket, even if its channel is gone.")
+    @app_commands.describe(number="The ticket number.", style="Transcript style (defaults to the bot's setting).")
+    @app_commands.choices(style=[app_commands.Choice(name=style, value=style) for style in STYLES])
+    @app_commands.checks.has_permissions(administrator=True)
+    async def archived(self, interaction: discord.Interaction, number: int, style: Optional[str] = None):
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        # The stored copy of the uploaded transcript is a local read; render only for another style or if it is gone.
+        stored = await self.bot.transcripts.find(interaction.guild.id, number) if self.bot.transcripts else None
+        if stored and style in (None, stored['style']) and (file := await self.bot.transcripts.file(stored, compress=self.bot.transcript_compress)):
+            return await interaction.followup.send(f"Transcript for ticket `#{number}` (stored <t:{int(stored['created_at'])}:R>).", file=file, ephemeral=True)
+        archive = await load_ticket_archive(self.bot.db, interaction.guild.id, number)
+        if archive is None:
+            return await interaction.followup.send(f"Ticket `#{number}` has no archive. Tickets are archived when they are closed.", ephemeral=True)
+        header, records = archive
+        file = await records_transcript_file(header['channel_name'], aiter_records(records), compress=self.bot.transcript_compress, style=style or self.bot.transcript_style, pool=self.bot.render_pool, guild=interaction.guild)
+        await interaction.followup.send(f"Transcript for ticket `#{number}` (opened by <@{header['owner_id']}>, archived <t:{int(header['archived_at'])}:R>).", file=file, ephemeral=True)
+
+    async def panel_autocomplete(self, interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+        panels = await self.bot.db.fetchall("SELECT panel_id, panel_name FROM panels WHERE guild_id = ?", (interaction.guild.id,))
+        return [app_commands.Choice(name=p['panel_name'][:100], value=str(p['panel_id'])) for p in panels if current.lower() in p['panel_name'].lower()][:25]
+
+    @pool.command(name="size", description="Keep this many hidden channels ready for a panel (0 disables the pool).")
+    @app_commands.describe(panel="The panel to configure.", size="Number of channels to keep ready.")
+    @app_commands.autocomplete(panel=panel_autocomplete)
+    async def pool_size(self, interaction: discord.Interaction, panel: str, size: app_commands.Range[int, 0, 25]):
+        data = await self.bot.cache.panel(int(panel)) if panel.isdigit() else None
+        if not data or data['guild_id'] != interaction.guild.id:
+            return await interaction.response.send_message("Panel not found.", ephemeral=True)
+        await self.bot.cache.save_panel(data['panel_id'], {"pool_size": size}, data['support_roles'])
+        self.bot.pool.refill(interaction.guild, await self.bot.cache.panel(data['panel_id']))
+        await interaction.response.send_message(f"Channel pool for **{data['panel_name']}** set to {size}. It is being {'filled' if size else 'emptied'} in the background.", ephemeral=True)
+
+    @pool.command(name="status", description="Show channel pool size, hit rate and refill lag per panel.")
+    async def pool_status(self, interaction: discord.Interaction):
+        embed = discord.Embed(title="Ticket Channel Pools", color=discord.Color.blurple())
+        for row in await self.bot.db.fetchall("SELECT panel_id FROM panels WHERE guild_id = ? AND (pool_size > 0 OR panel_id IN (SELECT panel_id FROM channel_pool))", (interaction.guild.id,)):
+            panel = await self.bot.cache.panel(row['panel_id'])
+            status = await self.bot.pool.status(panel)
+            lag = lambda seconds: f"{seconds:.1f}s" if seconds is not None else "—"
+            embed.add_field(name=panel['panel_name'], inline=False, value=(
+                f"Ready: {status['size']}/{status['target']}{' (refilling)' if status['refilling'] else ''}\n"
+                f"Hit rate: {status['hit_rate']:.0%} ({status['hits']} hits, {status['misses']} misses)\n"
+                f"Refill lag: last {lag(status['last_lag'])}, avg {lag(status['avg_lag'])}, current {lag(status['lag_now'])}"
+            ))
+        if not embed.fields:
+            embed.description = "No panel has a channel pool. Use `/pool size` to enable one."
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Admin(bot))
@@ -0,0 +1,201 @@
+import time
+from typing import Optional
+import discord
+from discord.ext import commands
+from discord import app_commands
+from utils.timers import Timer
+
+AUTO_CLOSE = "auto_close"
+CLOSE_REQUEST = "close_request"
+UNCLAIMED = "unclaimed"
+# Reminders about one unclaimed ticket stop after this many.
+REMINDER_LIMIT = 3
+
+# Per-panel ticket automation, driven by the bot's TimerScheduler:
+#  - auto_close: an open ticket with no message for auto_close_hours is closed.
+#  - close_request: a /closerequest the owner does not answer within
+#    close_request_hours closes the ticket.
+#  - unclaimed: support roles are reminded every unclaimed_reminder_minutes,
+#    up to REMINDER_LIMIT times, while a ticket of a claimable panel is unclaimed.
+#
+# Messages do not touch the inactivity timer; that would be a database write
+# per message. They only record the time in memory, and when the timer fires
+# it is re-armed from the last message if there was one since. After a restart
+# that record is gone and the channel's last message stands in, even if the
+# bot sent it, so in doubt a ticket stays open for another period rather than
+# closing early. Handlers check the ticket's current state and the panel's
+# setting, so timers left behind by a ticket closed or deleted some other
+# way, or by a setting turned off since, do nothing.
+
+class TicketAutomation(commands.Cog):
+    automation = app_commands.Group(name="automation", description="Close idle tickets and remind staff about unclaimed ones.", default_permissions=discord.Permissions(administrator=True), guild_only=True)
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        # ticket_id -> time of the last message a person sent in it since this process started.
+        self.activity: dict[int, float] = {}
+
+    async def cog_load(self):
+        self.bot.timers.register(AUTO_CLOSE, self.auto_close)
+        self.bot.timers.register(CLOSE_REQUEST, self.close_request_expired)
+        self.bot.timers.register(UNCLAIMED, self.remind_unclaimed)
+
+    # --- Arming (called by the ticket cogs) ---
+    def _timers(self, ticket: dict, panel: dict, now: float) -> list[Timer]:
+        timers = []
+        if panel['auto_close_hours']:
+            timers.append(Timer(AUTO_CLOSE, ticket['ticket_id'], ticket['guild_id'], ticket['channel_id'], now + panel['auto_close_hours'] * 3600))
+        if panel['is_claimable'] and panel['unclaimed_reminder_minutes'] and ticket['claimed_by_id'] is None:
+            timers.append(Timer(UNCLAIMED, ticket['ticket_id'], ticket['guild_id'], ticket['channel_id'], now + panel['unclaimed_reminder_minutes'] * 60, {'reminders': 0}))
+        return timers
+
+    async def ticket_opened(self, ticket: dict, panel: Optional[dict]):
+        """Arm the timers of a ticket that was just created or re-opened."""
+        if panel and (timers := self._timers(ticket, panel, time.time())):
+            await self.bot.timers.set_many(timers)
+
+    async def ticket_closed(self, ticket: dict):
+        self.activity.pop(ticket['ticket_id'], None)
+        await self.bot.timers.cancel(ticket['ticket_id'])
+
+    async def claim_changed(self, ticket: dict, panel: dict):
+        if ticket['claimed_by_id'] is not None:
+            await self.bot.timers.cancel(ticket['ticket_id'], UNCLAIMED)
+        elif panel['unclaimed_reminder_minutes'] and ticket['status'] == 'open':
+            await self.bot.timers.set(UNCLAIMED, ticket['ticket_id'], ticket['guild_id'], ticket['channel_id'], time.time() + panel['unclaimed_reminder_minutes'] * 60, {'reminders': 0})
+
+    async def close_requested(self, ticket: dict, panel: dict, requested_by: discord.abc.User):
+        hours = panel['close_request_hours']
+        await self.bot.timers.set(CLOSE_REQUEST, ticket['ticket_id'], ticket['guild_id'], ticket['channel_id'], time.time() + hours * 3600, {
+            'requested_by': requested_by.id, 'hours': hours,
+        })
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        # The set check first, so busy non-ticket channels do not fill the ticket cache with misses.
+        if message.author.bot or not message.guild or not self.bot.cache.is_ticket_channel(message.channel.id):
+            return
+        ticket = await self.bot.cache.ticket(message.channel.id)
+        if not ticket or ticket['status'] != 'open':
+            return
+        self.activity[ticket['ticket_id']] = time.time()
+        # The owner answering a close request means it is not settled yet.
+        if message.author.id == ticket['owner_id'] and self.bot.timers.get(CLOSE_REQUEST, ticket['ticket_id']):
+            await self.bot.timers.cancel(ticket['ticket_id'], CLOSE_REQUEST)
+
+    # --- Timer handlers ---
+    async def _load(self, timer: Timer) -> tuple[Optional[dict], Optional[dict], Optional[discord.TextChannel]]:
+        await self.bot.wait_until_ready()
+        channel = self.bot.get_channel(timer.channel_id)
+        ticket = await self.bot.cache.ticket(timer.channel_id) if channel else None
+        if not ticket or ticket['ticket_id'] != timer.ticket_id or ticket['status'] != 'open':
+            return None, None, None
+        return ticket, await self.bot.cache.panel(ticket['panel_id']), channel
+
+    def last_activity(self, ticket: dict, channel: discord.TextChannel) -> float:
+        if (last := self.activity.get(ticket['ticket_id'])) is not None:
+            return last
+        return discord.utils.snowflake_time(channel.last_message_id).timestamp() if channel.last_message_id else 0.0
+
+    async def auto_close(self, timer: Timer):
+        ticket, panel, channel = await self._load(timer)
+        if not panel or not panel['auto_close_hours']:
+            return
+        hours = panel['auto_close_hours']
+        due = self.last_activity(ticket, channel) + hours * 3600
+        if due > time.time():
+            await self.bot.timers.set(AUTO_CLOSE, timer.ticket_id, timer.guild_id, timer.channel_id, due)
+            return
+        await self.bot.get_cog('TicketCommands').close_channel(channel, ticket, f"Ticket closed automatically after {hours:g} hours without activity.")
+
+    async def close_request_expired(self, timer: Timer):
+        ticket, panel, channel = await self._load(timer)
+        if not panel or not panel['close_request_hours']:
+            return
+        request = timer.payload
+        await self.bot.get_cog('TicketCommands').close_channel(
+            channel, ticket, f"Ticket closed automatically: the close request by <@{request['requested_by']}> had no reply for {request['hours']:g} hours.",
+        )
+
+    async def remind_unclaimed(self, timer: Timer):
+        ticket, panel, channel = await self._load(timer)
+        if not panel or not panel['is_claimable'] or not (minutes := panel['unclaimed_reminder_minutes']) or ticket['claimed_by_id'] is not None:
+            return
+        reminders = timer.payload['reminders'] + 1
+        roles = " ".join(f"<@&{role_id}>" for role_id in sorted(panel['support_roles']))
+        await self.bot.rest.run('message_send', channel.id, lambda: channel.send(f"{roles} This ticket has been waiting {reminders * minutes} minutes for someone to `/claim` it."))
+        if reminders < REMINDER_LIMIT:
+            await self.bot.timers.set(UNCLAIMED, timer.ticket_id, timer.guild_id, timer.channel_id, time.time() + minutes * 60, {'reminders': reminders})
+
+    # --- Commands ---
+    async def panel_autocomplete(self, interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+        panels = await self.bot.db.fetchall("SELECT panel_id, panel_name FROM panels WHERE guild_id = ?", (interaction.guild.id,))
+        return [app_commands.Choice(name=p['panel_name'][:100], value=str(p['panel_id'])) for p in panels if current.lower() in p['panel_name'].lower()][:25]
+
+    @automation.command(name="set", description="Set a panel's inactivity auto-close, close request expiry and unclaimed reminders (0 disables).")
+    @app_commands.describe(
+        panel="The panel to configure.",
+        auto_close_hours="Close open tickets after this many hours without a message.",
+        close_request_hours="Close a ticket this many hours after /closerequest unless its owner replies.",
+        reminder_minutes="Remind support roles every this many minutes while a ticket is unclaimed (claimable panels).",
+    )
+    @app_commands.autocomplete(panel=panel_autocomplete)
+    async def automation_set(self, interaction: discord.Interaction, panel: str,
+                             auto_close_hours: Optional[app_commands.Range[float, 0, 8760]] = None,
+                             close_request_hours: Optional[app_commands.Range[float, 0, 8760]] = None,
+                             reminder_minutes: Optional[app_commands.Range[int, 0, 10080]] = None):
+        data = await self.bot.cache.panel(int(panel)) if panel.isdigit() else None
+        if not data or data['guild_id'] != interaction.guild.id:
+            return await interaction.response.send_message("Panel not found.", ephemeral=True)
+        values = {column: value for column, value in (('auto_close_hours', auto_close_hours), ('close_request_hours', close_request_hours), ('unclaimed_reminder_minutes', reminder_minutes)) if value is not None}
+        armed = 0
+        if values:
+            await interaction.response.defer(ephemeral=True)
+            await self.bot.cache.save_panel(data['panel_id'], values, data['support_roles'])
+            data = await self.bot.cache.panel(data['panel_id'])
+            # Tickets already open get a full period from now. Pending timers of a
+            # setting that was turned off are left to fire and do nothing.
+            changed = {'auto_close_hours': AUTO_CLOSE, 'unclaimed_reminder_minutes': UNCLAIMED}
+            kinds = {changed[column] for column in values if column in changed}
+            if kinds:
+                now = time.time()
+                tickets = await self.bot.db.fetchall("SELECT * FROM tickets WHERE panel_id = ? AND status = 'open' AND channel_id != 0", (data['panel_id'],))
+                timers = [timer for row in tickets for timer in self._timers(dict(row), data, now) if timer.kind in kinds]
+                if timers:
+                    armed = len(await self.bot.timers.set_many(timers))
+        off = lambda value, unit: f"{value:g} {unit}" if value else "off"
+        message = (
+            f"Automation for **{data['panel_name']}**:\n"
+            f"Inactivity auto-close: {off(data['auto_close_hours'], 'hours')}\n"
+            f"Close request expiry: {off(data['close_request_hours'], 'hours')}\n"
+            f"Unclaimed reminders: {off(data['unclaimed_reminder_minutes'], 'minutes')}" + ("" if data['is_claimable'] else " (the panel is not claimable)")
+        )
+        if armed:
+            message += f"\nScheduled {armed} timer(s) for tickets already open."
+        if interaction.response.is_done():
+            await interaction.followup.send(message, ephemeral=True)
+        else:
+            await interaction.response.send_message(message, ephemeral=True)
+
+    @automation.command(name="status", description="Show automation settings per panel and the timers pending in this process.")
+    async def automation_status(self, interaction: discord.Interaction):
+        stats = self.bot.timers.stats()
+        embed = discord.Embed(title="Ticket Automation", color=discord.Color.blurple())
+        rows = await self.bot.db.fetchall("SELECT panel_name, auto_close_hours, close_request_hours, unclaimed_reminder_minutes FROM panels WHERE guild_id = ? AND (auto_close_hours > 0 OR close_request_hours > 0 OR unclaimed_reminder_minutes > 0)", (interaction.guild.id,))
+        for row in rows[:20]:
+            embed.add_field(name=row['panel_name'][:256], inline=False, value=(
+                f"Auto-close {row['auto_close_hours']:g}h · close requests {row['close_request_hours']:g}h · reminders {row['unclaimed_reminder_minutes']}min"
+            ))
+        if not rows:
+            embed.description = "No panel has automation set. Use `/automation set` to enable it."
+        pending = stats['pending']
+        late = lambda seconds: f"{seconds:.1f}s" if seconds is not None else "—"
+        embed.add_field(name="Timers", inline=False, value=(
+            f"Pending: {pending.get(AUTO_CLOSE, 0)} auto-close · {pending.get(CLOSE_REQUEST, 0)} close requests · {pending.get(UNCLAIMED, 0)} reminders\n"
+            + (f"Next due <t:{int(stats['next_due'])}:R>\n" if stats['next_due'] else "")
+            + f"Fired: {stats['fired']} · lateness p50 {late(stats['lateness_p50'])}, max {late(stats['lateness_max'])}"
+        ))
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(TicketAutomation(bot))
@@ -0,0 +1,185 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+from typing import Literal, Optional
+import asyncio
+import datetime
+import json
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+ACTIONS = {
+    "close": "Close",
+    "delete": "Delete",
+    "transcript": "Transcript",
+}
+
+class BulkOperations(commands.Cog):
+    bulk = app_commands.Group(name="bulk", description="Close, delete or transcript many tickets at once.", default_permissions=discord.Permissions(administrator=True), guild_only=True)
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self._progress_tasks: set[asyncio.Task] = set()
+
+    async def cog_load(self):
+        self.bot.jobs.register('bulk_close', self.close_job)
+        self.bot.jobs.register('bulk_delete', self.delete_job)
+        self.bot.jobs.register('bulk_transcript', self.transcript_job)
+
+    async def cog_unload(self):
+        for task in self._progress_tasks:
+            task.cancel()
+
+    # --- Job handlers ---
+    # Each handler is safe to retry. A close claims the ticket's status before
+    # touching the channel and undoes it if the channel cannot be updated; the
+    # other handlers write the ticket's state change last, so a job that fails
+    # halfway simply redoes the remaining REST calls on the next attempt.
+    async def _load(self, payload: dict):
+        await self.bot.wait_until_ready()
+        return await self.bot.cache.ticket(payload['channel_id']), self.bot.get_channel(payload['channel_id'])
+
+    async def close_job(self, payload: dict):
+        ticket, channel = await self._load(payload)
+        if not ticket or ticket['status'] != 'open':
+            return
+        if channel:
+            # The same close as the button's, paced for bulk; its transcript is queued as a job of its own.
+            await self.bot.get_cog('TicketCommands').close_channel(channel, ticket, f"Ticket closed by <@{payload['requested_by']}> (bulk close).", paced=True)
+        elif await self.bot.cache.set_status(payload['channel_id'], 'closed', expected='open'):
+            if (automation := self.bot.get_cog('TicketAutomation')):
+                await automation.ticket_closed(ticket)
+
+    async def delete_job(self, payload: dict):
+        ticket, channel = await self._load(payload)
+        if not ticket:
+            return
+        if channel:
+            if ticket['status'] == 'open':
+                await self.bot.get_cog('TicketCommands').upload_transcript(channel, ticket)
+            elif not await self.bot.jobs.finish('ticket_transcript', 'channel_id', channel.id):
+                # A closed ticket's transcript job may not have run yet; the channel waits for it.
+                raise RuntimeError(f"The transcript of channel {channel.id} is not saved yet")
+            try:
+                await self.bot.rest.run('channel_delete', channel.id, lambda: channel.delete(reason=f"Bulk delete requested by {payload['requested_by']}"))
+            except discord.NotFound:
+                pass
+        await self.bot.cache.delete_ticket(payload['channel_id'])
+
+    async def transcript_job(self, payload: dict):
+        ticket, channel = await self._load(payload)
+        if ticket and channel:
+            await self.bot.get_cog('TicketCommands').upload_transcript(channel, ticket)
+
+    # --- Commands ---
+    async def panel_autocomplete(self, interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+        panels = await self.bot.db.fetchall("SELECT panel_id, panel_name FROM panels WHERE guild_id = ?", (interaction.guild.id,))
+        return [app_commands.Choice(name=p['panel_name'][:100], value=str(p['panel_id'])) for p in panels if current.lower() in p['panel_name'].lower()][:25]
+
+    async def _select(self, guild_id: int, panel: Optional[str], inactive_days: Optional[int], status: Optional[str]) -> list[int]:
+        sql = "SELECT t.channel_id, (SELECT MAX(a.message_id) FROM archived_messages a WHERE a.channel_id = t.channel_id) AS last_archived FROM tickets t WHERE t.guild_id = ? AND t.channel_id != 0"
+        params = [guild_id]
+        if panel:
+            sql += " AND t.panel_id = ?"
+            params.append(int(panel))
+        if status:
+            sql += " AND t.status = ?"
+            params.append(status)
+        rows = await self.bot.db.fetchall(sql, params)
+        if not inactive_days:
+            return [row['channel_id'] for row in rows]
+        # Last activity is the newest message archived or known to the channel.
+        # The archive misses what was sent while the bot was offline or before it
+        # existed, so a ticket with neither is only inactive if its channel has
+        # never had a message; one whose channel is not visible is left alone.
+        cutoff = discord.utils.time_snowflake(discord.utils.utcnow() - datetime.timedelta(days=inactive_days))
+        channel_ids = []
+        for row in rows:
+            channel = self.bot.get_channel(row['channel_id'])
+            if channel is None and row['last_archived'] is None:
+                continue
+            last = max(row['last_archived'] or 0, (channel.last_message_id or channel.id) if channel else 0)
+            if last < cutoff:
+                channel_ids.append(row['channel_id'])
+        return channel_ids
+
+    async def _start(self, interaction: discord.Interaction, action: str, panel: Optional[str], inactive_days: Optional[int], status: Optional[str]):
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        channel_ids = await self._select(interaction.guild.id, panel, inactive_days, status)
+        if not channel_ids:
+            return await interaction.followup.send("No tickets match those filters.", ephemeral=True)
+
+        filters = {"panel_id": int(panel) if panel else None, "inactive_days": inactive_days, "status": status}
+        cursor = await self.bot.db.execute(
+            "INSERT INTO bulk_operations (guild_id, action, filters, total, created_by, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (interaction.guild.id, action, json.dumps(filters), len(channel_ids), interaction.user.id, time.time()),
+        )
+        operation_id = cursor.lastrowid
+        payloads = [{"channel_id": channel_id, "requested_by": interaction.user.id} for channel_id in channel_ids]
+        await self.bot.jobs.enqueue_many(f"bulk_{action}", payloads, guild_id=interaction.guild.id, batch_id=operation_id)
+
+        message = await interaction.followup.send(await self._progress_text(operation_id), ephemeral=True, wait=True)
+        task = asyncio.create_task(self._report_progress(message, operation_id))
+        self._progress_tasks.add(task)
+        task.add_done_callback(self._progress_tasks.discard)
+
+    async def _progress_text(self, operation_id: int) -> str:
+        op = await self.bot.db.fetchone("SELECT * FROM bulk_operations WHERE operation_id = ?", (operation_id,))
+        counts = await self.bot.jobs.batch_progress(operation_id)
+        remaining = counts.get('pending', 0) + counts.get('running', 0)
+        text = f"**{ACTIONS[op['action']]}** operation `#{operation_id}`: {counts.get('done', 0)}/{op['total']} done, {counts.get('failed', 0)} failed, {remaining} remaining"
+        if counts.get('cancelled'):
+            text += f", {counts['cancelled']} cancelled"
+        return text + ("." if remaining else ". ✅ Finished.")
+
+    async def _report_progress(self, message: discord.WebhookMessage, operation_id: int):
+        # Interaction tokens expire after 15 minutes; /bulk status works after that.
+        deadline = time.monotonic() + 14 * 60
+        try:
+            while time.monotonic() < deadline:
+                await asyncio.sleep(5)
+                text = await self._progress_text(operation_id)
+                try:
+                    await message.edit(content=text)
+                except discord.HTTPException:
+                    return
+                if text.endswith("Finished."):
+                    return
+        except Exception:
+            log.exception("Progress reporting for bulk operation %d failed", operation_id)
+
+    @bulk.command(name="close", description="Close open tickets, uploading their transcripts.")
+    @app_commands.describe(panel="Only tickets from this panel", inactive_days="Only tickets with no messages for this many days")
+    @app_commands.autocomplete(panel=panel_autocomplete)
+    async def close(self, interaction: discord.Interaction, panel: Optional[str] = None, inactive_days: Optional[app_commands.Range[int, 1]] = None):
+        await self._start(interaction, "close", panel, inactive_days, "open")
+
+    @bulk.command(name="delete", description="Delete ticket channels. Open tickets get a transcript first.")
+    @app_commands.describe(panel="Only tickets from this panel", inactive_days="Only tickets with no messages for this many days", status="Only tickets with this status")
+    @app_commands.autocomplete(panel=panel_autocomplete)
+    async def delete(self, interaction: discord.Interaction, panel: Optional[str] = None, inactive_days: Optional[app_commands.Range[int, 1]] = None, status: Optional[Literal['open', 'closed']] = 'closed'):
+        await self._start(interaction, "delete", panel, inactive_days, status)
+
+    @bulk.command(name="transcript", description="Upload transcripts for matching tickets.")
+    @app_commands.describe(panel="Only tickets from this panel", inactive_days="Only tickets with no messages for this many days", status="Only tickets with this status")
+    @app_commands.autocomplete(panel=panel_autocomplete)
+    async def transcript(self, interaction: discord.Interaction, panel: Optional[str] = None, inactive_days: Optional[app_commands.Range[int, 1]] = None, status: Optional[Literal['open', 'closed']] = None):
+        await self._start(interaction, "transcript", panel, inactive_days, status)
+
+    @bulk.command(name="status", description="Show the progress of a bulk operation.")
+    async def status(self, interaction: discord.Interaction, operation_id: int):
+        if not await self.bot.db.fetchone("SELECT 1 FROM bulk_operations WHERE operation_id = ? AND guild_id = ?", (operation_id, interaction.guild.id)):
+            return await interaction.response.send_message("No bulk operation with that ID exists on this server.", ephemeral=True)
+        await interaction.response.send_message(await self._progress_text(operation_id), ephemeral=True)
+
+    @bulk.command(name="cancel", description="Cancel the remaining work of a bulk operation.")
+    async def cancel(self, interaction: discord.Interaction, operation_id: int):
+        if not await self.bot.db.fetchone("SELECT 1 FROM bulk_operations WHERE operation_id = ? AND guild_id = ?", (operation_id, interaction.guild.id)):
+            return await interaction.response.send_message("No bulk operation with that ID exists on this server.", ephemeral=True)
+        cancelled = await self.bot.jobs.cancel_batch(operation_id)
+        await interaction.response.send_message(f"Cancelled {cancelled} pending ticket(s) in operation `#{operation_id}`.", ephemeral=True)
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(BulkOperations(bot))
@@ -14,6 +14,14 @@ class HelpCommand(commands.Cog):
         )
         embed.add_field(name="/setup", value="Guides you through creating a new ticket panel.", inline=False)
         embed.add_field(name="/editpanel", value="Allows you to edit an existing ticket panel.", inline=False)
+        embed.add_field(name="/bulk `close|delete|transcript`", value="Processes many tickets at once, filtered by panel, inactivity or status. Track with `/bulk status`.", inline=False)
+        embed.add_field(name="/pool `size|status`", value="Keeps hidden channels ready per panel so new tickets open instantly, and shows pool hit rate and refill lag.", inline=False)
+        embed.add_field(name="/automation `set|status`", value="Closes idle tickets and unanswered close requests, and reminds staff about unclaimed tickets, per panel.", inline=False)
+        embed.add_field(name="/botstats", value="Shows command, button, database, transcript and Discord API latency.", inline=False)
+        embed.add_field(name="/watchdog", value="Shows event loop lag, recent stalls with the handler that caused them, and the hottest handlers when profiling is on.", inline=False)
+        embed.add_field(name="/search `query`", value="Searches the messages of closed tickets, optionally by panel, owner and date. Staff only.", inline=False)
+        embed.add_field(name="/archived", value="Sends the transcript of a closed ticket from the local store, or renders it from the archive, even after the channel was deleted.", inline=False)
+        embed.add_field(name="/jobs", value="Shows the status of background jobs such as transcript uploads.", inline=False)
         embed.add_field(name="Ticket Management Commands", value="These can only be used inside a ticket channel.", inline=False)
         embed.add_field(name="/add `target`", value="Gives a user or role access to the current ticket channel.", inline=True)
         embed.add_field(name="/remove `target`", value="Removes a user or role's access to the ticket channel.", inline=True)
@@ -21,7 +29,7 @@ class HelpCommand(commands.Cog):
         embed.add_field(name="/close", value="Closes the current ticket.", inline=True)
         embed.add_field(name="/rename `name`", value="Changes the ticket name.", inline=True)
         embed.add_field(name="/claim", value="Claim or unclaim the ticket.", inline=True)
-        embed.add_field(name="/closerequest", value="Sends a message asking the user to confirm the ticket can be closed.", inline=True)
+        embed.add_field(name="/closerequest", value="Sends a message asking the user to confirm the ticket can be closed. Closes it automatically if the panel has a close request expiry and the user does not reply.", inline=True)
         embed.add_field(name="/transcript", value="Generates a transcript of the ticket.", inline=True)
         
         await interaction.response.send_message(embed=embed, ephemeral=True)
@@ -0,0 +1,42 @@
+import discord
+from discord.ext import commands
+
+class MessageArchiver(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    def _is_ticket_channel(self, channel_id: int) -> bool:
+        return self.bot.cache.is_ticket_channel(channel_id)
+
+    @commands.Cog.listener()
+    async def on_shard_ready(self, shard_id: int):
+        # Everything from here on arrives as gateway events for this shard's guilds;
+        # earlier messages are backfilled from channel history when a transcript
+        # needs them. A resumed session replays missed events, so only a fresh
+        # identify (which fires this again) opens a new gap.
+        self.bot.archive.mark_live(shard_id)
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        if message.guild and self._is_ticket_channel(message.channel.id):
+            self.bot.archive.add(message)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        # The raw event fires for every edit, not only those of messages still in
+        # discord.py's message cache; payload.message is the message as edited.
+        if payload.guild_id and self._is_ticket_channel(payload.channel_id):
+            self.bot.archive.add(payload.message)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        if self._is_ticket_channel(payload.channel_id):
+            self.bot.archive.mark_deleted([payload.message_id])
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        if self._is_ticket_channel(payload.channel_id):
+            self.bot.archive.mark_deleted(payload.message_ids)
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(MessageArchiver(bot))
@@ -1,7 +1,6 @@
 import discord
 from discord.ext import commands
 from discord import app_commands, ui
-import sqlite3
 
 # --- MODAL FOR TEXT SETTINGS (IMPROVEMENT) ---
 class PanelTextSettingsModal(ui.Modal, title="Customize Panel Text"):
@@ -68,26 +67,19 @@ class PanelConfigurationView(ui.View):
         self.message = await interaction.original_response()
 
     async def load_panel_data(self, guild: discord.Guild):
-        with sqlite3.connect(self.bot.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            # UPDATED: Select support_role_ids
-            cursor.execute("SELECT * FROM panels WHERE panel_id = ?", (self.panel_id,))
-            data = cursor.fetchone()
-            if data:
-                # NEW: Logic to load multiple roles
-                support_role_ids = [int(r_id) for r_id in data["support_role_ids"].split(',') if r_id]
-                support_roles = [guild.get_role(r_id) for r_id in support_role_ids if guild.get_role(r_id)]
-                
-                self.old_panel_message_id = data["message_id"]
-                self.old_panel_channel_id = data["channel_id"]
-                self.panel_data = {
-                    "name": data["panel_name"], "support_roles": support_roles,
-                    "category": guild.get_channel(data["category_id"]), "transcript_channel": guild.get_channel(data["transcript_channel_id"]),
-                    "panel_channel": guild.get_channel(data["channel_id"]), "claimable": bool(data["is_claimable"]),
-                    "panel_description": data["panel_description"], "button_text": data["button_text"],
-                    "welcome_message": data["welcome_message"],
-                }
+        data = await self.bot.cache.panel(self.panel_id)
+        if data:
+            support_roles = [role for r_id in data["support_roles"] if (role := guild.get_role(r_id))]
+            
+            self.old_panel_message_id = data["message_id"]
+            self.old_panel_channel_id = data["channel_id"]
+            self.panel_data = {
+                "name": data["panel_name"], "support_roles": support_roles,
+                "category": guild.get_channel(data["category_id"]), "transcript_channel": guild.get_channel(data["transcript_channel_id"]),
+                "panel_channel": guild.get_channel(data["channel_id"]), "claimable": bool(data["is_claimable"]),
+                "panel_description": data["panel_description"], "button_text": data["button_text"],
+                "welcome_message": data["welcome_message"],
+            }
 
     def _get_val(self, key):
         val = self.panel_data.get(key)
@@ -213,19 +205,17 @@ class PanelConfigurationView(ui.View):
                 await interaction.followup.send(f"Error: Could not send panel message to {panel_channel.mention}. Please check my permissions.\n`{e}`", ephemeral=True)
                 return await self.view.message.delete()
             
-            with sqlite3.connect(self.view.bot.db_path) as conn:
-                cursor = conn.cursor()
-                # NEW: Convert list of role objects to a comma-separated string of IDs
-                support_role_ids_str = ",".join(str(role.id) for role in pd['support_roles'])
-                
-                params = (interaction.guild.id, pd['name'], panel_message.id, panel_channel.id, support_role_ids_str, pd['category'].id, pd['transcript_channel'].id, 1 if pd['claimable'] else 0, pd['panel_description'], pd['button_text'], pd['welcome_message'])
-                if self.view.panel_id:
-                    cursor.execute("UPDATE panels SET guild_id=?, panel_name=?, message_id=?, channel_id=?, support_role_ids=?, category_id=?, transcript_channel_id=?, is_claimable=?, panel_description=?, button_text=?, welcome_message=? WHERE panel_id=?", (*params, self.view.panel_id))
-                    msg = f"Panel '{pd['name']}' updated successfully in {panel_channel.mention}!"
-                else:
-                    cursor.execute("INSERT INTO panels (guild_id, panel_name, message_id, channel_id, support_role_ids, category_id, transcript_channel_id, is_claimable, panel_description, button_text, welcome_message) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", params)
-                    msg = f"Panel '{pd['name']}' created successfully in {panel_channel.mention}!"
-                conn.commit()
+            values = {
+                "guild_id": interaction.guild.id, "panel_name": pd['name'], "message_id": panel_message.id, "channel_id": panel_channel.id,
+                "category_id": pd['category'].id, "transcript_channel_id": pd['transcript_channel'].id,
+                "is_claimable": 1 if pd['claimable'] else 0, "panel_description": pd['panel_description'], "button_text": pd['button_text'],
+                "welcome_message": pd['welcome_message'],
+            }
+            await self.view.bot.cache.save_panel(self.view.panel_id, values, (role.id for role in pd['support_roles']))
+            if self.view.panel_id:
+                msg = f"Panel '{pd['name']}' updated successfully in {panel_channel.mention}!"
+            else:
+                msg = f"Panel '{pd['name']}' created successfully in {panel_channel.mention}!"
             
             await interaction.followup.send(msg, ephemeral=True)
             await self.view.message.delete()
@@ -267,11 +257,7 @@ class Panel(commands.Cog):
     @app_commands.command(name="editpanel", description="Edit an existing ticket panel.")
     @app_commands.checks.has_permissions(administrator=True)
     async def editpanel(self, interaction: discord.Interaction):
-        with sqlite3.connect(self.bot.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT panel_id, panel_name FROM panels WHERE guild_id = ?", (interaction.guild.id,))
-            panels = cursor.fetchall()
+        panels = await self.bot.db.fetchall("SELECT panel_id, panel_name FROM panels WHERE guild_id = ?", (interaction.guild.id,))
         if not panels: return await interaction.response.send_message("No panels found on this server to edit.", ephemeral=True)
         view = PanelSelectView(self.bot, interaction.user, panels)
         await interaction.response.send_message("Please select a panel to edit from the dropdown below.", view=view, ephemeral=True)
@@ -1,29 +1,36 @@
 import discord
 from discord.ext import commands
 from discord import app_commands, ui, Member, Role
-from typing import Union
-import os
+from typing import Awaitable, Callable, Optional, Union
+import asyncio
+import logging
 import sqlite3
-from .ticket_system import generate_transcript_file
+import time
+from utils.transcript import generate_transcript_file
+from utils.ticket_archive import save_ticket_archive
+from utils.transcript_store import COMPACT_INTERVAL, COMPACT_JOB
+from utils.cache import has_support_role
+
+log = logging.getLogger(__name__)
+
+# Button custom_id -> the persistent view (of TicketSystem) it belongs to.
+RESTORE_VIEWS = {
+    'persistent:close_ticket': 'OpenTicketView',
+    'persistent:confirm_close_ticket': 'CloseRequestView',
+    'persistent:reopen_ticket': 'ClosedTicketView',
+}
 
 async def is_support_staff(interaction: discord.Interaction) -> bool:
-    with sqlite3.connect(interaction.client.db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1 FROM tickets WHERE channel_id = ?", (interaction.channel.id,))
-        if not cursor.fetchone():
-            await interaction.response.send_message("This command can only be used in a ticket channel.", ephemeral=True, delete_after=10)
-            return False
-            
-        # UPDATED: Select support_role_ids
-        cursor.execute("SELECT p.support_role_ids FROM panels p JOIN tickets t ON p.panel_id = t.panel_id WHERE t.channel_id = ?", (interaction.channel.id,))
-        role_ids_tuple = cursor.fetchone()
-        if not role_ids_tuple: return False
+    cache = interaction.client.cache
+    ticket = await cache.ticket(interaction.channel.id)
+    if not ticket:
+        await interaction.response.send_message("This command can only be used in a ticket channel.", ephemeral=True, delete_after=10)
+        return False
+        
+    panel = await cache.panel(ticket['panel_id'])
+    if not panel: return False
     
-    # NEW: Logic to check multiple roles
-    support_role_ids = {int(r_id) for r_id in role_ids_tuple[0].split(',') if r_id}
-    user_role_ids = {role.id for role in interaction.user.roles}
-
-    if not (user_role_ids.intersection(support_role_ids) or interaction.user.guild_permissions.administrator):
+    if not (has_support_role(interaction.user, panel) or interaction.user.guild_permissions.administrator):
         await interaction.response.send_message("You do not have the required support role to use this command.", ephemeral=True)
         return False
     return True
@@ -32,58 +39,186 @@ class TicketCommands(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
+    async def cog_load(self):
+        self.bot.jobs.register('ticket_transcript', self.transcript_job)
+        if self.bot.transcripts:
+            self.bot.jobs.register(COMPACT_JOB, self.compact_job)
+
     async def execute_close(self, interaction: discord.Interaction, closed_by: discord.Member):
-        with sqlite3.connect(self.bot.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT t.*, p.transcript_channel_id FROM tickets t JOIN panels p ON t.panel_id = p.panel_id WHERE t.channel_id = ? AND t.status = 'open'", (interaction.channel.id,))
-            ticket = cursor.fetchone()
-            if not ticket:
-                if interaction.response.is_done():
-                    await interaction.followup.send("This is not an open ticket.", ephemeral=True)
-                else:
-                    await interaction.response.send_message("This is not an open ticket.", ephemeral=True)
-                return
-
-            cursor.execute("UPDATE tickets SET status = 'closed' WHERE channel_id = ?", (interaction.channel.id,))
-            conn.commit()
-
-        await interaction.channel.edit(name=f"closed-{ticket['ticket_num']:04d}")
-        owner = interaction.guild.get_member(ticket['owner_id'])
-        if owner: await interaction.channel.set_permissions(owner, send_messages=False, read_messages=True)
-
-        embed = discord.Embed(title="Ticket Closed", description=f"Ticket closed by {closed_by.mention}.", color=discord.Color.red())
-        transcript_filename = await generate_transcript_file(interaction.channel)
-        
-        if (trans_channel := interaction.guild.get_channel(ticket['transcript_channel_id'])):
-            owner_mention = owner.mention if owner else f"ID: {ticket['owner_id']}"
-            await trans_channel.send(f"Transcript for ticket `#{ticket['ticket_num']}` created by {owner_mention}", file=discord.File(transcript_filename))
-        os.remove(transcript_filename)
-        
-        if interaction.message:
-            await interaction.message.edit(content=None, embed=embed, view=self.bot.get_cog('TicketSystem').ClosedTicketView())
-        else:
-            await interaction.channel.send(embed=embed, view=self.bot.get_cog('TicketSystem').ClosedTicketView())
+        ticket = await self.bot.cache.ticket(interaction.channel.id)
+        panel = await self.bot.cache.panel(ticket['panel_id']) if ticket and ticket['status'] == 'open' else None
+        try:
+            closed = panel is not None and await self.close_channel(interaction.channel, ticket, f"Ticket closed by {closed_by.mention}.", interaction.message)
+        except discord.HTTPException as e:
+            return await interaction.followup.send(f"Could not close this ticket: {e.text or e}", ephemeral=True)
+        if not closed:
+            if interaction.response.is_done():
+                await interaction.followup.send("This is not an open ticket.", ephemeral=True)
+            else:
+                await interaction.response.send_message("This is not an open ticket.", ephemeral=True)
+
+    async def close_channel(self, channel: discord.TextChannel, ticket: dict, reason: str, message: Optional[discord.Message] = None, paced: bool = False) -> bool:
+        """Close an open ticket; ``message`` becomes the Ticket Closed message, otherwise one is sent.
+
+        Returns False if the ticket was no longer open. If the channel cannot be
+        updated the close is undone and the exception (usually HTTPException) raised.
+        With ``paced`` the requests go through the bot's RouteScheduler, for bulk work.
+        """
+        if not await self.bot.cache.set_status(channel.id, 'closed', expected='open'):
+            return False
+
+        async def enqueue_transcript():
+            # Transcript generation and upload can take a while for long tickets, so it
+            # runs on the job queue, starting as soon as the channel has its closed name.
+            await self.bot.jobs.enqueue('ticket_transcript', {
+                'ticket_id': ticket['ticket_id'], 'ticket_num': ticket['ticket_num'], 'channel_id': channel.id,
+                'panel_id': ticket['panel_id'], 'owner_id': ticket['owner_id'],
+            }, guild_id=channel.guild.id)
+
+        embed = discord.Embed(title="Ticket Closed", description=reason, color=discord.Color.red())
+        try:
+            await self._update_channel(channel, ticket, f"closed-{ticket['ticket_num']:04d}", False, embed, self.bot.get_cog('TicketSystem').ClosedTicketView(), message, enqueue_transcript, paced)
+        except Exception:
+            await self.bot.cache.set_status(channel.id, 'open', expected='closed')
+            raise
+        if (automation := self.bot.get_cog('TicketAutomation')):
+            await automation.ticket_closed(ticket)
+        return True
+
+    def _snapshot(self, message: discord.Message) -> dict:
+        # What message.edit needs to put ``message`` back as it was, buttons included.
+        views = self.bot.get_cog('TicketSystem')
+        custom_ids = (getattr(item, 'custom_id', None) for row in message.components for item in getattr(row, 'children', ()))
+        view = next((getattr(views, RESTORE_VIEWS[custom_id])() for custom_id in custom_ids if custom_id in RESTORE_VIEWS), None)
+        return {'content': message.content or None, 'embeds': message.embeds, 'view': view}
+
+    async def _update_channel(self, channel: discord.TextChannel, ticket: dict, name: str, owner_can_send: bool, embed: discord.Embed, view: ui.View,
+                              message: Optional[discord.Message] = None, after_edit: Optional[Callable[[], Awaitable[None]]] = None, paced: bool = False):
+        # Closing and re-opening used to be three requests in a row: rename, owner
+        # overwrite, status message. They are still three requests, but run at the
+        # same time, so a close costs one round trip. The owner's overwrite is set
+        # on its own rather than folded into the rename as a whole overwrite map:
+        # that map would have to be fetched first, a request the edit waits on, and
+        # writing it back would still undo an /add or /remove landing in between.
+        # discord.py already retries rate limits and server errors. If a channel change, or after_edit (run once both are through),
+        # still fails nothing may look closed (or open): the changes that went
+        # through are undone and the status message is put back; a message that
+        # cannot be edited is replaced by a new one instead.
+        owner = channel.guild.get_member(ticket['owner_id'])
+        old_name = channel.name
+        old_overwrite = channel.overwrites.get(owner) if owner else None
+        snapshot = self._snapshot(message) if message else None
+        undo: list[Callable[[], Awaitable]] = []
+
+        def request(route: str, call: Callable[[], Awaitable]) -> Awaitable:
+            return self.bot.rest.run(route, channel.id, call) if paced else call()
+
+        async def rename():
+            if old_name != name:
+                await request('channel_edit', lambda: channel.edit(name=name))
+                undo.append(lambda: channel.edit(name=old_name))
+
+        async def set_owner():
+            if owner:
+                await request('permissions', lambda: channel.set_permissions(owner, read_messages=True, send_messages=owner_can_send))
+                undo.append(lambda: channel.set_permissions(owner, overwrite=old_overwrite))
+
+        async def edit_channel():
+            for result in await asyncio.gather(rename(), set_owner(), return_exceptions=True):
+                if isinstance(result, BaseException):
+                    raise result
+            if after_edit:
+                await after_edit()
+
+        async def post() -> Optional[discord.Message]:
+            if message:
+                try:
+                    await message.edit(content=None, embed=embed, view=view)
+                    return None
+                except discord.HTTPException as e:
+                    log.warning("Could not edit message %d in channel %d (%s); sending a new one", message.id, channel.id, e)
+            return await request('message_send', lambda: channel.send(embed=embed, view=view))
+
+        channel_result, posted = await asyncio.gather(edit_channel(), post(), return_exceptions=True)
+        if isinstance(channel_result, BaseException):
+            for revert in undo:
+                try:
+                    await revert()
+                except discord.HTTPException as e:
+                    log.warning("Could not undo a change to channel %d: %s", channel.id, e)
+            try:
+                if posted is None and snapshot:
+                    await message.edit(**snapshot)
+                elif posted is not None and not isinstance(posted, BaseException):
+                    await posted.delete()
+            except discord.HTTPException as e:
+                log.warning("Could not roll back the status message in channel %d: %s", channel.id, e)
+            raise channel_result
+        if isinstance(posted, BaseException):
+            log.warning("Could not post the status message in channel %d: %s", channel.id, posted)
+
+    async def upload_transcript(self, channel: discord.TextChannel, ticket: dict):
+        # Keep the messages as structured data first; it outlives the channel and any
+        # transcript can be re-rendered from it later (/archived).
+        jobs = self.bot.jobs
+        await jobs.step('archive', lambda: save_ticket_archive(self.bot.db, {**ticket, 'guild_id': channel.guild.id, 'channel_id': channel.id}, channel.name, self.bot.archive.iter_messages(channel)))
+        panel = await self.bot.cache.panel(ticket['panel_id'])
+        # A retried job only redoes what its earlier attempts did not finish.
+        trans_channel = self.bot.get_channel(panel['transcript_channel_id']) if panel and not jobs.completed('upload') else None
+        store = self.bot.transcripts if not jobs.completed('store') else None
+        if not trans_channel and not store:
+            return
+
+        # The local store keeps the exact HTML that is uploaded, as it is rendered.
+        writer = store.writer() if store else None
+        transcript_file = await generate_transcript_file(channel, compress=self.bot.transcript_compress, db=self.bot.db, ticket_id=ticket['ticket_id'], archive=self.bot.archive, style=self.bot.transcript_style, tee=writer.write if writer else None, pool=self.bot.render_pool)
+        if writer:
+            await jobs.step('store', lambda: store.save(writer, {**ticket, 'guild_id': channel.guild.id}, channel.name, self.bot.transcript_style))
+        if not trans_channel:
+            transcript_file.close()
+            return
+        owner = channel.guild.get_member(ticket['owner_id'])
+        owner_mention = owner.mention if owner else f"ID: {ticket['owner_id']}"
+        # Every upload for a panel targets the same channel, so pace them through its message bucket.
+        await jobs.step('upload', lambda: self.bot.rest.run('message_send', trans_channel.id, lambda: trans_channel.send(f"Transcript for ticket `#{ticket['ticket_num']}` created by {owner_mention}", file=transcript_file)))
+
+    async def transcript_job(self, payload: dict):
+        await self.bot.wait_until_ready()
+        channel = self.bot.get_channel(payload['channel_id'])
+        if channel is None:
+            # Deleting a ticket runs its transcript first, so a missing channel means it was lost.
+            raise RuntimeError(f"Channel {payload['channel_id']} no longer exists; ticket #{payload['ticket_num']} has no transcript")
+        await self.upload_transcript(channel, payload)
+
+    async def compact_job(self, payload: dict):
+        await self.bot.transcripts.compact()
+        await self.bot.jobs.enqueue(COMPACT_JOB, {}, delay=COMPACT_INTERVAL)
 
     async def execute_open(self, interaction: discord.Interaction):
-        with sqlite3.connect(self.bot.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM tickets WHERE channel_id = ? AND status = 'closed'", (interaction.channel.id,))
-            ticket = cursor.fetchone()
-            if not ticket:
-                await interaction.followup.send("This is not a closed ticket.", ephemeral=True)
-                return
-
-            cursor.execute("UPDATE tickets SET status = 'open' WHERE channel_id = ?", (interaction.channel.id,))
-            conn.commit()
-        
-        await interaction.channel.edit(name=f"ticket-{ticket['ticket_num']:04d}")
-        if (owner := interaction.guild.get_member(ticket['owner_id'])):
-            await interaction.channel.set_permissions(owner, send_messages=True, read_messages=True)
+        ticket = await self.bot.cache.ticket(interaction.channel.id)
+        if not ticket or ticket['status'] != 'closed':
+            await interaction.followup.send("This is not a closed ticket.", ephemeral=True)
+            return
+
+        try: reopened = await self.bot.cache.set_status(interaction.channel.id, 'open', expected='closed')
+        except sqlite3.IntegrityError:
+            await interaction.followup.send("The ticket owner already has another open ticket from this panel.", ephemeral=True)
+            return
+        if not reopened:
+            await interaction.followup.send("This is not a closed ticket.", ephemeral=True)
+            return
         
         embed = discord.Embed(title="Ticket Re-Opened", description=f"Ticket re-opened by {interaction.user.mention}.", color=discord.Color.green())
-        await interaction.message.edit(content=None, embed=embed, view=self.bot.get_cog('TicketSystem').OpenTicketView())
+        try:
+            await self._update_channel(interaction.channel, ticket, f"ticket-{ticket['ticket_num']:04d}", True, embed, self.bot.get_cog('TicketSystem').OpenTicketView(), interaction.message)
+        except Exception as e:
+            await self.bot.cache.set_status(interaction.channel.id, 'closed', expected='open')
+            if not isinstance(e, discord.HTTPException):
+                raise
+            await interaction.followup.send(f"Could not re-open this ticket: {e.text or e}", ephemeral=True)
+            return
+        if (automation := self.bot.get_cog('TicketAutomation')):
+            await automation.ticket_opened(ticket, await self.bot.cache.panel(ticket['panel_id']))
 
     @app_commands.command(name="add")
     @app_commands.check(is_support_staff)
@@ -120,43 +255,50 @@ class TicketCommands(commands.Cog):
     @app_commands.check(is_support_staff)
     async def transcript(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        filename = await generate_transcript_file(interaction.channel)
-        await interaction.followup.send(file=discord.File(filename), ephemeral=True)
-        os.remove(filename)
+        ticket = await self.bot.cache.ticket(interaction.channel.id)
+        transcript_file = await generate_transcript_file(interaction.channel, compress=self.bot.transcript_compress, db=self.bot.db, ticket_id=ticket['ticket_id'], archive=self.bot.archive, style=self.bot.transcript_style, pool=self.bot.render_pool)
+        await interaction.followup.send(file=transcript_file, ephemeral=True)
 
     @app_commands.command(name="claim")
     @app_commands.check(is_support_staff)
     async def claim(self, interaction: discord.Interaction):
-        with sqlite3.connect(self.bot.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT t.claimed_by_id, p.is_claimable FROM tickets t JOIN panels p ON t.panel_id = p.panel_id WHERE t.channel_id = ?", (interaction.channel.id,))
-            claimed_by_id, is_claimable = cursor.fetchone()
-            
-            if not is_claimable:
-                return await interaction.response.send_message("This ticket panel does not support claiming.", ephemeral=True)
-            
-            if claimed_by_id is None:
-                cursor.execute("UPDATE tickets SET claimed_by_id = ? WHERE channel_id = ?", (interaction.user.id, interaction.channel.id))
-                await interaction.response.send_message(embed=discord.Embed(description=f"Ticket claimed by {interaction.user.mention}", color=discord.Color.gold()))
-            elif claimed_by_id == interaction.user.id:
-                cursor.execute("UPDATE tickets SET claimed_by_id = NULL WHERE channel_id = ?", (interaction.channel.id,))
-                await interaction.response.send_message(embed=discord.Embed(description=f"Ticket has been unclaimed by {interaction.user.mention}", color=discord.Color.light_grey()))
-            else:
-                claimer = interaction.guild.get_member(claimed_by_id)
-                await interaction.response.send_message(f"This ticket is already claimed by {claimer.mention if claimer else 'an unknown user'}.", ephemeral=True)
-            conn.commit()
+        ticket = await self.bot.cache.ticket(interaction.channel.id)
+        panel = await self.bot.cache.panel(ticket['panel_id'])
+        claimed_by_id, is_claimable = ticket['claimed_by_id'], panel['is_claimable']
+        
+        if not is_claimable:
+            return await interaction.response.send_message("This ticket panel does not support claiming.", ephemeral=True)
+        
+        if claimed_by_id is None:
+            await self.bot.cache.update_ticket(interaction.channel.id, claimed_by_id=interaction.user.id)
+            await interaction.response.send_message(embed=discord.Embed(description=f"Ticket claimed by {interaction.user.mention}", color=discord.Color.gold()))
+        elif claimed_by_id == interaction.user.id:
+            await self.bot.cache.update_ticket(interaction.channel.id, claimed_by_id=None)
+            await interaction.response.send_message(embed=discord.Embed(description=f"Ticket has been unclaimed by {interaction.user.mention}", color=discord.Color.light_grey()))
+        else:
+            claimer = interaction.guild.get_member(claimed_by_id)
+            await interaction.response.send_message(f"This ticket is already claimed by {claimer.mention if claimer else 'an unknown user'}.", ephemeral=True)
+            return
+        if (automation := self.bot.get_cog('TicketAutomation')):
+            await automation.claim_changed(await self.bot.cache.ticket(interaction.channel.id), panel)
     
     @app_commands.command(name="closerequest")
     @app_commands.check(is_support_staff)
     async def closerequest(self, interaction: discord.Interaction):
-        with sqlite3.connect(self.bot.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT owner_id FROM tickets WHERE channel_id = ?", (interaction.channel.id,))
-            owner_id_tuple = cursor.fetchone()
+        ticket = await self.bot.cache.ticket(interaction.channel.id)
+        
+        panel = await self.bot.cache.panel(ticket['panel_id'])
+        automation = self.bot.get_cog('TicketAutomation')
+        expires = panel['close_request_hours'] if automation and ticket['status'] == 'open' else 0
         
-        owner = interaction.guild.get_member(owner_id_tuple[0]) if owner_id_tuple else None
-        embed = discord.Embed(title="Close Request", description=f"Hi {owner.mention if owner else 'there'}, our support staff believes this issue has been resolved. If you agree, a staff member will press the button below to close this ticket.", color=discord.Color.blurple())
+        owner = interaction.guild.get_member(ticket['owner_id']) if ticket else None
+        description = f"Hi {owner.mention if owner else 'there'}, our support staff believes this issue has been resolved. If you agree, a staff member will press the button below to close this ticket."
+        if expires:
+            description += f" If there is no reply, it will be closed automatically <t:{int(time.time() + expires * 3600)}:R>."
+        embed = discord.Embed(title="Close Request", description=description, color=discord.Color.blurple())
         await interaction.response.send_message(embed=embed, view=self.bot.get_cog('TicketSystem').CloseRequestView())
+        if expires:
+            await automation.close_requested(ticket, panel, interaction.user)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(TicketCommands(bot))
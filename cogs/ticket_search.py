@@ -0,0 +1,81 @@
+import datetime
+from typing import Optional
+import discord
+from discord.ext import commands
+from discord import app_commands
+from utils import search
+from utils.cache import has_support_role
+
+def _parse_date(value: Optional[str]) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+    return datetime.datetime.combine(datetime.date.fromisoformat(value), datetime.time(), tzinfo=datetime.timezone.utc)
+
+class TicketSearch(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    async def _panels(self, member: discord.Member) -> list[dict]:
+        """Panels whose tickets ``member`` may search: all of them for admins, otherwise those they support."""
+        rows = await self.bot.db.fetchall("SELECT panel_id FROM panels WHERE guild_id = ?", (member.guild.id,))
+        panels = [panel for row in rows if (panel := await self.bot.cache.panel(row['panel_id']))]
+        if member.guild_permissions.administrator:
+            return panels
+        return [panel for panel in panels if has_support_role(member, panel)]
+
+    async def panel_autocomplete(self, interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+        return [app_commands.Choice(name=p['panel_name'][:100], value=str(p['panel_id'])) for p in await self._panels(interaction.user) if current.lower() in p['panel_name'].lower()][:25]
+
+    @app_commands.command(name="search", description="Search the messages of closed tickets.")
+    @app_commands.describe(
+        query='Words to find; "quote" phrases, end a word of 3+ letters with * to match prefixes.',
+        panel="Only tickets from this panel.", owner="Only tickets opened by this member.",
+        after="Only messages on or after this date (YYYY-MM-DD).", before="Only messages on or before this date (YYYY-MM-DD).",
+    )
+    @app_commands.autocomplete(panel=panel_autocomplete)
+    @app_commands.guild_only()
+    async def search(self, interaction: discord.Interaction, query: str, panel: Optional[str] = None, owner: Optional[discord.User] = None, after: Optional[str] = None, before: Optional[str] = None):
+        panels = {p['panel_id']: p for p in await self._panels(interaction.user)}
+        if not panels:
+            return await interaction.response.send_message("Only support staff can search tickets.", ephemeral=True)
+        if panel is not None and (not panel.isdigit() or int(panel) not in panels):
+            return await interaction.response.send_message("Panel not found.", ephemeral=True)
+        try:
+            start, end = _parse_date(after), _parse_date(before)
+        except ValueError:
+            return await interaction.response.send_message("Dates must be in the form YYYY-MM-DD.", ephemeral=True)
+        if end:
+            end += datetime.timedelta(days=1) - datetime.timedelta(microseconds=1)
+
+        results = await search.search(
+            self.bot.db, interaction.guild.id, query, panel_ids=[int(panel)] if panel else panels.keys(),
+            owner_id=owner.id if owner else None, after=start, before=end,
+        )
+        hits = results.hits
+        if not hits:
+            return await interaction.response.send_message("No closed tickets match that search.", ephemeral=True)
+
+        placeholders = ", ".join("?" for _ in hits)
+        tickets = {row['ticket_id']: row for row in await self.bot.db.fetchall(
+            f"SELECT ticket_id, panel_id, ticket_num, owner_id FROM ticket_archives WHERE ticket_id IN ({placeholders})", [hit.ticket_id for hit in hits],
+        )}
+        embed = discord.Embed(title=f"Search: {query[:200]}", color=discord.Color.blurple())
+        for hit in hits:
+            ticket = tickets.get(hit.ticket_id)
+            if not ticket:
+                continue
+            panel_name = panels[ticket['panel_id']]['panel_name'] if ticket['panel_id'] in panels else "Unknown panel"
+            sent = int(discord.utils.snowflake_time(hit.message_id).timestamp())
+            embed.add_field(
+                name=f"#{ticket['ticket_num']:04d} · {panel_name}"[:256], inline=False,
+                value=f"<@{hit.author_id}> <t:{sent}:d> (ticket by <@{ticket['owner_id']}>)\n{search.format_snippet(hit.snippet)}"[:1024],
+            )
+        if results.complete:
+            embed.set_footer(text="Best matches first. Use /archived <number> to read a ticket.")
+        else:
+            embed.set_footer(text=f"Over {search.CANDIDATES:,} messages match, so these are the best of the newest {search.CANDIDATES:,}; "
+                                  "add a panel, owner or dates to rank them all. Use /archived <number> to read a ticket.")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(TicketSearch(bot))
@@ -1,168 +1,117 @@
 import discord
 from discord.ext import commands
 from discord import ui
-import aiofiles
 import os
 import datetime
 import asyncio
 import sqlite3
-import html
-
-async def generate_transcript_file(channel: discord.TextChannel):
-    css = """
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <style>
-        body { font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; background-color: #36393f; color: #dcddde; margin: 0; padding: 20px; }
-        .container { max-width: 800px; margin: auto; }
-        .header { text-align: center; border-bottom: 1px solid #4f545c; padding-bottom: 10px; margin-bottom: 20px; }
-        .header h1 { color: #ffffff; }
-        .message-group { display: flex; margin-bottom: 20px; }
-        .avatar { width: 40px; height: 40px; border-radius: 50%; margin-right: 15px; flex-shrink: 0; }
-        .message-content { display: flex; flex-direction: column; width: 100%; }
-        .author-info { display: flex; align-items: center; margin-bottom: 5px; }
-        .author-name { font-weight: bold; color: #ffffff; }
-        .timestamp { color: #72767d; font-size: 0.75em; margin-left: 10px; }
-        .content { white-space: pre-wrap; word-wrap: break-word; }
-        .embed { border-left: 4px solid #4f545c; background-color: #2f3136; padding: 10px; border-radius: 4px; margin-top: 5px; }
-        .embed-title { font-weight: bold; }
-        .embed-description { font-size: 0.9em; }
-        .embed-field { margin-top: 5px; }
-        .embed-field-name { font-weight: bold; }
-        .attachment img { max-width: 100%; height: auto; border-radius: 4px; margin-top: 5px; }
-        .attachment a { color: #00a8fc; }
-    </style>
-    """
-    
-    html_content = f"<!DOCTYPE html><html><head><title>Transcript for #{channel.name}</title>{css}</head><body><div class='container'>"
-    html_content += f"<div class='header'><h1>Transcript for #{channel.name}</h1></div>"
-    
-    async for message in channel.history(limit=None, oldest_first=True):
-        timestamp = message.created_at.strftime('%Y-%m-%d %H:%M:%S UTC')
-        safe_content = html.escape(message.clean_content)
-
-        html_content += f'<div class="message-group">'
-        html_content += f'<img src="{message.author.display_avatar.url}" class="avatar">'
-        html_content += '<div class="message-content">'
-        html_content += f'<div class="author-info"><span class="author-name">{html.escape(message.author.display_name)}</span> <span class="timestamp">{timestamp}</span></div>'
-        if safe_content:
-            html_content += f'<div class="content">{safe_content}</div>'
-        
-        if message.attachments:
-            for attachment in message.attachments:
-                if attachment.content_type and attachment.content_type.startswith('image/'):
-                    html_content += f'<div class="attachment"><a href="{attachment.url}" target="_blank"><img src="{attachment.url}" alt="Attachment"></a></div>'
-                else:
-                    html_content += f'<div class="attachment"><a href="{attachment.url}" target="_blank">{html.escape(attachment.filename)}</a></div>'
-
-        if message.embeds:
-            for embed in message.embeds:
-                html_content += '<div class="embed">'
-                if embed.title:
-                    html_content += f'<div class="embed-title">{html.escape(embed.title)}</div>'
-                if embed.description:
-                    html_content += f'<div class="embed-description">{html.escape(embed.description)}</div>'
-                if embed.fields:
-                    for field in embed.fields:
-                        html_content += '<div class="embed-field">'
-                        html_content += f'<div class="embed-field-name">{html.escape(field.name)}</div>'
-                        html_content += f'<div class="embed-field-value">{html.escape(field.value)}</div>'
-                        html_content += '</div>'
-                html_content += '</div>'
-        
-        html_content += '</div></div>'
-
-    html_content += "</div></body></html>"
-    
-    filename = f"transcript-{channel.name}.html"
-    async with aiofiles.open(filename, 'w', encoding='utf-8') as f:
-        await f.write(html_content)
-    return filename
+from utils.cache import has_support_role
+from utils.metrics import InstrumentedView
 
 class TicketSystem(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self._creating: dict[tuple[int, int], asyncio.Task] = {}
 
     async def _is_support_staff(self, interaction: discord.Interaction) -> bool:
         if interaction.user.guild_permissions.administrator:
             return True
 
-        with sqlite3.connect(self.bot.db_path) as conn:
-            cursor = conn.cursor()
-            # UPDATED: Select support_role_ids
-            cursor.execute("SELECT p.support_role_ids FROM panels p JOIN tickets t ON p.panel_id = t.panel_id WHERE t.channel_id = ?", (interaction.channel.id,))
-            role_ids_tuple = cursor.fetchone()
+        ticket = await self.bot.cache.ticket(interaction.channel.id)
+        panel = await self.bot.cache.panel(ticket['panel_id']) if ticket else None
         
-        if not role_ids_tuple:
+        if not panel:
             await interaction.response.send_message("Error: Could not find panel configuration for this ticket.", ephemeral=True)
             return False
         
-        # NEW: Logic to check multiple roles
-        support_role_ids = {int(r_id) for r_id in role_ids_tuple[0].split(',') if r_id}
-        user_role_ids = {role.id for role in interaction.user.roles}
-        
-        if not user_role_ids.intersection(support_role_ids):
+        if not has_support_role(interaction.user, panel):
             await interaction.response.send_message("You do not have the required support role for this action.", ephemeral=True)
             return False
         return True
 
-    class CreateTicketView(ui.View):
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Top up every configured channel pool; this also clears out pooled channels
+        # that were deleted or moved while the bot was offline.
+        for row in await self.bot.db.fetchall("SELECT panel_id, guild_id FROM panels WHERE pool_size > 0"):
+            guild, panel = self.bot.get_guild(row['guild_id']), await self.bot.cache.panel(row['panel_id'])
+            if guild and panel: self.bot.pool.refill(guild, panel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        await self.bot.pool.forget(channel.id)
+
+    async def _create_ticket(self, interaction: discord.Interaction, panel: dict) -> str:
+        # NEW: Handle multiple support roles
+        guild = interaction.guild
+        support_roles = [role for r_id in panel['support_roles'] if (role := guild.get_role(r_id))]
+        category = guild.get_channel(panel['category_id'])
+
+        if not support_roles or not category: return "Configuration error: One or more support roles or the category was not found."
+
+        # Reserve the ticket number and the ticket row in one transaction. The partial
+        # unique index on open tickets rejects a second open ticket for the same
+        # user and panel, which also rolls back the counter increment.
+        def reserve(conn):
+            conn.execute("INSERT INTO guild_counters (guild_id, last_ticket_num) VALUES (?, 1) ON CONFLICT (guild_id) DO UPDATE SET last_ticket_num = last_ticket_num + 1", (guild.id,))
+            ticket_num = conn.execute("SELECT last_ticket_num FROM guild_counters WHERE guild_id = ?", (guild.id,)).fetchone()[0]
+            ticket_id = conn.execute("INSERT INTO tickets (guild_id, panel_id, channel_id, owner_id, status, ticket_num) VALUES (?, ?, 0, ?, 'open', ?)", (guild.id, panel['panel_id'], interaction.user.id, ticket_num)).lastrowid
+            return ticket_id, ticket_num
+        try: ticket_id, ticket_num = await self.bot.db.transaction(reserve)
+        except sqlite3.IntegrityError: return "You already have an open ticket from this panel."
+        
+        overwrites = { 
+            guild.default_role: discord.PermissionOverwrite(read_messages=False), 
+            interaction.user: discord.PermissionOverwrite(read_messages=True, send_messages=True), 
+            guild.me: discord.PermissionOverwrite(read_messages=True) 
+        }
+        # NEW: Add all support roles to overwrites
+        for role in support_roles:
+            overwrites[role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+        
+        name = f"ticket-{ticket_num:04d}"
+        try: channel = await self.bot.pool.claim(guild, panel, name, overwrites) or await category.create_text_channel(name=name, overwrites=overwrites)
+        except discord.Forbidden:
+            await self.bot.db.execute("DELETE FROM tickets WHERE ticket_id = ?", (ticket_id,))
+            return "I lack permissions to create channels in the ticket category."
+        except BaseException:
+            await self.bot.db.execute("DELETE FROM tickets WHERE ticket_id = ?", (ticket_id,))
+            raise
+
+        ticket = await self.bot.cache.add_ticket(ticket_id, channel.id)
+        if (automation := self.bot.get_cog('TicketAutomation')):
+            await automation.ticket_opened(ticket, panel)
+        
+        embed = discord.Embed(title="Welcome to your ticket!", description=panel['welcome_message'], color=discord.Color.dark_green())
+        # NEW: Mention all support roles
+        role_mentions = " ".join(r.mention for r in support_roles)
+        await channel.send(f"{interaction.user.mention} {role_mentions}", embed=embed, view=self.OpenTicketView())
+        return f"Your ticket has been created: {channel.mention}"
+
+    async def create_ticket(self, interaction: discord.Interaction, panel: dict) -> str:
+        # Concurrent clicks by the same user on the same panel share one in-flight
+        # creation instead of racing each other.
+        key = (interaction.user.id, panel['panel_id'])
+        task = self._creating.get(key)
+        if task is None:
+            task = self._creating[key] = asyncio.create_task(self._create_ticket(interaction, panel))
+            task.add_done_callback(lambda t: self._creating.pop(key, None) if self._creating.get(key) is t else None)
+        return await asyncio.shield(task)
+
+    class CreateTicketView(InstrumentedView):
         def __init__(self): super().__init__(timeout=None)
         
         @ui.button(label="Create Ticket", style=discord.ButtonStyle.primary, custom_id="persistent:create_ticket")
         async def create_ticket(self, interaction: discord.Interaction, button: ui.Button):
             await interaction.response.defer(ephemeral=True, thinking=True)
             
-            with sqlite3.connect(interaction.client.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM panels WHERE message_id = ?", (interaction.message.id,))
-                panel = cursor.fetchone()
-                if not panel: return await interaction.followup.send("This ticket panel is outdated or misconfigured.", ephemeral=True)
-                
-                cursor.execute("SELECT 1 FROM tickets WHERE owner_id = ? AND status = 'open' AND panel_id = ?", (interaction.user.id, panel['panel_id']))
-                if cursor.fetchone(): return await interaction.followup.send("You already have an open ticket from this panel.", ephemeral=True)
-                
-                # NEW: Handle multiple support roles
-                guild = interaction.guild
-                support_role_ids = [int(r_id) for r_id in panel['support_role_ids'].split(',') if r_id]
-                support_roles = [guild.get_role(r_id) for r_id in support_role_ids if guild.get_role(r_id)]
-                category = guild.get_channel(panel['category_id'])
-
-                if not support_roles or not category: return await interaction.followup.send("Configuration error: One or more support roles or the category was not found.", ephemeral=True)
-
-                cursor.execute("INSERT INTO tickets (guild_id, panel_id, channel_id, owner_id, status, ticket_num) VALUES (?, ?, ?, ?, ?, ?)", (guild.id, panel['panel_id'], 0, interaction.user.id, 'open', 0))
-                ticket_id = cursor.lastrowid
-                ticket_num = ticket_id
-                cursor.execute("UPDATE tickets SET ticket_num = ? WHERE ticket_id = ?", (ticket_num, ticket_id))
-                conn.commit()
-            
-            overwrites = { 
-                guild.default_role: discord.PermissionOverwrite(read_messages=False), 
-                interaction.user: discord.PermissionOverwrite(read_messages=True, send_messages=True), 
-                guild.me: discord.PermissionOverwrite(read_messages=True) 
-            }
-            # NEW: Add all support roles to overwrites
-            for role in support_roles:
-                overwrites[role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-            
-            try: channel = await category.create_text_channel(name=f"ticket-{ticket_num:04d}", overwrites=overwrites)
-            except discord.Forbidden:
-                with sqlite3.connect(interaction.client.db_path) as conn:
-                    conn.cursor().execute("DELETE FROM tickets WHERE ticket_id = ?", (ticket_id,))
-                return await interaction.followup.send("I lack permissions to create channels in the ticket category.", ephemeral=True)
-
-            with sqlite3.connect(interaction.client.db_path) as conn:
-                conn.cursor().execute("UPDATE tickets SET channel_id = ? WHERE ticket_id = ?", (channel.id, ticket_id))
-                conn.commit()
+            panel = await interaction.client.cache.panel_by_message(interaction.message.id)
+            if not panel: return await interaction.followup.send("This ticket panel is outdated or misconfigured.", ephemeral=True)
             
-            embed = discord.Embed(title="Welcome to your ticket!", description=panel['welcome_message'], color=discord.Color.dark_green())
-            # NEW: Mention all support roles
-            role_mentions = " ".join(r.mention for r in support_roles)
-            await channel.send(f"{interaction.user.mention} {role_mentions}", embed=embed, view=interaction.client.get_cog('TicketSystem').OpenTicketView())
-            await interaction.followup.send(f"Your ticket has been created: {channel.mention}", ephemeral=True)
+            message = await interaction.client.get_cog('TicketSystem').create_ticket(interaction, panel)
+            await interaction.followup.send(message, ephemeral=True)
 
-    class OpenTicketView(ui.View):
+    class OpenTicketView(InstrumentedView):
         def __init__(self): super().__init__(timeout=None)
         
         @ui.button(label="Close", style=discord.ButtonStyle.danger, emoji="🔒", custom_id="persistent:close_ticket")
@@ -172,7 +121,7 @@ class TicketSystem(commands.Cog):
             await interaction.response.defer()
             await interaction.client.get_cog("TicketCommands").execute_close(interaction, interaction.user)
     
-    class ClosedTicketView(ui.View):
+    class ClosedTicketView(InstrumentedView):
         def __init__(self): super().__init__(timeout=None)
         
         @ui.button(label="Re-Open", style=discord.ButtonStyle.success, emoji="🔓", custom_id="persistent:reopen_ticket")
@@ -189,12 +138,13 @@ class TicketSystem(commands.Cog):
                 
             await interaction.response.send_message("Channel will be deleted in 5 seconds.", ephemeral=True)
             await asyncio.sleep(5)
-            with sqlite3.connect(interaction.client.db_path) as conn:
-                conn.cursor().execute("DELETE FROM tickets WHERE channel_id = ?", (interaction.channel.id,))
-                conn.commit()
+            # The close queued the transcript; make it now if it has not run yet, while the messages still exist.
+            if not await interaction.client.jobs.finish('ticket_transcript', 'channel_id', interaction.channel.id):
+                return await interaction.followup.send("The transcript could not be saved, so the channel was not deleted. Try again later.", ephemeral=True)
+            await interaction.client.cache.delete_ticket(interaction.channel.id)
             await interaction.channel.delete()
 
-    class CloseRequestView(ui.View):
+    class CloseRequestView(InstrumentedView):
         def __init__(self): super().__init__(timeout=None)
         
         @ui.button(label="Close Ticket", style=discord.ButtonStyle.danger, custom_id="persistent:confirm_close_ticket")
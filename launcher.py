@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import math
+import os
+import signal
+import sys
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Runs the bot as several processes ("clusters") on one machine, each owning a
+# contiguous group of shards. Every cluster is a normal bot.py process with
+# SHARD_COUNT/SHARD_IDS/CLUSTER_ID/CLUSTER_COUNT set; they share the SQLite
+# database (WAL, with guild-partitioned background work, see utils/cluster.py).
+# Clusters are started one after another so their shards do not exceed
+# Discord's identify limit, and are restarted with backoff if they exit.
+
+IDENTIFY_INTERVAL = 5.0  # seconds per identify bucket, per Discord's gateway rules
+MAX_BACKOFF = 60.0
+
+async def recommended_shards(token: str) -> tuple[int, int]:
+    async with aiohttp.ClientSession() as session:
+        async with session.get("https://discord.com/api/v10/gateway/bot", headers={"Authorization": f"Bot {token}"}) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data["shards"], data["session_start_limit"]["max_concurrency"]
+
+def plan(shard_count: int, clusters: int) -> list[list[int]]:
+    size = math.ceil(shard_count / clusters)
+    return [list(range(start, min(start + size, shard_count))) for start in range(0, shard_count, size)]
+
+class Cluster:
+    def __init__(self, cluster_id: int, shard_ids: list[int], shard_count: int, cluster_count: int):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.env = {
+            **os.environ,
+            "CLUSTER_ID": str(cluster_id),
+            "CLUSTER_COUNT": str(cluster_count),
+            "SHARD_COUNT": str(shard_count),
+            "SHARD_IDS": ",".join(map(str, shard_ids)),
+        }
+        self.process: asyncio.subprocess.Process | None = None
+
+    async def start(self):
+        print(f"[launcher] starting cluster {self.cluster_id} with shards {self.shard_ids[0]}-{self.shard_ids[-1]}")
+        self.process = await asyncio.create_subprocess_exec(sys.executable, "bot.py", env=self.env)
+
+    async def supervise(self, stopping: asyncio.Event):
+        backoff = 1.0
+        while not stopping.is_set():
+            code = await self.process.wait()
+            if stopping.is_set():
+                break
+            print(f"[launcher] cluster {self.cluster_id} exited with code {code}; restarting in {backoff:.0f}s")
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=backoff)
+                break
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, MAX_BACKOFF)
+            await self.start()
+
+    async def stop(self):
+        if self.process and self.process.returncode is None:
+            # SIGINT lets bot.run() close the gateway and database cleanly.
+            self.process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=30)
+            except asyncio.TimeoutError:
+                self.process.kill()
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run the ticket bot as multiple shard clusters.")
+    parser.add_argument("--clusters", type=int, default=int(os.getenv("CLUSTERS", os.cpu_count() or 1)))
+    parser.add_argument("--shards", type=int, default=int(os.getenv("SHARD_COUNT", 0)), help="total shards (default: Discord's recommendation)")
+    args = parser.parse_args()
+
+    max_concurrency = 1
+    shard_count = args.shards
+    if not shard_count:
+        shard_count, max_concurrency = await recommended_shards(os.environ["DISCORD_TOKEN"])
+    groups = plan(shard_count, min(args.clusters, shard_count))
+    clusters = [Cluster(i, shard_ids, shard_count, len(groups)) for i, shard_ids in enumerate(groups)]
+    print(f"[launcher] {shard_count} shards across {len(clusters)} clusters")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    supervisors = []
+    for cluster in clusters:
+        if stopping.is_set():
+            break
+        await cluster.start()
+        supervisors.append(asyncio.create_task(cluster.supervise(stopping)))
+        # Give this cluster's shards time to identify before the next one starts.
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=IDENTIFY_INTERVAL * math.ceil(len(cluster.shard_ids) / max_concurrency))
+        except asyncio.TimeoutError:
+            pass
+
+    await stopping.wait()
+    print("[launcher] shutting down")
+    await asyncio.gather(*(cluster.stop() for cluster in clusters))
+    await asyncio.gather(*supervisors, return_exceptions=True)
+
+if __name__ == "__main__":
+    asyncio.run(main())
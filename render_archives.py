@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+import os
+import shutil
+import time
+from utils.database import Database
+from utils.ticket_archive import aiter_records, read_archive
+from utils.transcript import STYLES, records_transcript_file
+
+# Renders archived tickets (see utils/ticket_archive.py) to HTML files offline,
+# straight from the database: no bot token and no Discord API calls. Useful for
+# exporting a guild's history or re-rendering everything after a theme change.
+
+async def main():
+    parser = argparse.ArgumentParser(description="Render archived ticket transcripts to HTML files.")
+    parser.add_argument("output", help="directory to write transcripts to")
+    parser.add_argument("--db", default=os.path.join("db", "database.sqlite"))
+    parser.add_argument("--guild", type=int, help="only this guild's tickets")
+    parser.add_argument("--style", choices=STYLES, default=os.getenv("TRANSCRIPT_STYLE", "full"))
+    parser.add_argument("--gzip", action="store_true", help="write .html.gz files")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    await db.connect()
+    start, count, last_id = time.perf_counter(), 0, 0
+    try:
+        while True:
+            # Page by ticket_id so only one batch of archives is in memory at a time.
+            rows = await db.fetchall(
+                "SELECT ticket_id, guild_id, ticket_num, data FROM ticket_archives WHERE ticket_id > ? AND (? IS NULL OR guild_id = ?) ORDER BY ticket_id LIMIT 100",
+                (last_id, args.guild, args.guild),
+            )
+            for row in rows:
+                header, records = read_archive(row["data"])
+                file = await records_transcript_file(header["channel_name"], aiter_records(records), compress=args.gzip, style=args.style)
+                directory = os.path.join(args.output, str(row["guild_id"]))
+                os.makedirs(directory, exist_ok=True)
+                with file.fp, open(os.path.join(directory, f"ticket-{row['ticket_num']:04d}.html" + (".gz" if args.gzip else "")), "wb") as out:
+                    shutil.copyfileobj(file.fp, out)
+                count += 1
+            if len(rows) < 100:
+                break
+            last_id = rows[-1]["ticket_id"]
+    finally:
+        await db.close()
+    print(f"Rendered {count} transcripts in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    asyncio.run(main())
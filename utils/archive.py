@@ -0,0 +1,152 @@
+import asyncio
+import datetime
+import json
+import logging
+from typing import AsyncIterator, Iterable, Optional
+import discord
+from utils.database import Database
+from utils.records import AttachmentRecord, EmbedRecord, MessageRecord, record_from_message
+
+log = logging.getLogger(__name__)
+
+UPSERT_SQL = """
+    INSERT INTO archived_messages (message_id, channel_id, author_id, author_name, avatar_url, content, edited_at, attachments, embeds)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (message_id) DO UPDATE SET
+        content = excluded.content, edited_at = excluded.edited_at,
+        attachments = excluded.attachments, embeds = excluded.embeds
+"""
+
+def _to_row(record: MessageRecord) -> tuple:
+    return (
+        record.id, record.channel_id, record.author_id, record.author_name, record.avatar_url, record.content,
+        record.edited_at.isoformat() if record.edited_at else None,
+        json.dumps(record.attachments) if record.attachments else None,
+        json.dumps(record.embeds) if record.embeds else None,
+    )
+
+def _from_row(row) -> MessageRecord:
+    return MessageRecord(
+        id=row["message_id"],
+        channel_id=row["channel_id"],
+        author_id=row["author_id"],
+        author_name=row["author_name"],
+        avatar_url=row["avatar_url"],
+        content=row["content"],
+        created_at=discord.utils.snowflake_time(row["message_id"]),
+        edited_at=datetime.datetime.fromisoformat(row["edited_at"]) if row["edited_at"] else None,
+        attachments=tuple(AttachmentRecord(*a) for a in json.loads(row["attachments"])) if row["attachments"] else (),
+        embeds=tuple(EmbedRecord(title, description, tuple(map(tuple, fields))) for title, description, fields in json.loads(row["embeds"])) if row["embeds"] else (),
+    )
+
+# Local copy of every message sent in a ticket channel, fed by gateway events.
+# Writes are queued and group-committed: one transaction per batch instead of
+# one per message. Transcripts read from here and only page through
+# channel.history for gaps the bot could not have seen, i.e. messages sent
+# before the current gateway session started (downtime, or tickets that
+# predate the archive). ``live_since`` maps each shard to the snowflake from
+# which its events are known to have been received (shards connect, and
+# re-identify after an outage, independently); archive_sync.synced_until
+# records how far back each channel's gap has already been filled.
+class MessageArchive:
+    def __init__(self, db: Database, batch_size: int = 200, flush_interval: float = 0.5, read_batch: int = 500):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.read_batch = read_batch
+        self.live_since: dict[int, int] = {}
+        self._pending: list[tuple[str, object]] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flusher(), name="archive-flusher")
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def mark_live(self, shard_id: int = 0):
+        self.live_since[shard_id] = discord.utils.time_snowflake(discord.utils.utcnow())
+
+    # --- Writes (queued) ---
+    def add(self, message: discord.Message):
+        self._queue(("upsert", _to_row(record_from_message(message))))
+
+    def mark_deleted(self, message_ids: Iterable[int]):
+        self._queue(("delete", [(message_id,) for message_id in message_ids]))
+
+    def _queue(self, op: tuple):
+        self._pending.append(op)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Failed to flush message archive")
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            ops, self._pending = self._pending, []
+            def apply(conn):
+                # Consecutive operations of the same kind are sent as one executemany.
+                i = 0
+                while i < len(ops):
+                    kind = ops[i][0]
+                    j = i
+                    while j < len(ops) and ops[j][0] == kind:
+                        j += 1
+                    if kind == "upsert":
+                        conn.executemany(UPSERT_SQL, [row for _, row in ops[i:j]])
+                    else:
+                        conn.executemany("UPDATE archived_messages SET deleted = 1 WHERE message_id = ?", [p for _, params in ops[i:j] for p in params])
+                    i = j
+            await self.db.transaction(apply)
+
+    # --- Reads ---
+    async def _fill_gap(self, channel: discord.TextChannel, after: Optional[int]):
+        row = await self.db.fetchone("SELECT synced_until FROM archive_sync WHERE channel_id = ?", (channel.id,))
+        # Nothing in a channel can predate the channel itself.
+        start = max(after or 0, row["synced_until"] if row else 0, channel.id)
+        live_since = self.live_since.get(channel.guild.shard_id)
+        if live_since is not None and start >= live_since:
+            return
+        before = discord.Object(id=live_since) if live_since else None
+        batch, last_id = [], start
+        async for message in channel.history(limit=None, oldest_first=True, after=discord.Object(id=start), before=before):
+            batch.append(_to_row(record_from_message(message)))
+            last_id = message.id
+            if len(batch) >= self.read_batch:
+                await self.db.executemany(UPSERT_SQL, batch)
+                batch.clear()
+        if batch:
+            await self.db.executemany(UPSERT_SQL, batch)
+        synced_until = live_since or last_id
+        await self.db.execute("INSERT INTO archive_sync (channel_id, synced_until) VALUES (?, ?) ON CONFLICT (channel_id) DO UPDATE SET synced_until = excluded.synced_until", (channel.id, synced_until))
+
+    async def iter_messages(self, channel: discord.TextChannel, after: Optional[int] = None) -> AsyncIterator[MessageRecord]:
+        """Yield the channel's messages after ``after`` in order, filling gaps from Discord first."""
+        await self.flush()
+        await self._fill_gap(channel, after)
+        cursor = after or 0
+        while True:
+            rows = await self.db.fetchall("SELECT * FROM archived_messages WHERE channel_id = ? AND message_id > ? AND deleted = 0 ORDER BY message_id LIMIT ?", (channel.id, cursor, self.read_batch))
+            for row in rows:
+                yield _from_row(row)
+            if len(rows) < self.read_batch:
+                break
+            cursor = rows[-1]["message_id"]
@@ -0,0 +1,188 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, Optional
+from utils.database import Database
+
+_MISSING = object()
+
+def _load_panel(conn, where: str, key: int) -> Optional[dict]:
+    row = conn.execute(f"SELECT * FROM panels WHERE {where} = ?", (key,)).fetchone()
+    if not row:
+        return None
+    panel = dict(row)
+    panel["support_roles"] = frozenset(r for (r,) in conn.execute("SELECT role_id FROM panel_support_roles WHERE panel_id = ?", (panel["panel_id"],)))
+    return panel
+
+def has_support_role(member, panel: dict) -> bool:
+    # Member.get_role is a lookup in the member's sorted role IDs; it avoids
+    # resolving and sorting every Role object the way Member.roles does.
+    return any(member.get_role(role_id) is not None for role_id in panel["support_roles"])
+
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = _MISSING) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+# Write-through cache for ticket and panel rows. Tickets are keyed by
+# channel_id, panels by panel_id with a secondary message_id index. Lookups
+# for rows that do not exist are cached as None so that commands run in
+# non-ticket channels do not hit SQLite either. Every write path goes through
+# the methods below so the cache never goes stale. Cached panels carry their
+# support roles as a precomputed frozenset under "support_roles", rebuilt
+# whenever the panel is saved. ``channel_ids`` holds the channel of every
+# ticket, so per-message checks (see cogs/message_archive.py) answer without
+# caching a None for every busy non-ticket channel and evicting real tickets.
+class TicketCache:
+    def __init__(self, db: Database, maxsize: int = 10000):
+        self.db = db
+        self.tickets = LRUCache(maxsize)
+        self.channel_ids: set[int] = set()
+        self.panels = LRUCache(maxsize)
+        self.panel_messages = LRUCache(maxsize)
+
+    async def warm(self):
+        panels = await self.db.fetchall("SELECT * FROM panels ORDER BY panel_id DESC LIMIT ?", (self.panels.maxsize,))
+        roles: dict[int, set] = {}
+        for row in await self.db.fetchall("SELECT panel_id, role_id FROM panel_support_roles"):
+            roles.setdefault(row["panel_id"], set()).add(row["role_id"])
+        for row in reversed(panels):
+            self._store_panel({**row, "support_roles": frozenset(roles.get(row["panel_id"], ()))})
+        tickets = await self.db.fetchall("SELECT * FROM tickets WHERE channel_id != 0 ORDER BY ticket_id DESC LIMIT ?", (self.tickets.maxsize,))
+        for row in reversed(tickets):
+            self.tickets.put(row["channel_id"], dict(row))
+        self.channel_ids = {channel_id for (channel_id,) in await self.db.fetchall("SELECT channel_id FROM tickets WHERE channel_id != 0")}
+
+    def stats(self) -> dict:
+        return {"tickets": self.tickets.stats(), "panels": self.panels.stats(), "panel_messages": self.panel_messages.stats()}
+
+    # --- Tickets ---
+    async def ticket(self, channel_id: int) -> Optional[dict]:
+        ticket = self.tickets.get(channel_id)
+        if ticket is _MISSING:
+            row = await self.db.fetchone("SELECT * FROM tickets WHERE channel_id = ?", (channel_id,))
+            ticket = dict(row) if row else None
+            self.tickets.put(channel_id, ticket)
+        return ticket
+
+    async def add_ticket(self, ticket_id: int, channel_id: int) -> dict:
+        def attach(conn):
+            conn.execute("UPDATE tickets SET channel_id = ? WHERE ticket_id = ?", (channel_id, ticket_id))
+            return dict(conn.execute("SELECT * FROM tickets WHERE ticket_id = ?", (ticket_id,)).fetchone())
+        ticket = await self.db.transaction(attach)
+        self.tickets.put(channel_id, ticket)
+        self.channel_ids.add(channel_id)
+        return ticket
+
+    def is_ticket_channel(self, channel_id: int) -> bool:
+        return channel_id in self.channel_ids
+
+    async def update_ticket(self, channel_id: int, **fields):
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        await self.db.execute(f"UPDATE tickets SET {assignments} WHERE channel_id = ?", (*fields.values(), channel_id))
+        ticket = self.tickets.get(channel_id, None)
+        if ticket:
+            ticket.update(fields)
+
+    async def set_status(self, channel_id: int, status: str, expected: str) -> bool:
+        """Move a ticket from ``expected`` to ``status``; False if it was not in ``expected``, e.g. because a concurrent close won."""
+        cursor = await self.db.execute("UPDATE tickets SET status = ? WHERE channel_id = ? AND status = ?", (status, channel_id, expected))
+        if not cursor.rowcount:
+            return False
+        ticket = self.tickets.get(channel_id, None)
+        if ticket:
+            ticket["status"] = status
+        return True
+
+    async def delete_ticket(self, channel_id: int):
+        def delete(conn):
+            conn.execute("DELETE FROM transcript_fragments WHERE ticket_id IN (SELECT ticket_id FROM tickets WHERE channel_id = ?)", (channel_id,))
+            conn.execute("DELETE FROM timers WHERE ticket_id IN (SELECT ticket_id FROM tickets WHERE channel_id = ?)", (channel_id,))
+            conn.execute("DELETE FROM tickets WHERE channel_id = ?", (channel_id,))
+            conn.execute("DELETE FROM archived_messages WHERE channel_id = ?", (channel_id,))
+            conn.execute("DELETE FROM archive_sync WHERE channel_id = ?", (channel_id,))
+        await self.db.transaction(delete)
+        self.tickets.put(channel_id, None)
+        self.channel_ids.discard(channel_id)
+
+    # --- Panels ---
+    def _store_panel(self, panel: dict):
+        self.panels.put(panel["panel_id"], panel)
+        if panel["message_id"]:
+            self.panel_messages.put(panel["message_id"], panel["panel_id"])
+
+    async def panel(self, panel_id: int) -> Optional[dict]:
+        panel = self.panels.get(panel_id)
+        if panel is _MISSING:
+            panel = await self.db.read(_load_panel, "panel_id", panel_id)
+            if panel:
+                self._store_panel(panel)
+            else:
+                self.panels.put(panel_id, None)
+        return panel
+
+    async def panel_by_message(self, message_id: int) -> Optional[dict]:
+        panel_id = self.panel_messages.get(message_id)
+        if panel_id is _MISSING:
+            panel = await self.db.read(_load_panel, "message_id", message_id)
+            if not panel:
+                self.panel_messages.put(message_id, None)
+                return None
+            self._store_panel(panel)
+            return panel
+        if panel_id is None:
+            return None
+        panel = await self.panel(panel_id)
+        # The panel may have been re-posted under a new message since this entry was cached.
+        return panel if panel and panel["message_id"] == message_id else None
+
+    async def save_panel(self, panel_id: Optional[int], values: dict, support_role_ids: Iterable[int]) -> int:
+        support_role_ids = frozenset(support_role_ids)
+        values = {**values, "support_role_ids": ",".join(str(r_id) for r_id in support_role_ids)}
+        columns = list(values)
+        def save(conn):
+            if panel_id:
+                assignments = ", ".join(f"{column}=?" for column in columns)
+                conn.execute(f"UPDATE panels SET {assignments} WHERE panel_id=?", (*values.values(), panel_id))
+                new_id = panel_id
+            else:
+                placeholders = ", ".join("?" for _ in columns)
+                new_id = conn.execute(f"INSERT INTO panels ({', '.join(columns)}) VALUES ({placeholders})", tuple(values.values())).lastrowid
+            conn.execute("DELETE FROM panel_support_roles WHERE panel_id = ?", (new_id,))
+            conn.executemany("INSERT INTO panel_support_roles (panel_id, role_id) VALUES (?, ?)", [(new_id, r_id) for r_id in support_role_ids])
+            return _load_panel(conn, "panel_id", new_id)
+        old = self.panels.get(panel_id, None) if panel_id else None
+        panel = await self.db.transaction(save)
+        if old and old["message_id"] != panel["message_id"]:
+            self.panel_messages.put(old["message_id"], None)
+        self._store_panel(panel)
+        return panel["panel_id"]
@@ -0,0 +1,52 @@
+import os
+from typing import NamedTuple, Optional
+
+def shard_for(guild_id: int, shard_count: int) -> int:
+    # Discord's own guild-to-shard mapping.
+    return (guild_id >> 22) % shard_count
+
+# Which shards this process runs. In a multi-process deployment (see
+# launcher.py) every cluster owns a disjoint set of shards and therefore a
+# disjoint set of guilds: all gateway events, interactions and ticket writes
+# for a guild happen in the one process that owns it. That is what keeps the
+# per-process TicketCache coherent over a shared SQLite database, and work
+# that is not driven by an event (queued jobs, startup cleanup) is scoped to
+# owned guilds with ``sql_filter``. With the default (shard_ids None) the
+# process owns everything.
+class ClusterConfig(NamedTuple):
+    cluster_id: int = 0
+    cluster_count: int = 1
+    shard_count: Optional[int] = None
+    shard_ids: Optional[tuple[int, ...]] = None
+
+    @classmethod
+    def from_env(cls) -> "ClusterConfig":
+        shard_count = int(os.environ["SHARD_COUNT"]) if os.getenv("SHARD_COUNT") else None
+        shard_ids = tuple(int(s) for s in os.environ["SHARD_IDS"].split(",")) if os.getenv("SHARD_IDS") else None
+        return cls(int(os.getenv("CLUSTER_ID", 0)), int(os.getenv("CLUSTER_COUNT", 1)), shard_count, shard_ids)
+
+    @property
+    def partitioned(self) -> bool:
+        return self.shard_ids is not None and self.shard_count is not None
+
+    @property
+    def primary(self) -> bool:
+        """The cluster that performs once-per-deployment work such as syncing commands."""
+        return self.cluster_id == 0
+
+    def owns(self, guild_id: Optional[int]) -> bool:
+        if not self.partitioned:
+            return True
+        if guild_id is None:
+            return self.primary
+        return shard_for(guild_id, self.shard_count) in self.shard_ids
+
+    def sql_filter(self, column: str = "guild_id") -> tuple[str, tuple]:
+        """An SQL condition (and its parameters) matching rows whose guild this cluster owns."""
+        if not self.partitioned:
+            return "1", ()
+        placeholders = ", ".join("?" for _ in self.shard_ids)
+        condition = f"({column} >> 22) % ? IN ({placeholders})"
+        if self.primary:
+            condition = f"({column} IS NULL OR {condition})"
+        return condition, (self.shard_count, *self.shard_ids)
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+def _detach(cursor: sqlite3.Cursor) -> sqlite3.Cursor:
+    # Close the cursor on the writer thread before handing it back. A cursor
+    # that is garbage-collected on the event loop thread resets its (cached,
+    # shared) statement there, racing the writer thread if it is running the
+    # same SQL at that moment. rowcount and lastrowid stay readable.
+    cursor.close()
+    return cursor
+
+# Shared data-access layer. All SQLite work runs off the event loop:
+# writes are serialized on one dedicated writer thread, reads go to a small
+# pool of long-lived, read-only connections. WAL mode lets readers and the
+# writer proceed concurrently.
+class Database:
+    def __init__(self, path: str, readers: int = 4, statement_cache: int = 256, busy_timeout: float = 5.0):
+        self.path = path
+        # How long a connection waits for another process's write lock before failing.
+        self.busy_timeout = busy_timeout
+        self.readers = readers
+        self.statement_cache = statement_cache
+        self._local = threading.local()
+        self._reader_conns: list[sqlite3.Connection] = []
+        self._reader_lock = threading.Lock()
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._reader_pool: Optional[ThreadPoolExecutor] = None
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        # Called as observer(op, query, seconds, failed) after every call; see utils.metrics.
+        self.observer: Optional[Callable[[str, str, float, bool], None]] = None
+
+    def _open(self, read_only: bool = False) -> sqlite3.Connection:
+        # isolation_level=None: we issue BEGIN/COMMIT ourselves so a single
+        # statement never leaves a transaction open on a pooled connection.
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, cached_statements=self.statement_cache)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+        if read_only:
+            conn.execute("PRAGMA query_only = 1")
+        else:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open(read_only=True)
+            with self._reader_lock:
+                self._reader_conns.append(conn)
+        return conn
+
+    async def connect(self):
+        if self._writer is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._reader_pool = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="db-reader")
+        self._writer_conn = await asyncio.get_running_loop().run_in_executor(self._writer, self._open)
+
+    async def close(self):
+        if self._writer is None:
+            return
+        self._reader_pool.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        for conn in self._reader_conns:
+            conn.close()
+        self._writer_conn.close()
+        self._reader_conns.clear()
+        self._writer = self._reader_pool = self._writer_conn = None
+
+    # --- Internal dispatch ---
+    def _run_write(self, func: Callable, *args) -> Any:
+        conn = self._writer_conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(conn, *args)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    async def _write(self, func: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._writer, self._run_write, func, *args)
+
+    async def _read(self, func: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._reader_pool, lambda: func(self._reader(), *args))
+
+    async def _observed(self, op: str, query: str, pending: Awaitable) -> Any:
+        if self.observer is None:
+            return await pending
+        start, failed = time.perf_counter(), True
+        try:
+            result = await pending
+            failed = False
+            return result
+        finally:
+            self.observer(op, query, time.perf_counter() - start, failed)
+
+    # --- Public API ---
+    async def fetchone(self, sql: str, params: Iterable = ()) -> Optional[sqlite3.Row]:
+        return await self._observed("fetchone", sql, self._read(lambda conn: conn.execute(sql, params).fetchone()))
+
+    async def fetchall(self, sql: str, params: Iterable = ()) -> list[sqlite3.Row]:
+        return await self._observed("fetchall", sql, self._read(lambda conn: conn.execute(sql, params).fetchall()))
+
+    async def execute(self, sql: str, params: Iterable = ()) -> sqlite3.Cursor:
+        return await self._observed("execute", sql, self._write(lambda conn: _detach(conn.execute(sql, params))))
+
+    async def executemany(self, sql: str, seq_of_params: Iterable[Iterable]) -> sqlite3.Cursor:
+        return await self._observed("executemany", sql, self._write(lambda conn: _detach(conn.executemany(sql, seq_of_params))))
+
+    async def executescript(self, script: str):
+        # executescript() manages its own transaction, so bypass _run_write.
+        await asyncio.get_running_loop().run_in_executor(self._writer, self._writer_conn.executescript, script)
+
+    async def read(self, func: Callable[..., Any], *args) -> Any:
+        """Run ``func(conn, *args)`` on a pooled read-only connection."""
+        return await self._observed("read", getattr(func, "__qualname__", repr(func)), self._read(func, *args))
+
+    async def transaction(self, func: Callable[..., Any], *args) -> Any:
+        """Run ``func(conn, *args)`` on the writer thread inside one transaction."""
+        return await self._observed("transaction", getattr(func, "__qualname__", repr(func)), self._write(func, *args))
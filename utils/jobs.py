@@ -0,0 +1,225 @@
+import asyncio
+import contextvars
+import json
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Optional
+from utils.cluster import ClusterConfig
+from utils.database import Database
+
+log = logging.getLogger(__name__)
+
+JobHandler = Callable[[dict], Awaitable[None]]
+
+# The job the current task is running, for JobQueue.step.
+_current_job: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("current_job", default=None)
+
+# Persistent background job queue. Jobs are rows in the jobs table, so work
+# survives restarts: anything left 'running' by a crash is reset to 'pending'
+# on start. A fixed pool of worker tasks claims due jobs one at a time; failed
+# jobs are retried with exponential backoff until max_attempts is reached.
+# A retry runs the handler again from the top; work that must not be repeated
+# (an upload, a message) is wrapped in a step, which records its completion on
+# the job and is skipped by later attempts. finish() runs a job straight away,
+# for work that must be done before something else. When several processes share the
+# database, each only claims (and resumes) jobs for the guilds its cluster owns.
+class JobQueue:
+    def __init__(self, db: Database, workers: int = 4, max_attempts: int = 5, base_delay: float = 5.0, poll_interval: float = 30.0, cluster: ClusterConfig = ClusterConfig()):
+        self.db = db
+        self.cluster = cluster
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.poll_interval = poll_interval
+        self.handlers: dict[str, JobHandler] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def register(self, kind: str, handler: JobHandler):
+        self.handlers[kind] = handler
+
+    async def enqueue(self, kind: str, payload: dict, guild_id: Optional[int] = None, delay: float = 0.0) -> int:
+        now = time.time()
+        cursor = await self.db.execute(
+            "INSERT INTO jobs (kind, guild_id, payload, status, attempts, run_at, created_at, updated_at) VALUES (?, ?, ?, 'pending', 0, ?, ?, ?)",
+            (kind, guild_id, json.dumps(payload), now + delay, now, now),
+        )
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    async def enqueue_many(self, kind: str, payloads: list[dict], guild_id: Optional[int] = None, batch_id: Optional[int] = None) -> int:
+        now = time.time()
+        await self.db.executemany(
+            "INSERT INTO jobs (kind, guild_id, payload, status, attempts, run_at, created_at, updated_at, batch_id) VALUES (?, ?, ?, 'pending', 0, ?, ?, ?, ?)",
+            [(kind, guild_id, json.dumps(payload), now, now, now, batch_id) for payload in payloads],
+        )
+        self._wakeup.set()
+        return len(payloads)
+
+    async def start(self):
+        if self._tasks:
+            return
+        owned, params = self.cluster.sql_filter()
+        resumed = await self.db.execute(f"UPDATE jobs SET status = 'pending', updated_at = ? WHERE status = 'running' AND {owned}", (time.time(), *params))
+        if resumed.rowcount:
+            log.info("Resuming %d interrupted job(s)", resumed.rowcount)
+        self._tasks = [asyncio.create_task(self._worker(), name=f"job-worker-{i}") for i in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    # --- Steps ---
+    def completed(self, name: str) -> bool:
+        """Whether an earlier attempt of the current job completed step ``name``; False outside a job."""
+        job = _current_job.get()
+        return job is not None and name in job["steps"]
+
+    async def step(self, name: str, func: Callable[[], Awaitable]) -> bool:
+        """Run ``func`` as step ``name`` of the current job, unless an earlier attempt completed it.
+
+        Returns whether it ran. Outside a job ``func`` always runs.
+        """
+        job = _current_job.get()
+        if job is not None and name in job["steps"]:
+            return False
+        await func()
+        if job is not None:
+            job["steps"].append(name)
+            await self.db.execute("UPDATE jobs SET steps = ? WHERE job_id = ?", (json.dumps(job["steps"]), job["job_id"]))
+        return True
+
+    async def finish(self, kind: str, key: str, value, timeout: float = 300.0) -> bool:
+        """Run now any pending ``kind`` job whose payload has ``key`` = ``value``, or wait for one already running.
+
+        For work that has to be done before something else may happen, like a
+        transcript before its channel is deleted. Returns False if such a job
+        failed or was still running after ``timeout`` seconds; True otherwise,
+        including when there was none.
+        """
+        path = f"$.{key}"
+        deadline = time.monotonic() + timeout
+        waited_on = None
+        while True:
+            job = await self.db.transaction(self._claim_matching, kind, path, value)
+            if job is not None:
+                if not await self._run(job):
+                    return False
+                continue
+            if waited_on is not None:
+                row = await self.db.fetchone("SELECT status FROM jobs WHERE job_id = ?", (waited_on,))
+                if row and row["status"] == "failed":
+                    return False
+            row = await self.db.fetchone("SELECT job_id FROM jobs WHERE status = 'running' AND kind = ? AND json_extract(payload, ?) = ? LIMIT 1", (kind, path, value))
+            if row is None:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            waited_on = row["job_id"]
+            await asyncio.sleep(1)
+
+    # --- Workers ---
+    def _claim(self, conn) -> Optional[dict]:
+        now = time.time()
+        kinds = list(self.handlers)
+        if not kinds:
+            return None
+        owned, params = self.cluster.sql_filter()
+        row = conn.execute(
+            f"SELECT * FROM jobs WHERE status = 'pending' AND run_at <= ? AND kind IN ({', '.join('?' for _ in kinds)}) AND {owned} ORDER BY run_at LIMIT 1",
+            (now, *kinds, *params),
+        ).fetchone()
+        return self._take(conn, row, now) if row else None
+
+    def _claim_matching(self, conn, kind: str, path: str, value) -> Optional[dict]:
+        # Due or not: finish() runs the job now instead of waiting for a worker.
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'pending' AND kind = ? AND json_extract(payload, ?) = ? ORDER BY job_id LIMIT 1", (kind, path, value),
+        ).fetchone()
+        return self._take(conn, row, time.time()) if row else None
+
+    def _take(self, conn, row, now: float) -> dict:
+        conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE job_id = ?", (now, row["job_id"]))
+        return {**row, "attempts": row["attempts"] + 1, "steps": json.loads(row["steps"]) if row["steps"] else []}
+
+    async def _next_due_in(self) -> float:
+        owned, params = self.cluster.sql_filter()
+        row = await self.db.fetchone(f"SELECT MIN(run_at) FROM jobs WHERE status = 'pending' AND {owned}", params)
+        if not row or row[0] is None:
+            return self.poll_interval
+        return min(max(row[0] - time.time(), 0.0), self.poll_interval)
+
+    async def _worker(self):
+        while True:
+            # Clear before claiming so an enqueue that lands mid-claim still wakes us.
+            self._wakeup.clear()
+            try:
+                job = await self.db.transaction(self._claim)
+            except Exception:
+                log.exception("Failed to claim job")
+                job = None
+            if job is None:
+                try:
+                    timeout = await self._next_due_in()
+                except Exception:
+                    log.exception("Failed to look up the next due job")
+                    timeout = self.poll_interval
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict) -> bool:
+        token = _current_job.set(job)
+        try:
+            await self.handlers[job["kind"]](json.loads(job["payload"]))
+        except asyncio.CancelledError:
+            # Shutting down; the job is resumed on the next start.
+            raise
+        except Exception as e:
+            log.exception("Job %d (%s) failed on attempt %d", job["job_id"], job["kind"], job["attempts"])
+            now = time.time()
+            if job["attempts"] >= self.max_attempts:
+                await self._record(job, "UPDATE jobs SET status = 'failed', last_error = ?, updated_at = ? WHERE job_id = ?", (repr(e), now, job["job_id"]))
+            else:
+                delay = self.base_delay * 2 ** (job["attempts"] - 1) * random.uniform(0.8, 1.2)
+                await self._record(job, "UPDATE jobs SET status = 'pending', run_at = ?, last_error = ?, updated_at = ? WHERE job_id = ?", (now + delay, repr(e), now, job["job_id"]))
+            return False
+        finally:
+            _current_job.reset(token)
+        await self._record(job, "UPDATE jobs SET status = 'done', last_error = NULL, updated_at = ? WHERE job_id = ?", (time.time(), job["job_id"]))
+        return True
+
+    async def _record(self, job: dict, sql: str, params: tuple, attempts: int = 3):
+        # A failed status write must not end the worker; the database is usually
+        # only busy for a moment. If it keeps failing the job stays 'running'
+        # until the next start resumes it.
+        for attempt in range(attempts):
+            try:
+                await self.db.execute(sql, params)
+                return
+            except Exception:
+                log.exception("Failed to record the outcome of job %d (%s)", job["job_id"], job["kind"])
+                if attempt + 1 < attempts:
+                    await asyncio.sleep(2 ** attempt)
+
+    # --- Status ---
+    async def stats(self, guild_id: Optional[int] = None) -> dict:
+        where, params = ("WHERE guild_id = ?", (guild_id,)) if guild_id else ("", ())
+        # Bulk operations are reported by /bulk status; keep them out of the general view.
+        where = f"{where} {'AND' if where else 'WHERE'} batch_id IS NULL"
+        counts = {row["status"]: row["n"] for row in await self.db.fetchall(f"SELECT status, COUNT(*) AS n FROM jobs {where} GROUP BY status", params)}
+        recent = await self.db.fetchall(f"SELECT job_id, kind, status, attempts, last_error, updated_at FROM jobs {where} AND status != 'done' ORDER BY updated_at DESC LIMIT 10", params)
+        return {"counts": counts, "recent": [dict(row) for row in recent], "workers": len(self._tasks)}
+
+    async def batch_progress(self, batch_id: int) -> dict:
+        return {row["status"]: row["n"] for row in await self.db.fetchall("SELECT status, COUNT(*) AS n FROM jobs WHERE batch_id = ? GROUP BY status", (batch_id,))}
+
+    async def cancel_batch(self, batch_id: int) -> int:
+        cursor = await self.db.execute("UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE batch_id = ? AND status = 'pending'", (time.time(), batch_id))
+        return cursor.rowcount
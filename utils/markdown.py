@@ -0,0 +1,188 @@
+import datetime
+import html
+import re
+from typing import Optional
+import discord
+from utils.records import MessageRecord
+
+# Discord markdown to transcript HTML. Code fences are cut out first (their
+# contents are literal), then quote and header lines, then everything else
+# goes through one compiled regex whose alternatives are the inline tokens:
+# code spans, escapes, emphasis, spoilers, mentions, custom emoji, timestamps
+# and links. Emphasis is rendered recursively, so it nests like in the client,
+# down to MAX_DEPTH levels; deeper markup is shown as typed. Text with none of
+# the characters these need takes a single regex search and html.escape, the
+# same as plain text did. Message text is untrusted and short transcripts are
+# rendered on the event loop, so every alternative must scan in linear time:
+# the italic body, for one, cannot cross a lone "*" (an unclosed one would
+# otherwise rescan the rest of the message from every later "*").
+#
+# Mentions are rendered from a name map made by Mentions, which resolves each
+# user, role and channel id once per transcript, on the event loop, so the
+# renderer itself stays a pure function that can run in a worker process.
+
+# Every token needs one of these (":" for links); a plain character class scans fastest.
+_ANY = re.compile(r"[\\*_~|`<>#:]")
+_BLOCK_START = re.compile(r"^(?:> |>>> |#{1,3} )", re.M)
+_HEADER = re.compile(r"(#{1,3}) (.+)")
+_FENCE = re.compile(r"```(?:([\w+#.-]{1,32})?\n)?(.+?)```", re.S)
+_MENTION = re.compile(r"<(@!?|@&|#)(\d{15,20})>")
+
+_INLINE = re.compile(
+    r"(?P<tick>`+)(?P<code>.+?)(?P=tick)"
+    r"|\\(?P<esc>[^\w\s])"
+    r"|\*\*(?P<b>.+?)\*\*(?!\*)"
+    r"|__(?P<u>.+?)__(?!_)"
+    r"|\*(?!\s)(?P<i>(?:[^*]|\*\*[^*]+\*\*)+?)(?<!\s)\*(?!\*)"
+    r"|(?<!\w)_(?P<i2>[^_\n]+?)_(?!\w)"
+    r"|~~(?P<s>.+?)~~"
+    r"|\|\|(?P<spoiler>.+?)\|\|"
+    r"|<(?P<kind>@!?|@&|#)(?P<mention>\d{15,20})>"
+    r"|<(?P<animated>a?):(?P<emoji_name>\w{2,32}):(?P<emoji>\d{15,20})>"
+    r"|<t:(?P<ts>-?\d{1,13})(?::[tTdDfFR])?>"
+    r"|<(?P<bracketed>https?://[^\s>]+)>"
+    r"|(?P<url>https?://[^\s<]+[^\s<.,:;\"')\]])",
+    re.S,
+)
+
+_TAGS = {"b": "strong", "u": "u", "i": "em", "i2": "em", "s": "s"}
+MAX_DEPTH = 8
+_UNKNOWN = {"@": "@unknown-user", "@&": "@unknown-role", "#": "#unknown-channel"}
+
+def _key(kind: str, id: str) -> str:
+    return ("@" if kind == "@!" else kind) + id
+
+class Mentions:
+    """Display names for the mentions in one transcript; each id is looked up once."""
+    def __init__(self, guild: Optional[discord.Guild] = None):
+        self.guild = guild
+        self.names: dict[str, str] = {}
+
+    def _lookup(self, kind: str, id: int) -> str:
+        guild = self.guild
+        if kind == "@&":
+            target = guild.get_role(id) if guild else None
+            return f"@{target.name}" if target else _UNKNOWN[kind]
+        if kind == "#":
+            target = guild.get_channel(id) if guild else None
+            return f"#{target.name}" if target else _UNKNOWN[kind]
+        target = guild.get_member(id) if guild else None
+        return f"@{target.display_name}" if target else _UNKNOWN["@"]
+
+    def _scan(self, text: Optional[str]):
+        if not text or "<" not in text:
+            return
+        for kind, id in _MENTION.findall(text):
+            key = _key(kind, id)
+            if key not in self.names:
+                self.names[key] = self._lookup("@" if kind == "@!" else kind, int(id))
+
+    def scan(self, message: MessageRecord):
+        """Resolve any mentions in ``message`` not seen earlier in this transcript."""
+        self._scan(message.content)
+        for embed in message.embeds:
+            self._scan(embed.description)
+            for _, value in embed.fields:
+                self._scan(value)
+
+def _timestamp(value: str) -> str:
+    try:
+        when = datetime.datetime.fromtimestamp(int(value), datetime.timezone.utc)
+    except (OverflowError, OSError, ValueError):
+        return html.escape(f"<t:{value}>")
+    return f'<span class="ts">{when:%Y-%m-%d %H:%M UTC}</span>'
+
+def _inline(text: str, names: dict[str, str], depth: int = 0) -> str:
+    if depth > MAX_DEPTH:
+        return html.escape(text)
+    parts = []
+    pos = 0
+    for match in _INLINE.finditer(text):
+        parts.append(html.escape(text[pos:match.start()]))
+        pos = match.end()
+        token = match.lastgroup
+        if token == "code":
+            parts.append(f"<code>{html.escape(match['code'])}</code>")
+        elif token == "esc":
+            parts.append(html.escape(match["esc"]))
+        elif token in _TAGS:
+            tag = _TAGS[token]
+            parts.append(f"<{tag}>{_inline(match[token], names, depth + 1)}</{tag}>")
+        elif token == "spoiler":
+            parts.append(f'<span class="spoiler">{_inline(match[token], names, depth + 1)}</span>')
+        elif token == "mention":
+            kind = match["kind"]
+            name = names.get(_key(kind, match["mention"])) or _UNKNOWN["@" if kind == "@!" else kind]
+            parts.append(f'<span class="mention">{html.escape(name)}</span>')
+        elif token == "emoji":
+            extension = "gif" if match["animated"] else "png"
+            parts.append(f'<img class="emoji" src="https://cdn.discordapp.com/emojis/{match["emoji"]}.{extension}" alt=":{match["emoji_name"]}:" title=":{match["emoji_name"]}:">')
+        elif token == "ts":
+            parts.append(_timestamp(match["ts"]))
+        else:
+            url = html.escape(match[token])
+            parts.append(f'<a href="{url}" target="_blank">{url}</a>')
+    parts.append(html.escape(text[pos:]))
+    return "".join(parts)
+
+def _blocks(text: str, names: dict[str, str]) -> str:
+    # Quote and header lines; block elements break the line themselves, so the
+    # newline that separates them from plain text is not emitted.
+    if not _BLOCK_START.search(text):
+        return _inline(text, names)
+    parts, plain = [], []
+
+    def flush():
+        if plain:
+            parts.append(_inline("\n".join(plain), names))
+            plain.clear()
+
+    lines = text.split("\n")
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith(">>> "):
+            flush()
+            rest = "\n".join([line[4:], *lines[i + 1:]])
+            parts.append(f"<blockquote>{_inline(rest, names)}</blockquote>")
+            break
+        if line.startswith("> "):
+            flush()
+            quoted = []
+            while i < len(lines) and lines[i].startswith("> "):
+                quoted.append(lines[i][2:])
+                i += 1
+            quote = "\n".join(quoted)
+            parts.append(f"<blockquote>{_inline(quote, names)}</blockquote>")
+            continue
+        if (header := _HEADER.fullmatch(line)):
+            flush()
+            level = len(header[1])
+            parts.append(f"<h{level + 2}>{_inline(header[2], names)}</h{level + 2}>")
+        else:
+            plain.append(line)
+        i += 1
+    flush()
+    return "".join(parts)
+
+def render_markdown(text: str, names: Optional[dict[str, str]] = None) -> str:
+    """``text`` as HTML; ``names`` maps mention keys to display names (see Mentions)."""
+    if not _ANY.search(text):
+        return html.escape(text)
+    names = names or {}
+    if "```" not in text:
+        return _blocks(text, names)
+    parts = []
+    pos = 0
+    for fence in _FENCE.finditer(text):
+        if fence.start() > pos:
+            parts.append(_blocks(text[pos:fence.start()].removesuffix("\n"), names))
+        language = f' data-lang="{html.escape(fence[1])}"' if fence[1] else ""
+        code = html.escape(fence[2].removesuffix("\n"))
+        parts.append(f"<pre{language}><code>{code}</code></pre>")
+        pos = fence.end()
+        if text.startswith("\n", pos):
+            pos += 1
+    if pos < len(text):
+        parts.append(_blocks(text[pos:], names))
+    return "".join(parts)
@@ -0,0 +1,287 @@
+import asyncio
+import bisect
+import functools
+import re
+import time
+import types
+import weakref
+from typing import Callable, Optional
+import aiohttp
+from aiohttp import web
+import discord
+from discord import app_commands, ui
+
+# In-process metrics: latency histograms and counters keyed by label values,
+# exported in the Prometheus text format and summarised by /botstats.
+# Everything is updated from the event loop thread, so no locking is needed.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(10))  # 1 KiB .. 256 MiB
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{_labels(self.labels, key)} {value}" for key, value in self.values.items()]
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def quantile(self, q: float, *labels) -> Optional[float]:
+        """Estimate a quantile by interpolating within the bucket that contains it."""
+        series = self.series.get(labels)
+        if not series or not series[2]:
+            return None
+        rank, seen = q * series[2], 0
+        for i, n in enumerate(series[0]):
+            if n and seen + n >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    def render(self) -> list[str]:
+        lines = []
+        for key, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+class Gauge:
+    def __init__(self, name: str, help: str, labels: tuple, collect: Callable[[], dict], type: str = "gauge"):
+        self.name = name
+        self.type = type
+        self.help = help
+        self.labels = labels
+        self.collect = collect  # () -> {label values: value}
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{_labels(self.labels, key)} {value}" for key, value in self.collect().items()]
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, object] = {}
+
+    def _add(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, labels: tuple, collect: Callable[[], dict], type: str = "gauge") -> Gauge:
+        """A metric read from ``collect()`` at export time; ``type`` may be "counter" for running totals."""
+        self.metrics[name] = Gauge(name, help, labels, collect, type)
+        return self.metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+INTERACTION_SECONDS = REGISTRY.histogram("ticketbot_interaction_seconds", "Time spent handling app commands and component interactions.", ("kind", "name"))
+INTERACTION_ERRORS = REGISTRY.counter("ticketbot_interaction_errors_total", "Interactions whose handler raised.", ("kind", "name"))
+DB_SECONDS = REGISTRY.histogram("ticketbot_db_query_seconds", "Database call latency, including time queued for a connection.", ("op", "query"))
+DB_ERRORS = REGISTRY.counter("ticketbot_db_errors_total", "Database calls that raised.", ("op", "query"))
+TRANSCRIPT_SECONDS = REGISTRY.histogram("ticketbot_transcript_render_seconds", "Time to render a transcript file.", ("mode",))
+TRANSCRIPT_BYTES = REGISTRY.histogram("ticketbot_transcript_bytes", "Size of rendered transcript files.", ("mode",), SIZE_BUCKETS)
+REST_SECONDS = REGISTRY.histogram("ticketbot_discord_rest_seconds", "Discord REST request latency.", ("method", "route"))
+REST_RESPONSES = REGISTRY.counter("ticketbot_discord_rest_responses_total", "Discord REST responses by status; 429s are rate limits.", ("route", "status"))
+REST_QUEUE_SECONDS = REGISTRY.histogram("ticketbot_rest_queue_seconds", "Time background REST calls waited for client-side rate-limit budget.", ("route",))
+
+# --- Database ---
+_PLACEHOLDERS = re.compile(r"\?(?:\s*,\s*\?)+")
+
+@functools.lru_cache(maxsize=1024)
+def query_label(sql: str) -> str:
+    # One series per statement shape: whitespace collapsed, variable-length IN lists folded.
+    return _PLACEHOLDERS.sub("?, ...", " ".join(sql.split()))[:160]
+
+def observe_db(op: str, query: str, seconds: float, failed: bool):
+    label = query_label(query)
+    DB_SECONDS.observe(seconds, op, label)
+    if failed:
+        DB_ERRORS.inc(op, label)
+
+# --- Discord REST ---
+_ID_SEGMENT = re.compile(r"^\d{15,}$")
+_TOKEN_SEGMENT = re.compile(r"^[\w-]{40,}$")
+
+@functools.lru_cache(maxsize=4096)
+def route_label(path: str) -> str:
+    parts = path.split("/")
+    if len(parts) > 3 and parts[1] == "api":
+        parts = parts[3:]  # drop /api/v10
+    return "/" + "/".join("{id}" if _ID_SEGMENT.match(p) else "{token}" if _TOKEN_SEGMENT.match(p) else p for p in parts if p)
+
+def http_trace() -> aiohttp.TraceConfig:
+    """An aiohttp trace config that times every request discord.py makes."""
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context: types.SimpleNamespace, params: aiohttp.TraceRequestStartParams):
+        context.start = time.perf_counter()
+
+    async def on_request_end(session, context: types.SimpleNamespace, params: aiohttp.TraceRequestEndParams):
+        route = route_label(params.url.path)
+        REST_SECONDS.observe(time.perf_counter() - context.start, params.method, route)
+        REST_RESPONSES.inc(route, str(params.response.status))
+
+    async def on_request_exception(session, context: types.SimpleNamespace, params: aiohttp.TraceRequestExceptionParams):
+        REST_RESPONSES.inc(route_label(params.url.path), type(params.exception).__name__)
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    return trace
+
+# --- Interactions ---
+# The handler each interaction task is running ("command:name" or
+# "component:custom_id"), for utils/watchdog.py to attribute stalls to.
+# Entries disappear with their task.
+HANDLERS: "weakref.WeakKeyDictionary[asyncio.Task, str]" = weakref.WeakKeyDictionary()
+
+def _label_task(label: str):
+    task = asyncio.current_task()
+    if task is not None:
+        HANDLERS[task] = label
+
+class InstrumentedTree(app_commands.CommandTree):
+    """Times every app command from the check phase to completion or error."""
+    def __init__(self, client, **kwargs):
+        super().__init__(client, **kwargs)
+        client.add_listener(self._on_completion, "on_app_command_completion")
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["metrics_start"] = time.perf_counter()
+        if interaction.command:
+            _label_task(f"command:{interaction.command.qualified_name}")
+        return True
+
+    def _observe(self, interaction: discord.Interaction, failed: bool):
+        start = interaction.extras.pop("metrics_start", None)
+        name = interaction.command.qualified_name if interaction.command else "unknown"
+        if start is not None:
+            INTERACTION_SECONDS.observe(time.perf_counter() - start, "command", name)
+        if failed:
+            INTERACTION_ERRORS.inc("command", name)
+
+    async def _on_completion(self, interaction: discord.Interaction, command):
+        self._observe(interaction, failed=False)
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        # Failed permission checks are reported here too; they count as errors.
+        self._observe(interaction, failed=True)
+        await super().on_error(interaction, error)
+
+class InstrumentedView(ui.View):
+    """A view whose item callbacks are timed, labelled by custom_id.
+
+    Only use it for persistent views: their custom_ids are fixed, which keeps
+    the number of series bounded.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for item in self.children:
+            item.callback = self._timed(getattr(item, "custom_id", None) or type(item).__name__, item.callback)
+
+    @staticmethod
+    def _timed(name: str, callback):
+        @functools.wraps(callback)
+        async def timed(interaction: discord.Interaction):
+            start = time.perf_counter()
+            _label_task(f"component:{name}")
+            try:
+                return await callback(interaction)
+            except Exception:
+                INTERACTION_ERRORS.inc("component", name)
+                raise
+            finally:
+                INTERACTION_SECONDS.observe(time.perf_counter() - start, "component", name)
+        return timed
+
+# --- Export ---
+class MetricsServer:
+    """Serves REGISTRY at /metrics for Prometheus to scrape."""
+    def __init__(self, registry: Registry, host: str, port: int):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8", headers={"X-Content-Type-Options": "nosniff"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+def summarize(histogram: Histogram, errors: Optional[Counter] = None, top: int = 8, key: str = "p95") -> list[dict]:
+    """The ``top`` series of a histogram by ``key`` (p50, p95, total or count), for display."""
+    rows = []
+    for labels, (_, total, count) in histogram.series.items():
+        rows.append({
+            "labels": labels,
+            "count": count,
+            "total": total,
+            "p50": histogram.quantile(0.5, *labels),
+            "p95": histogram.quantile(0.95, *labels),
+            "errors": int(errors.values.get(labels, 0)) if errors else 0,
+        })
+    rows.sort(key=lambda row: row[key] or 0, reverse=True)
+    return rows[:top]
@@ -0,0 +1,304 @@
+import logging
+import sqlite3
+from utils.database import Database
+
+log = logging.getLogger(__name__)
+
+def _backfill_panel_support_roles(conn: sqlite3.Connection):
+    rows = conn.execute("SELECT panel_id, support_role_ids FROM panels").fetchall()
+    conn.executemany(
+        "INSERT OR IGNORE INTO panel_support_roles (panel_id, role_id) VALUES (?, ?)",
+        [(panel_id, int(r_id)) for panel_id, role_ids in rows for r_id in (role_ids or "").split(",") if r_id],
+    )
+
+def _dedupe_open_tickets(conn: sqlite3.Connection):
+    # Placeholder rows from creations that never got a channel can be dropped outright.
+    conn.execute("DELETE FROM tickets WHERE channel_id = 0")
+    # Older duplicates left by the pre-constraint race are closed so the unique index can be built.
+    closed = conn.execute("""
+        UPDATE tickets SET status = 'closed'
+        WHERE status = 'open' AND ticket_id NOT IN (
+            SELECT MAX(ticket_id) FROM tickets WHERE status = 'open' GROUP BY owner_id, panel_id
+        )
+    """).rowcount
+    if closed:
+        log.warning("Closed %d duplicate open ticket(s) before adding the one-open-ticket constraint", closed)
+
+# Ordered schema migrations. Each entry is (version, description, steps), where
+# a step is either an SQL statement or a callable taking the connection.
+# Never edit a migration that has shipped; append a new one instead.
+MIGRATIONS = [
+    (1, "initial schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS panels (
+            panel_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            panel_name TEXT NOT NULL,
+            message_id INTEGER,
+            channel_id INTEGER,
+            support_role_ids TEXT NOT NULL, -- CHANGED: From support_role_id INTEGER
+            category_id INTEGER NOT NULL,
+            transcript_channel_id INTEGER NOT NULL,
+            is_claimable INTEGER DEFAULT 0,
+            panel_description TEXT,
+            button_text TEXT,
+            welcome_message TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS tickets (
+            ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            panel_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            owner_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            ticket_num INTEGER NOT NULL,
+            claimed_by_id INTEGER
+        )
+        ''',
+    ]),
+    (2, "indexes for hot lookups", [
+        # Permission checks, close/open/claim and closerequest all look tickets up by channel.
+        "CREATE INDEX IF NOT EXISTS idx_tickets_channel ON tickets(channel_id)",
+        # "Already have an open ticket" check in create_ticket.
+        "CREATE INDEX IF NOT EXISTS idx_tickets_owner_status_panel ON tickets(owner_id, status, panel_id)",
+        # Create Ticket clicks resolve the panel from the clicked message.
+        "CREATE INDEX IF NOT EXISTS idx_panels_message ON panels(message_id)",
+        # /editpanel lists a guild's panels.
+        "CREATE INDEX IF NOT EXISTS idx_panels_guild ON panels(guild_id)",
+    ]),
+    (3, "normalize panel support roles", [
+        # panels.support_role_ids is kept in sync for older builds but is no longer read.
+        '''
+        CREATE TABLE IF NOT EXISTS panel_support_roles (
+            panel_id INTEGER NOT NULL,
+            role_id INTEGER NOT NULL,
+            PRIMARY KEY (panel_id, role_id)
+        ) WITHOUT ROWID
+        ''',
+        _backfill_panel_support_roles,
+    ]),
+    (4, "incremental transcript checkpoints", [
+        # Rendered transcript HTML, one row per flushed chunk. A ticket's checkpoint
+        # is the highest last_message_id among its fragments.
+        '''
+        CREATE TABLE IF NOT EXISTS transcript_fragments (
+            ticket_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            html TEXT NOT NULL,
+            PRIMARY KEY (ticket_id, seq)
+        )
+        ''',
+    ]),
+    (5, "live message archive", [
+        '''
+        CREATE TABLE IF NOT EXISTS archived_messages (
+            message_id INTEGER PRIMARY KEY,
+            channel_id INTEGER NOT NULL,
+            author_id INTEGER NOT NULL,
+            author_name TEXT NOT NULL,
+            avatar_url TEXT NOT NULL,
+            content TEXT NOT NULL,
+            edited_at TEXT,
+            attachments TEXT, -- JSON
+            embeds TEXT, -- JSON
+            deleted INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_archived_messages_channel ON archived_messages(channel_id, message_id)",
+        '''
+        CREATE TABLE IF NOT EXISTS archive_sync (
+            channel_id INTEGER PRIMARY KEY,
+            synced_until INTEGER NOT NULL
+        )
+        ''',
+    ]),
+    (6, "background job queue", [
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            guild_id INTEGER,
+            payload TEXT NOT NULL, -- JSON
+            status TEXT NOT NULL, -- pending, running, done, failed
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_at REAL NOT NULL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs(status, run_at)",
+    ]),
+    (7, "bulk ticket operations", [
+        '''
+        CREATE TABLE IF NOT EXISTS bulk_operations (
+            operation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            filters TEXT NOT NULL, -- JSON
+            total INTEGER NOT NULL,
+            created_by INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        )
+        ''',
+        "ALTER TABLE jobs ADD COLUMN batch_id INTEGER",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs(batch_id, status)",
+    ]),
+    (8, "atomic ticket creation", [
+        '''
+        CREATE TABLE IF NOT EXISTS guild_counters (
+            guild_id INTEGER PRIMARY KEY,
+            last_ticket_num INTEGER NOT NULL
+        )
+        ''',
+        "INSERT OR IGNORE INTO guild_counters (guild_id, last_ticket_num) SELECT guild_id, MAX(ticket_num) FROM tickets GROUP BY guild_id",
+        _dedupe_open_tickets,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_tickets_one_open ON tickets(owner_id, panel_id) WHERE status = 'open'",
+    ]),
+    (9, "pre-created ticket channel pool", [
+        "ALTER TABLE panels ADD COLUMN pool_size INTEGER NOT NULL DEFAULT 0",
+        # Hidden channels created ahead of time and waiting to become tickets.
+        '''
+        CREATE TABLE IF NOT EXISTS channel_pool (
+            channel_id INTEGER PRIMARY KEY,
+            panel_id INTEGER NOT NULL,
+            guild_id INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_channel_pool_panel ON channel_pool(panel_id, created_at)",
+    ]),
+    (10, "bot state and startup reports", [
+        '''
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS startup_reports (
+            report_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cluster_id INTEGER NOT NULL,
+            started_at REAL NOT NULL,
+            time_to_ready REAL,
+            report TEXT NOT NULL -- JSON
+        )
+        ''',
+    ]),
+    (11, "transcript fragment style", [
+        # Fragments of different styles cannot be concatenated into one file.
+        "ALTER TABLE transcript_fragments ADD COLUMN style TEXT NOT NULL DEFAULT 'full'",
+    ]),
+    (12, "structured ticket archives", [
+        # One gzipped NDJSON document per ticket (see utils/ticket_archive.py). Rows
+        # outlive the ticket and its channel; transcripts are rendered from them.
+        '''
+        CREATE TABLE IF NOT EXISTS ticket_archives (
+            ticket_id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            panel_id INTEGER NOT NULL,
+            ticket_num INTEGER NOT NULL,
+            owner_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            channel_name TEXT NOT NULL,
+            message_count INTEGER NOT NULL,
+            archived_at REAL NOT NULL,
+            data BLOB NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_ticket_archives_guild_num ON ticket_archives(guild_id, ticket_num)",
+    ]),
+    (13, "ticket full-text search", [
+        # See utils/search.py. rowid is the message id; the prefix indexes serve "word*" queries.
+        "CREATE VIRTUAL TABLE IF NOT EXISTS ticket_search USING fts5(content, scope, ticket_id UNINDEXED, author_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2', prefix = '3 4')",
+        '''
+        CREATE TABLE IF NOT EXISTS search_indexed (
+            ticket_id INTEGER PRIMARY KEY,
+            message_count INTEGER NOT NULL,
+            indexed_at REAL NOT NULL
+        )
+        ''',
+    ]),
+    (14, "content-addressed transcript store", [
+        # See utils/transcript_store.py. manifest lists the transcript's pieces,
+        # each either inline text or the hash of a file under the store's root.
+        '''
+        CREATE TABLE IF NOT EXISTS transcript_store (
+            transcript_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            panel_id INTEGER,
+            ticket_id INTEGER NOT NULL,
+            ticket_num INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            style TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            manifest TEXT NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_transcript_store_guild_num ON transcript_store(guild_id, ticket_num)",
+        "CREATE INDEX IF NOT EXISTS idx_transcript_store_ticket ON transcript_store(ticket_id)",
+        "CREATE INDEX IF NOT EXISTS idx_transcript_store_created ON transcript_store(created_at)",
+        '''
+        CREATE TABLE IF NOT EXISTS transcript_objects (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            stored_size INTEGER NOT NULL,
+            refs INTEGER NOT NULL,
+            released_at REAL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_transcript_objects_unreferenced ON transcript_objects(released_at) WHERE refs <= 0",
+    ]),
+    (15, "ticket automation timers", [
+        # 0 disables each of them; see cogs/automation.py.
+        "ALTER TABLE panels ADD COLUMN auto_close_hours REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE panels ADD COLUMN close_request_hours REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE panels ADD COLUMN unclaimed_reminder_minutes INTEGER NOT NULL DEFAULT 0",
+        # See utils/timers.py. One timer of each kind per ticket, looked up by ticket when it closes.
+        '''
+        CREATE TABLE IF NOT EXISTS timers (
+            ticket_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            due_at REAL NOT NULL,
+            payload TEXT,
+            PRIMARY KEY (ticket_id, kind)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (16, "job steps", [
+        # JSON list of the steps (JobQueue.step) earlier attempts of a job completed.
+        "ALTER TABLE jobs ADD COLUMN steps TEXT",
+    ]),
+]
+
+def _current_version(conn: sqlite3.Connection) -> int:
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL, applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)")
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def _apply(conn: sqlite3.Connection) -> list[int]:
+    current = _current_version(conn)
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        for step in steps:
+            if callable(step):
+                step(conn)
+            else:
+                conn.execute(step)
+        conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+        log.info("Applied migration %d: %s", version, description)
+        applied.append(version)
+    return applied
+
+async def run_migrations(db: Database) -> list[int]:
+    # Runs in a single write transaction, so a failed migration leaves the
+    # database at its previous version and existing databases upgrade in place.
+    return await db.transaction(_apply)
@@ -0,0 +1,176 @@
+import asyncio
+import collections
+import logging
+import time
+from typing import Optional
+import discord
+from utils.database import Database
+from utils.ratelimit import RouteScheduler
+
+log = logging.getLogger(__name__)
+
+POOL_CHANNEL_NAME = "ticket-pool"
+
+class PoolStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.lags: collections.deque[float] = collections.deque(maxlen=100)
+        self.short_since: Optional[float] = None
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+# Warm pool of hidden, pre-created ticket channels per panel. Creating a
+# channel is the slowest part of opening a ticket and is rate limited per
+# guild, so panels with a pool_size keep that many channels ready in their
+# category, visible only to the bot. Claiming one is a single channel edit
+# (rename plus the ticket's overwrites); the pool is then topped up in the
+# background through the REST scheduler. channel_pool is the source of truth,
+# so claims are atomic across concurrent clicks and pooled channels survive
+# restarts.
+class ChannelPool:
+    def __init__(self, db: Database, rest: RouteScheduler):
+        self.db = db
+        self.rest = rest
+        self.stats: dict[int, PoolStats] = collections.defaultdict(PoolStats)
+        self._refills: dict[int, asyncio.Task] = {}
+        self._wanted: dict[int, tuple] = {}
+
+    def _pop(self, conn, panel_id: int) -> Optional[int]:
+        row = conn.execute("SELECT channel_id FROM channel_pool WHERE panel_id = ? ORDER BY created_at LIMIT 1", (panel_id,)).fetchone()
+        if not row:
+            return None
+        conn.execute("DELETE FROM channel_pool WHERE channel_id = ?", (row[0],))
+        return row[0]
+
+    async def claim(self, guild: discord.Guild, panel: dict, name: str, overwrites: dict) -> Optional[discord.TextChannel]:
+        """Turn a pooled channel into ``name`` with ``overwrites``, or return None if the pool is empty."""
+        if not panel.get("pool_size"):
+            return None
+        stats = self.stats[panel["panel_id"]]
+        stale = []
+        try:
+            while (channel_id := await self.db.transaction(self._pop, panel["panel_id"])) is not None:
+                channel = guild.get_channel(channel_id)
+                # Skip channels deleted by hand. Those left behind by a category change
+                # go back into the pool, and the refill below deletes them.
+                if channel is None:
+                    continue
+                if channel.category_id != panel["category_id"]:
+                    stale.append(channel)
+                    continue
+                try:
+                    await channel.edit(name=name, overwrites=overwrites)
+                except discord.NotFound:
+                    continue
+                except BaseException:
+                    # The channel is still hidden; put it back for the next claim.
+                    await self._put_back(guild, panel["panel_id"], [channel])
+                    raise
+                stats.hits += 1
+                return channel
+            stats.misses += 1
+            return None
+        finally:
+            if stale:
+                await self._put_back(guild, panel["panel_id"], stale)
+            if stats.short_since is None:
+                stats.short_since = time.monotonic()
+            self.refill(guild, panel)
+
+    async def _put_back(self, guild: discord.Guild, panel_id: int, channels: list):
+        await self.db.executemany("INSERT OR IGNORE INTO channel_pool (channel_id, panel_id, guild_id, created_at) VALUES (?, ?, ?, ?)", [(channel.id, panel_id, guild.id, time.time()) for channel in channels])
+
+    async def size(self, panel_id: int) -> int:
+        row = await self.db.fetchone("SELECT COUNT(*) FROM channel_pool WHERE panel_id = ?", (panel_id,))
+        return row[0]
+
+    # --- Refill ---
+    def refill(self, guild: discord.Guild, panel: dict):
+        """Top the panel's pool up to (or trim it down to) pool_size in the background."""
+        # A running refill picks up the newest request when it finishes its pass.
+        self._wanted[panel["panel_id"]] = (guild, panel)
+        task = self._refills.get(panel["panel_id"])
+        if task is None or task.done():
+            self._refills[panel["panel_id"]] = asyncio.create_task(self._refill(panel["panel_id"]), name=f"pool-refill-{panel['panel_id']}")
+
+    async def _refill(self, panel_id: int):
+        stats = self.stats[panel_id]
+        while (wanted := self._wanted.pop(panel_id, None)) is not None:
+            guild, panel = wanted
+            try:
+                await self._fill(guild, panel)
+            except asyncio.CancelledError:
+                raise
+            except discord.Forbidden:
+                log.warning("Missing permissions to refill the channel pool for panel %d", panel_id)
+                return
+            except Exception:
+                log.exception("Failed to refill the channel pool for panel %d", panel_id)
+                return
+        if stats.short_since is not None:
+            stats.lags.append(time.monotonic() - stats.short_since)
+            stats.short_since = None
+
+    async def _fill(self, guild: discord.Guild, panel: dict):
+        panel_id, target = panel["panel_id"], panel.get("pool_size") or 0
+        await self._drop_stale(guild, panel)
+        category = guild.get_channel(panel["category_id"])
+        if category is None:
+            return
+        overwrites = {guild.default_role: discord.PermissionOverwrite(read_messages=False), guild.me: discord.PermissionOverwrite(read_messages=True)}
+        while (current := await self.size(panel_id)) < target:
+            channel = await self.rest.run("channel_create", guild.id, lambda: category.create_text_channel(name=POOL_CHANNEL_NAME, overwrites=overwrites, reason="Ticket channel pool"))
+            await self.db.execute("INSERT INTO channel_pool (channel_id, panel_id, guild_id, created_at) VALUES (?, ?, ?, ?)", (channel.id, panel_id, guild.id, time.time()))
+        for _ in range(current - target):
+            if (channel_id := await self.db.transaction(self._pop, panel_id)) and (channel := guild.get_channel(channel_id)):
+                try:
+                    await self._delete(channel)
+                except BaseException:
+                    # Keep tracking it, so a later refill deletes it.
+                    await self._put_back(guild, panel_id, [channel])
+                    raise
+
+    async def _drop_stale(self, guild: discord.Guild, panel: dict):
+        rows = await self.db.fetchall("SELECT channel_id FROM channel_pool WHERE panel_id = ?", (panel["panel_id"],))
+        for row in rows:
+            channel = guild.get_channel(row["channel_id"])
+            if channel is None or channel.category_id != panel["category_id"]:
+                # The channel goes first: if deleting it fails, its row stays for the next refill.
+                if channel is not None:
+                    await self._delete(channel)
+                await self.db.execute("DELETE FROM channel_pool WHERE channel_id = ?", (row["channel_id"],))
+
+    async def _delete(self, channel: discord.abc.GuildChannel):
+        try:
+            await self.rest.run("channel_delete", channel.id, lambda: channel.delete(reason="Ticket channel pool trimmed"))
+        except discord.NotFound:
+            pass
+
+    async def forget(self, channel_id: int):
+        await self.db.execute("DELETE FROM channel_pool WHERE channel_id = ?", (channel_id,))
+
+    async def close(self):
+        for task in self._refills.values():
+            task.cancel()
+        await asyncio.gather(*self._refills.values(), return_exceptions=True)
+        self._refills.clear()
+
+    # --- Status ---
+    async def status(self, panel: dict) -> dict:
+        stats = self.stats[panel["panel_id"]]
+        task = self._refills.get(panel["panel_id"])
+        return {
+            "size": await self.size(panel["panel_id"]),
+            "target": panel.get("pool_size") or 0,
+            "hits": stats.hits,
+            "misses": stats.misses,
+            "hit_rate": stats.hit_rate,
+            "refilling": task is not None and not task.done(),
+            "last_lag": stats.lags[-1] if stats.lags else None,
+            "avg_lag": sum(stats.lags) / len(stats.lags) if stats.lags else None,
+            "lag_now": time.monotonic() - stats.short_since if stats.short_since is not None else None,
+        }
@@ -0,0 +1,43 @@
+import datetime
+from typing import NamedTuple, Optional
+import discord
+
+# Plain, picklable snapshots of the parts of a message a transcript needs.
+# Transcripts are rendered from these rather than from live discord.Message
+# objects so the same renderer works for Discord history and the local archive.
+
+class AttachmentRecord(NamedTuple):
+    filename: str
+    url: str
+    content_type: Optional[str]
+
+class EmbedRecord(NamedTuple):
+    title: Optional[str]
+    description: Optional[str]
+    fields: tuple  # ((name, value), ...)
+
+class MessageRecord(NamedTuple):
+    id: int
+    channel_id: int
+    author_id: int
+    author_name: str
+    avatar_url: str
+    content: str  # as typed, markdown and <@id> mentions included (see utils/markdown.py)
+    created_at: datetime.datetime
+    edited_at: Optional[datetime.datetime] = None
+    attachments: tuple = ()
+    embeds: tuple = ()
+
+def record_from_message(message: discord.Message) -> MessageRecord:
+    return MessageRecord(
+        id=message.id,
+        channel_id=message.channel.id,
+        author_id=message.author.id,
+        author_name=message.author.display_name,
+        avatar_url=str(message.author.display_avatar.url),
+        content=message.content,
+        created_at=message.created_at,
+        edited_at=message.edited_at,
+        attachments=tuple(AttachmentRecord(a.filename, a.url, a.content_type) for a in message.attachments),
+        embeds=tuple(EmbedRecord(e.title, e.description, tuple((f.name, f.value) for f in e.fields)) for e in message.embeds),
+    )
@@ -0,0 +1,99 @@
+import asyncio
+import collections
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterator, Optional
+from utils.markdown import Mentions
+from utils.records import MessageRecord
+from utils.transcript import CompactRenderer, render_batch
+
+# Renders long transcripts away from the event loop. Fetching stays on the
+# loop: messages arrive as plain MessageRecords, are cut into batches of
+# roughly one chunk of HTML each, and every batch is rendered by
+# transcript.render_batch in a worker. Up to `depth` batches per transcript
+# are in flight while the next ones are fetched; chunks are yielded in order.
+# Everything that needs state or Discord objects happens on the loop, where it
+# is cheap: mentions are resolved (markdown.Mentions) and, for the compact
+# style, the authors whose avatar rule has been emitted, the only state
+# carried from one chunk to the next. Both are sent along with each batch.
+#
+# Transcripts that fit in one chunk, which is most of them, are rendered on
+# the loop as before; shipping them to a worker would cost more than it saves.
+#
+# "process" workers are started with spawn rather than fork: the bot process
+# has database and watchdog threads whose locks a forked child could inherit.
+
+# Markup per message, on top of its text, used to estimate a batch's HTML size.
+MESSAGE_OVERHEAD = 400
+
+def _estimate(message: MessageRecord) -> int:
+    size = len(message.content) + MESSAGE_OVERHEAD
+    for embed in message.embeds:
+        size += len(embed.title or "") + len(embed.description or "") + sum(len(name) + len(value) for name, value in embed.fields)
+    return size + 200 * len(message.attachments)
+
+class RenderPool:
+    def __init__(self, workers: int = 2, kind: str = "process", depth: Optional[int] = None):
+        if kind not in ("process", "thread"):
+            raise ValueError("kind must be 'process' or 'thread'")
+        self.workers = workers
+        self.kind = kind
+        self.depth = depth or workers * 2
+        self._executor: Optional[Executor] = None
+
+    def executor(self) -> Executor:
+        # Started on first use, so processes that never render a long transcript never start workers.
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="transcript-render")
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def render_chunks(self, messages: AsyncIterator[MessageRecord], chunk_size: int, style: str, mentions: Mentions) -> AsyncIterator[tuple[str, int]]:
+        """Same contract as transcript.render_chunks."""
+        loop = asyncio.get_running_loop()
+        authors = CompactRenderer() if style == "compact" else None
+        pending: collections.deque[tuple[asyncio.Future, int]] = collections.deque()
+        submitted = False
+        batch: list[MessageRecord] = []
+        size = 0
+
+        def submit():
+            # Snapshot the classes assigned so far, then assign this batch's new authors.
+            known = dict(authors.authors) if authors else None
+            if authors:
+                for message in batch:
+                    if message.author_id not in authors.authors:
+                        authors.add_author(message.author_id)
+            pending.append((loop.run_in_executor(self.executor(), render_batch, batch, style, known, dict(mentions.names)), batch[-1].id))
+
+        try:
+            async for message in messages:
+                mentions.scan(message)
+                batch.append(message)
+                size += _estimate(message)
+                if size < chunk_size:
+                    continue
+                submit()
+                submitted = True
+                batch, size = [], 0
+                if len(pending) >= self.depth:
+                    future, last_id = pending.popleft()
+                    yield await future, last_id
+            if batch and not submitted:
+                yield render_batch(batch, style, mentions=mentions.names), batch[-1].id
+                return
+            if batch:
+                submit()
+            while pending:
+                future, last_id = pending.popleft()
+                yield await future, last_id
+        finally:
+            for future, _ in pending:
+                future.cancel()
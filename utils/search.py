@@ -0,0 +1,173 @@
+import datetime
+import json
+import re
+import sqlite3
+import unicodedata
+from typing import Iterable, NamedTuple, Optional
+import discord
+from utils.database import Database
+from utils.records import MessageRecord
+
+# Full-text search over closed tickets. ticket_search is an FTS5 table with one
+# row per message, keyed by message id (a snowflake, so rowid order is time
+# order and date filters are rowid ranges). Besides the text, every row has a
+# "scope" column of tokens (g<guild> p<panel> o<owner> t<ticket>) so guild,
+# panel and owner filters are part of the MATCH expression and are answered
+# from the index, not by checking every matching row. search_indexed records
+# which tickets are in the index, for backfill_search.py.
+#
+# Ranking is Okapi BM25 over the message text, computed here rather than with
+# FTS5's bm25(): bm25() counts every term's matches across the whole table
+# before scoring a row (75 ms for a common word at a million messages), and
+# since every match contains every query term, that IDF cannot change the
+# order anyway. Up to CANDIDATES matches are read and ranked by term frequency
+# and message length; equally relevant messages come newest first. Searches with
+# more matches than that rank only the newest CANDIDATES, and say so (see
+# SearchResults.complete). Snippets are made in a second query, for the
+# returned rows only.
+
+# Most matches ranked per search; keeps a search within ~50 ms at 1M messages.
+CANDIDATES = 2000
+
+# Snippets mark matched terms with these; format_snippet turns them into bold.
+HIGHLIGHT = ("\x02", "\x03")
+
+INSERT_SQL = "INSERT INTO ticket_search (rowid, content, scope, ticket_id, author_id) VALUES (?, ?, ?, ?, ?)"
+
+class SearchHit(NamedTuple):
+    message_id: int
+    ticket_id: int
+    author_id: int
+    snippet: str
+
+class SearchResults(NamedTuple):
+    hits: list[SearchHit]
+    # False when more than CANDIDATES messages matched and only the newest were ranked.
+    complete: bool
+
+def _scope(guild_id: int, panel_id: int, owner_id: int, ticket_id: int) -> str:
+    return f"g{guild_id} p{panel_id} o{owner_id} t{ticket_id}"
+
+def _text(record: MessageRecord) -> str:
+    # Embed text and attachment names are searchable too.
+    parts = [record.content]
+    for embed in record.embeds:
+        parts.extend(filter(None, (embed.title, embed.description)))
+        parts.extend(f"{name} {value}" for name, value in embed.fields)
+    parts.extend(a.filename for a in record.attachments)
+    return "\n".join(p for p in parts if p)
+
+def index_row(ticket: dict, record: MessageRecord) -> Optional[tuple]:
+    """The ticket_search row for a message of ``ticket``, or None if it has no text."""
+    text = _text(record)
+    if not text:
+        return None
+    return (record.id, text, _scope(ticket["guild_id"], ticket["panel_id"], ticket["owner_id"], ticket["ticket_id"]), ticket["ticket_id"], record.author_id)
+
+def replace_ticket(conn: sqlite3.Connection, ticket: dict, rows: list[tuple]):
+    """Replace a ticket's indexed messages; call inside a write transaction."""
+    conn.execute("DELETE FROM ticket_search WHERE rowid IN (SELECT rowid FROM ticket_search WHERE ticket_search MATCH ?)", (f"scope:t{ticket['ticket_id']}",))
+    conn.executemany(INSERT_SQL, rows)
+    conn.execute(
+        "INSERT INTO search_indexed (ticket_id, message_count, indexed_at) VALUES (?, ?, strftime('%s', 'now')) "
+        "ON CONFLICT (ticket_id) DO UPDATE SET message_count = excluded.message_count, indexed_at = excluded.indexed_at",
+        (ticket["ticket_id"], len(rows)),
+    )
+
+_TERM = re.compile(r'"([^"]+)"|(\S+)')
+_WORD = re.compile(r"\w+")
+MIN_PREFIX = 3  # shortest prefix with a prefix index (see migration 13)
+
+def _fold(text: str) -> str:
+    # Approximates the unicode61 tokenizer: case and diacritics are ignored.
+    text = text.lower()
+    if text.isascii():
+        return text
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+def _terms(text: str) -> list[tuple[str, bool]]:
+    """``(term, is_prefix)`` pairs from user input: words, "quoted phrases", and word* prefixes."""
+    terms = []
+    for phrase, word in _TERM.findall(text):
+        value = (phrase or word).rstrip("*").replace('"', "").strip()
+        if value:
+            terms.append((value, not phrase and word.endswith("*") and len(value) >= MIN_PREFIX))
+    return terms
+
+def parse_query(text: str) -> Optional[str]:
+    """Turn user input into an FTS5 expression in which every term must match."""
+    terms = _terms(text)
+    return "content:(" + " AND ".join(f'"{value}"' + ("*" if prefix else "") for value, prefix in terms) + ")" if terms else None
+
+def _rank(candidates: list, terms: list[tuple[str, bool]]) -> list:
+    # BM25 term-frequency and length weighting (k1 1.2, b 0.75). Term frequencies
+    # are counted with one regex per query term (a phrase is one term, as in
+    # FTS5) rather than by tokenizing every candidate. Each pattern starts with
+    # the literal word and checks the boundary before it afterwards, so re can
+    # skip ahead to the word instead of testing \b at every position; ranking
+    # 2000 rows takes a few ms.
+    patterns = [
+        re.compile(re.escape(words[0]) + rf"(?<=\b{re.escape(words[0])})" + "".join(r"\W+" + re.escape(word) for word in words[1:]) + (r"" if prefix else r"\b"))
+        for words, prefix in ((_WORD.findall(_fold(value)), prefix) for value, prefix in terms) if words
+    ]
+    if not candidates or not patterns:
+        return candidates
+    texts = [_fold(row["content"]) for row in candidates]
+    lengths = [len(text.split()) for text in texts]
+    average = sum(lengths) / len(texts) or 1
+    scored = []
+    for row, text, length in zip(candidates, texts, lengths):
+        norm = 1.2 * (0.25 + 0.75 * length / average)
+        score = sum(f * 2.2 / (f + norm) for f in (len(pattern.findall(text)) for pattern in patterns))
+        scored.append((score, row["rowid"], row))
+    scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    return [row for _, _, row in scored]
+
+def _search(conn: sqlite3.Connection, match: str, terms: list[tuple[str, bool]], low: int, high: int, limit: int) -> SearchResults:
+    # Matches are found by rowid first, in FTS5's ascending order (two to three
+    # times faster than descending for phrases), and only when there are too
+    # many is the newest CANDIDATES taken instead; text is then read for those.
+    sql = "SELECT rowid FROM ticket_search WHERE ticket_search MATCH ? AND rowid BETWEEN ? AND ? {} LIMIT ?"
+    rowids = [row[0] for row in conn.execute(sql.format(""), (match, low, high, CANDIDATES + 1))]
+    complete = len(rowids) <= CANDIDATES
+    if not complete:
+        rowids = [row[0] for row in conn.execute(sql.format("ORDER BY rowid DESC"), (match, low, high, CANDIDATES))]
+    candidates = conn.execute(
+        "SELECT rowid, content, ticket_id, author_id FROM ticket_search WHERE rowid IN (SELECT value FROM json_each(?))", (json.dumps(rowids),),
+    ).fetchall() if rowids else []
+    best = _rank(candidates, terms)[:limit]
+    if not best:
+        return SearchResults([], complete)
+    placeholders = ", ".join("?" for _ in best)
+    snippets = {row[0]: row[1] for row in conn.execute(
+        f"SELECT rowid, snippet(ticket_search, 0, ?, ?, '…', 16) FROM ticket_search WHERE ticket_search MATCH ? AND rowid IN ({placeholders})",
+        (*HIGHLIGHT, match, *(row["rowid"] for row in best)),
+    )}
+    return SearchResults([SearchHit(row["rowid"], row["ticket_id"], row["author_id"], snippets.get(row["rowid"], "")) for row in best], complete)
+
+async def search(db: Database, guild_id: int, text: str, panel_ids: Optional[Iterable[int]] = None, owner_id: Optional[int] = None, after: Optional[datetime.datetime] = None, before: Optional[datetime.datetime] = None, limit: int = 10) -> SearchResults:
+    """The best ``limit`` matches for ``text`` in a guild, optionally limited to panels, an owner and a date range.
+
+    Only the newest CANDIDATES matches are ranked; ``complete`` is False when there were more.
+    """
+    terms = _terms(text)
+    query = parse_query(text)
+    if query is None:
+        return SearchResults([], True)
+    scope = [f"g{guild_id}"]
+    if panel_ids is not None:
+        panel_ids = list(panel_ids)
+        if not panel_ids:
+            return SearchResults([], True)
+        scope.append("(" + " OR ".join(f"p{p}" for p in panel_ids) + ")")
+    if owner_id is not None:
+        scope.append(f"o{owner_id}")
+    match = f"{query} AND scope:(" + " AND ".join(scope) + ")"
+    low = discord.utils.time_snowflake(after) if after else 0
+    high = discord.utils.time_snowflake(before, high=True) if before else 2 ** 63 - 1
+    # Matching, ranking and snippets all run on a reader thread.
+    return await db.read(_search, match, terms, low, high, limit)
+
+def format_snippet(snippet: str) -> str:
+    """A snippet as Discord markdown: message text escaped, matches in bold."""
+    return discord.utils.escape_mentions(discord.utils.escape_markdown(snippet)).replace(HIGHLIGHT[0], "**").replace(HIGHLIGHT[1], "**").replace("\n", " ")
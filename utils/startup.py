@@ -0,0 +1,73 @@
+import contextlib
+import hashlib
+import json
+import time
+from typing import Optional
+from discord import app_commands
+from utils.database import Database
+
+def tree_fingerprint(tree: app_commands.CommandTree) -> str:
+    # The payload sync() would upload, in a stable order. Any change to a
+    # command's name, description, options or permissions changes the hash.
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands()), key=lambda c: (c.get("type", 1), c["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+async def get_state(db: Database, key: str) -> Optional[str]:
+    row = await db.fetchone("SELECT value FROM bot_state WHERE key = ?", (key,))
+    return row["value"] if row else None
+
+async def set_state(db: Database, key: str, value: str):
+    await db.execute("INSERT INTO bot_state (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, value))
+
+# Wall-clock timings for each phase of startup, from TicketBot construction to
+# the first on_ready. Phases may overlap when they run concurrently, so they
+# do not add up to time_to_ready. Reports are kept in startup_reports so
+# time-to-ready can be compared across deploys.
+class StartupReport:
+    keep = 100
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.extensions: dict[str, float] = {}
+        self.failures: dict[str, str] = {}
+        self.sync: Optional[str] = None
+        self.time_to_ready: Optional[float] = None
+
+    @contextlib.contextmanager
+    def phase(self, name: str, into: Optional[dict] = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            (self.phases if into is None else into)[name] = round(time.perf_counter() - start, 4)
+
+    def ready(self) -> bool:
+        """Record time-to-ready; returns False if it was already recorded (a later on_ready)."""
+        if self.time_to_ready is not None:
+            return False
+        self.time_to_ready = round(time.perf_counter() - self._start, 4)
+        return True
+
+    def as_dict(self) -> dict:
+        return {
+            "started_at": self.started_at,
+            "time_to_ready": self.time_to_ready,
+            "phases": self.phases,
+            "extensions": self.extensions,
+            "failures": self.failures,
+            "sync": self.sync,
+        }
+
+    async def save(self, db: Database, cluster_id: int = 0):
+        def save(conn):
+            conn.execute(
+                "INSERT INTO startup_reports (cluster_id, started_at, time_to_ready, report) VALUES (?, ?, ?, ?)",
+                (cluster_id, self.started_at, self.time_to_ready, json.dumps(self.as_dict())),
+            )
+            conn.execute(
+                "DELETE FROM startup_reports WHERE cluster_id = ? AND report_id NOT IN (SELECT report_id FROM startup_reports WHERE cluster_id = ? ORDER BY report_id DESC LIMIT ?)",
+                (cluster_id, cluster_id, self.keep),
+            )
+        await db.transaction(save)
@@ -0,0 +1,128 @@
+import datetime
+import gzip
+import io
+import json
+import time
+from typing import AsyncIterator, Iterator, Optional
+import discord
+from utils import search
+from utils.database import Database
+from utils.records import AttachmentRecord, EmbedRecord, MessageRecord
+
+# Closed tickets are kept as structured data rather than HTML: one gzipped,
+# line-delimited JSON document per ticket in ticket_archives. The first line
+# describes the ticket; after it come "author" lines (written when an author is
+# first seen or their name/avatar changes) and "message" lines that refer to
+# the author by id. Empty fields are omitted. HTML is rendered from this on
+# demand (utils.transcript.records_transcript_file), so re-rendering old
+# tickets, in any style, needs no Discord API calls, and other tools can read
+# the archive with nothing but gzip and json.
+
+FORMAT = "ticket-archive"
+VERSION = 1
+
+def _message_line(record: MessageRecord) -> dict:
+    line = {"type": "message", "id": record.id, "author": record.author_id}
+    if record.content:
+        line["content"] = record.content
+    if record.edited_at:
+        line["edited_at"] = record.edited_at.isoformat()
+    if record.attachments:
+        line["attachments"] = [list(a) for a in record.attachments]
+    if record.embeds:
+        line["embeds"] = [[e.title, e.description, [list(f) for f in e.fields]] for e in record.embeds]
+    return line
+
+class ArchiveWriter:
+    """Serializes one ticket's messages, in order, into the archive format."""
+    def __init__(self, header: dict):
+        self.buffer = io.BytesIO()
+        self._gzip = gzip.GzipFile(fileobj=self.buffer, mode="wb", mtime=0)
+        self._authors: dict[int, tuple[str, str]] = {}
+        self.message_count = 0
+        self._write({"type": "ticket", "format": FORMAT, "version": VERSION, **header})
+
+    def _write(self, line: dict):
+        self._gzip.write(json.dumps(line, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+
+    def add(self, record: MessageRecord):
+        author = (record.author_name, record.avatar_url)
+        if self._authors.get(record.author_id) != author:
+            self._authors[record.author_id] = author
+            self._write({"type": "author", "id": record.author_id, "name": record.author_name, "avatar_url": record.avatar_url})
+        self._write(_message_line(record))
+        self.message_count += 1
+
+    def finish(self) -> bytes:
+        self._gzip.close()
+        return self.buffer.getvalue()
+
+def read_archive(data: bytes) -> tuple[dict, Iterator[MessageRecord]]:
+    """The ticket header and a lazy iterator over the archived messages."""
+    lines = gzip.GzipFile(fileobj=io.BytesIO(data), mode="rb")
+    header = json.loads(lines.readline())
+    if header.get("format") != FORMAT or header.get("version") != VERSION:
+        raise ValueError(f"Not a version {VERSION} ticket archive")
+
+    def records() -> Iterator[MessageRecord]:
+        authors: dict[int, tuple[str, str]] = {}
+        for raw in lines:
+            line = json.loads(raw)
+            if line["type"] == "author":
+                authors[line["id"]] = (line["name"], line["avatar_url"])
+                continue
+            name, avatar_url = authors[line["author"]]
+            yield MessageRecord(
+                id=line["id"],
+                channel_id=header["channel_id"],
+                author_id=line["author"],
+                author_name=name,
+                avatar_url=avatar_url,
+                content=line.get("content", ""),
+                created_at=discord.utils.snowflake_time(line["id"]),
+                edited_at=datetime.datetime.fromisoformat(line["edited_at"]) if "edited_at" in line else None,
+                attachments=tuple(AttachmentRecord(*a) for a in line.get("attachments", ())),
+                embeds=tuple(EmbedRecord(title, description, tuple(map(tuple, fields))) for title, description, fields in line.get("embeds", ())),
+            )
+    return header, records()
+
+async def aiter_records(records: Iterator[MessageRecord]) -> AsyncIterator[MessageRecord]:
+    # Adapts read_archive's iterator to the async renderer.
+    for record in records:
+        yield record
+
+async def save_ticket_archive(db: Database, ticket: dict, channel_name: str, messages: AsyncIterator[MessageRecord]) -> int:
+    """Serialize ``messages`` as the archive of ``ticket``, replacing any earlier one, and index them for /search.
+
+    Returns the message count.
+    """
+    writer = ArchiveWriter({
+        "ticket_id": ticket["ticket_id"], "guild_id": ticket["guild_id"], "panel_id": ticket["panel_id"],
+        "ticket_num": ticket["ticket_num"], "owner_id": ticket["owner_id"], "channel_id": ticket["channel_id"],
+        "channel_name": channel_name, "archived_at": time.time(),
+    })
+    rows = []
+    async for record in messages:
+        writer.add(record)
+        if (row := search.index_row(ticket, record)):
+            rows.append(row)
+    data = writer.finish()
+
+    def store(conn):
+        conn.execute(
+            """
+            INSERT INTO ticket_archives (ticket_id, guild_id, panel_id, ticket_num, owner_id, channel_id, channel_name, message_count, archived_at, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (ticket_id) DO UPDATE SET
+                channel_name = excluded.channel_name, message_count = excluded.message_count,
+                archived_at = excluded.archived_at, data = excluded.data
+            """,
+            (ticket["ticket_id"], ticket["guild_id"], ticket["panel_id"], ticket["ticket_num"], ticket["owner_id"], ticket["channel_id"], channel_name, writer.message_count, time.time(), data),
+        )
+        search.replace_ticket(conn, ticket, rows)
+    await db.transaction(store)
+    return writer.message_count
+
+async def load_ticket_archive(db: Database, guild_id: int, ticket_num: int) -> Optional[tuple[dict, Iterator[MessageRecord]]]:
+    row = await db.fetchone("SELECT data FROM ticket_archives WHERE guild_id = ? AND ticket_num = ? ORDER BY archived_at DESC LIMIT 1", (guild_id, ticket_num))
+    return read_archive(row["data"]) if row else None
@@ -0,0 +1,182 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import json
+import logging
+import sys
+import time
+from typing import Awaitable, Callable, NamedTuple, Optional
+from utils.cluster import ClusterConfig
+from utils.database import Database
+
+log = logging.getLogger(__name__)
+
+class Timer(NamedTuple):
+    kind: str
+    ticket_id: int
+    guild_id: int
+    channel_id: int
+    due_at: float
+    payload: Optional[dict] = None
+
+TimerHandler = Callable[[Timer], Awaitable[None]]
+
+# Per-ticket deadlines (inactivity auto-close, close request expiry, unclaimed
+# reminders; see cogs/automation.py). Every pending timer is a row in the
+# timers table, so deadlines survive restarts, and an entry in one in-memory
+# min-heap ordered by due time. A single task sleeps until the earliest
+# deadline, so thousands of pending timers cost nothing until one is due: no
+# task per ticket, no periodic scan of the table.
+#
+# At most one timer of each kind exists per ticket; setting it again replaces
+# it. Replaced and cancelled timers are not removed from the heap (that would
+# be a linear search) but skipped when they reach the top, and the heap is
+# rebuilt if such leftovers come to outnumber live timers.
+#
+# A fired timer's row is deleted only after its handler returns, so a timer
+# whose handler was interrupted by a crash fires again on the next start.
+# Handlers run concurrently, up to `concurrency` at a time, which paces the
+# burst of timers that fell due while the bot was offline. Each cluster loads
+# and fires only the timers of the guilds it owns.
+class TimerScheduler:
+    def __init__(self, db: Database, cluster: ClusterConfig = ClusterConfig(), concurrency: int = 8):
+        self.db = db
+        self.cluster = cluster
+        self.concurrency = concurrency
+        self.handlers: dict[str, TimerHandler] = {}
+        self._timers: dict[tuple[str, int], Timer] = {}
+        self._heap: list[tuple[float, int, Timer]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self._running: set[asyncio.Task] = set()
+        self.fired = 0
+        # Seconds between each recent timer's due time and its handler starting.
+        self.lateness: collections.deque[float] = collections.deque(maxlen=100)
+
+    def register(self, kind: str, handler: TimerHandler):
+        self.handlers[kind] = handler
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def get(self, kind: str, ticket_id: int) -> Optional[Timer]:
+        return self._timers.get((kind, ticket_id))
+
+    def _push(self, timer: Timer):
+        self._timers[timer.kind, timer.ticket_id] = timer
+        heapq.heappush(self._heap, (timer.due_at, next(self._seq), timer))
+        if len(self._heap) > 2 * len(self._timers) + 1024:
+            self._heap = [(t.due_at, next(self._seq), t) for t in self._timers.values()]
+            heapq.heapify(self._heap)
+        if self._heap[0][2] is timer:
+            self._wakeup.set()
+
+    async def set(self, kind: str, ticket_id: int, guild_id: int, channel_id: int, due_at: float, payload: Optional[dict] = None) -> Timer:
+        """Arm (or re-arm) the ``kind`` timer of a ticket to fire at ``due_at``."""
+        return (await self.set_many([Timer(kind, ticket_id, guild_id, channel_id, due_at, payload)]))[0]
+
+    async def set_many(self, timers: list[Timer]) -> list[Timer]:
+        await self.db.executemany(
+            "INSERT INTO timers (ticket_id, kind, guild_id, channel_id, due_at, payload) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (ticket_id, kind) DO UPDATE SET guild_id = excluded.guild_id, channel_id = excluded.channel_id, due_at = excluded.due_at, payload = excluded.payload",
+            [(t.ticket_id, t.kind, t.guild_id, t.channel_id, t.due_at, json.dumps(t.payload) if t.payload is not None else None) for t in timers],
+        )
+        for timer in timers:
+            self._push(timer)
+        return timers
+
+    async def cancel(self, ticket_id: int, *kinds: str) -> int:
+        """Cancel a ticket's timers of the given kinds, or all of them."""
+        keys = [(kind, ticket_id) for kind in kinds or self.handlers]
+        cancelled = sum(self._timers.pop(key, None) is not None for key in keys)
+        # Once started, memory mirrors the table for our guilds: nothing pending, nothing to delete.
+        if not cancelled and self._task is not None:
+            return 0
+        if kinds:
+            await self.db.execute(f"DELETE FROM timers WHERE ticket_id = ? AND kind IN ({', '.join('?' for _ in kinds)})", (ticket_id, *kinds))
+        else:
+            await self.db.execute("DELETE FROM timers WHERE ticket_id = ?", (ticket_id,))
+        return cancelled
+
+    # --- Running ---
+    def _load(self, conn) -> list[Timer]:
+        owned, params = self.cluster.sql_filter()
+        cursor = conn.execute(f"SELECT kind, ticket_id, guild_id, channel_id, due_at, payload FROM timers WHERE {owned}", params)
+        # Interned, so the kind strings of every loaded timer are one object.
+        return [Timer(sys.intern(kind), ticket_id, guild_id, channel_id, due_at, json.loads(payload) if payload else None) for kind, ticket_id, guild_id, channel_id, due_at, payload in cursor]
+
+    async def start(self):
+        """Load the pending timers of this cluster's guilds and start firing them."""
+        if self._task is not None:
+            return
+        for timer in await self.db.read(self._load):
+            self._timers[timer.kind, timer.ticket_id] = timer
+        self._heap = [(t.due_at, next(self._seq), t) for t in self._timers.values()]
+        heapq.heapify(self._heap)
+        if self._timers:
+            log.info("Loaded %d pending timer(s)", len(self._timers))
+        self._task = asyncio.create_task(self._run(), name="timer-scheduler")
+
+    async def close(self):
+        tasks = [task for task in (self._task, *self._running) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def _peek(self) -> Optional[Timer]:
+        # Drop replaced and cancelled entries that have reached the top.
+        heap = self._heap
+        while heap and self._timers.get((heap[0][2].kind, heap[0][2].ticket_id)) is not heap[0][2]:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    async def _run(self):
+        while True:
+            timer = self._peek()
+            delay = timer.due_at - time.time() if timer else None
+            if delay is None or delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            del self._timers[timer.kind, timer.ticket_id]
+            await self._slots.acquire()
+            task = asyncio.create_task(self._fire(timer))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, timer: Timer):
+        try:
+            self.fired += 1
+            self.lateness.append(max(0.0, time.time() - timer.due_at))
+            handler = self.handlers.get(timer.kind)
+            if handler is None:
+                log.warning("No handler registered for %s timers; dropping the one for ticket %d", timer.kind, timer.ticket_id)
+            else:
+                await handler(timer)
+        except Exception:
+            log.exception("%s timer for ticket %d failed", timer.kind, timer.ticket_id)
+        finally:
+            self._slots.release()
+        # A handler that re-armed the timer has already replaced the row (and its due time).
+        await self.db.execute("DELETE FROM timers WHERE ticket_id = ? AND kind = ? AND due_at = ?", (timer.ticket_id, timer.kind, timer.due_at))
+
+    def stats(self) -> dict:
+        counts = collections.Counter(kind for kind, _ in self._timers)
+        lateness = sorted(self.lateness)
+        upcoming = self._peek()
+        return {
+            "pending": dict(counts),
+            "next_due": upcoming.due_at if upcoming else None,
+            "fired": self.fired,
+            "running": len(self._running),
+            "lateness_p50": lateness[len(lateness) // 2] if lateness else None,
+            "lateness_max": lateness[-1] if lateness else None,
+        }
@@ -0,0 +1,347 @@
+import asyncio
+import datetime
+import gzip
+import html
+import tempfile
+import time
+import weakref
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Optional
+import discord
+from utils import metrics
+from utils.archive import MessageArchive
+from utils.database import Database
+from utils.markdown import Mentions, render_markdown
+from utils.records import MessageRecord, record_from_message
+
+if TYPE_CHECKING:
+    from utils.render_pool import RenderPool
+
+# Rendered output is buffered and handed to the sink in chunks of roughly this
+# many characters, so memory use does not grow with the length of the ticket.
+CHUNK_SIZE = 64 * 1024
+
+# Transcripts are built in memory; anything larger than this spills to an
+# anonymous, uniquely named temporary file that is removed once it is closed.
+SPILL_THRESHOLD = 8 * 1024 * 1024
+
+CSS = """
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <style>
+        body { font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; background-color: #36393f; color: #dcddde; margin: 0; padding: 20px; }
+        .container { max-width: 800px; margin: auto; }
+        .header { text-align: center; border-bottom: 1px solid #4f545c; padding-bottom: 10px; margin-bottom: 20px; }
+        .header h1 { color: #ffffff; }
+        .message-group { display: flex; margin-bottom: 20px; }
+        .avatar { width: 40px; height: 40px; border-radius: 50%; margin-right: 15px; flex-shrink: 0; }
+        .message-content { display: flex; flex-direction: column; width: 100%; }
+        .author-info { display: flex; align-items: center; margin-bottom: 5px; }
+        .author-name { font-weight: bold; color: #ffffff; }
+        .timestamp { color: #72767d; font-size: 0.75em; margin-left: 10px; }
+        .content { white-space: pre-wrap; word-wrap: break-word; }
+        .embed { border-left: 4px solid #4f545c; background-color: #2f3136; padding: 10px; border-radius: 4px; margin-top: 5px; }
+        .embed-title { font-weight: bold; }
+        .embed-description { font-size: 0.9em; }
+        .embed-field { margin-top: 5px; }
+        .embed-field-name { font-weight: bold; }
+        .attachment img { max-width: 100%; height: auto; border-radius: 4px; margin-top: 5px; }
+        .attachment a { color: #00a8fc; }
+        a { color: #00a8fc; }
+        code { background-color: #2f3136; border-radius: 3px; padding: 0 2px; font-family: Consolas, 'Courier New', monospace; font-size: 0.875em; }
+        pre { background-color: #2f3136; border: 1px solid #202225; border-radius: 4px; padding: 8px; margin: 4px 0; white-space: pre-wrap; }
+        pre code { padding: 0; }
+        blockquote { border-left: 4px solid #4f545c; margin: 0; padding-left: 10px; }
+        .mention { background-color: rgba(88, 101, 242, 0.3); color: #dee0fc; border-radius: 3px; padding: 0 2px; }
+        .spoiler { background-color: #202225; color: transparent; border-radius: 3px; }
+        .spoiler:hover { color: inherit; }
+        .emoji { width: 1.375em; height: 1.375em; vertical-align: bottom; }
+        .ts { background-color: #2f3136; border-radius: 3px; padding: 0 2px; }
+    </style>
+    """
+
+# The "compact" style: consecutive messages from one author are grouped under
+# a single header, each author's avatar is a CSS rule emitted once, and the
+# stylesheet is minified. Same look, a fraction of the bytes on busy tickets.
+COMPACT_CSS = (
+    '<meta charset="UTF-8"><meta name="viewport" content="width=device-width,initial-scale=1">'
+    "<style>body{font-family:'Helvetica Neue',Helvetica,Arial,sans-serif;background:#36393f;color:#dcddde;margin:0;padding:20px}"
+    ".container{max-width:800px;margin:auto}.header{text-align:center;border-bottom:1px solid #4f545c;padding-bottom:10px;margin-bottom:20px}.header h1{color:#fff}"
+    ".g{display:flex;margin-bottom:20px}.av{width:40px;height:40px;border-radius:50%;margin-right:15px;flex-shrink:0;background-size:cover}.g>div{width:100%}"
+    ".g b{color:#fff}time{color:#72767d;font-size:.75em;margin-left:10px}p time{margin:0 8px 0 0}"
+    "p{margin:2px 0;white-space:pre-wrap;word-wrap:break-word}"
+    ".e{border-left:4px solid #4f545c;background:#2f3136;padding:10px;border-radius:4px;margin-top:5px}.e b{display:block}.e div{font-size:.9em;margin-top:5px}"
+    ".at img{max-width:100%;height:auto;border-radius:4px;margin-top:5px}a{color:#00a8fc}"
+    "code,.ts{background:#2f3136;border-radius:3px;padding:0 2px}code{font-family:Consolas,'Courier New',monospace;font-size:.875em}"
+    "pre{background:#2f3136;border:1px solid #202225;border-radius:4px;padding:8px;margin:4px 0;white-space:pre-wrap}pre code{padding:0}"
+    "blockquote{border-left:4px solid #4f545c;margin:0;padding-left:10px}.mention{background:rgba(88,101,242,.3);color:#dee0fc;border-radius:3px;padding:0 2px}"
+    ".spoiler{background:#202225;color:transparent;border-radius:3px}.spoiler:hover{color:inherit}.emoji{width:1.375em;height:1.375em;vertical-align:bottom}</style>"
+)
+
+STYLES = ("full", "compact")
+
+# Messages from the same author less than this far apart share a group, like the Discord client.
+GROUP_WINDOW = datetime.timedelta(minutes=7)
+
+FOOTER = "</div></body></html>"
+
+def header_parts(channel_name: str, style: str = "full") -> tuple[str, str, str]:
+    """The document head in three parts; the middle one, the stylesheet, is the same for every transcript."""
+    return (
+        f"<!DOCTYPE html><html><head><title>Transcript for #{channel_name}</title>",
+        COMPACT_CSS if style == "compact" else CSS,
+        f"</head><body><div class='container'><div class='header'><h1>Transcript for #{channel_name}</h1></div>",
+    )
+
+def render_header(channel_name: str, style: str = "full") -> str:
+    return "".join(header_parts(channel_name, style))
+
+def render_record(message: MessageRecord, mentions: Optional[dict[str, str]] = None) -> str:
+    """One message in the full style; ``mentions`` are display names from markdown.Mentions."""
+    timestamp = message.created_at.strftime('%Y-%m-%d %H:%M:%S UTC')
+    safe_content = render_markdown(message.content, mentions)
+
+    parts = [
+        '<div class="message-group">',
+        f'<img src="{message.avatar_url}" class="avatar">',
+        '<div class="message-content">',
+        f'<div class="author-info"><span class="author-name">{html.escape(message.author_name)}</span> <span class="timestamp">{timestamp}</span></div>',
+    ]
+    if safe_content:
+        parts.append(f'<div class="content">{safe_content}</div>')
+
+    for attachment in message.attachments:
+        if attachment.content_type and attachment.content_type.startswith('image/'):
+            parts.append(f'<div class="attachment"><a href="{attachment.url}" target="_blank"><img src="{attachment.url}" alt="Attachment"></a></div>')
+        else:
+            parts.append(f'<div class="attachment"><a href="{attachment.url}" target="_blank">{html.escape(attachment.filename)}</a></div>')
+
+    for embed in message.embeds:
+        parts.append('<div class="embed">')
+        if embed.title:
+            parts.append(f'<div class="embed-title">{html.escape(embed.title)}</div>')
+        if embed.description:
+            parts.append(f'<div class="embed-description">{render_markdown(embed.description, mentions)}</div>')
+        for name, value in embed.fields:
+            parts.append(f'<div class="embed-field"><div class="embed-field-name">{html.escape(name)}</div><div class="embed-field-value">{render_markdown(value, mentions)}</div></div>')
+        parts.append('</div>')
+
+    parts.append('</div></div>')
+    return "".join(parts)
+
+def _css_string(value: str) -> str:
+    # For a double-quoted CSS string inside <style>, where HTML escapes do not apply.
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("<", "\\3c ").replace("\n", "")
+
+class CompactRenderer:
+    """Renders messages in the compact style; keeps the open group between calls."""
+    def __init__(self, authors: Optional[dict[int, str]] = None, mentions: Optional[dict[str, str]] = None):
+        self.authors: dict[int, str] = dict(authors) if authors else {}  # author id -> CSS class
+        self.mentions = mentions
+        self.last: Optional[MessageRecord] = None
+
+    def render(self, message: MessageRecord) -> str:
+        parts = []
+        last = self.last
+        if last is None or last.author_id != message.author_id or message.created_at - last.created_at > GROUP_WINDOW:
+            if last is not None:
+                parts.append("</div></div>")
+            css_class = self.authors.get(message.author_id)
+            if css_class is None:
+                css_class = self.add_author(message.author_id)
+                parts.append(f'<style>.{css_class} .av{{background-image:url("{_css_string(message.avatar_url)}")}}</style>')
+            parts.append(f'<div class="g {css_class}"><i class="av"></i><div><b>{html.escape(message.author_name)}</b><time>{message.created_at:%Y-%m-%d %H:%M UTC}</time>')
+        self.last = message
+
+        parts.append(f"<p><time>{message.created_at:%H:%M:%S}</time>{render_markdown(message.content, self.mentions)}</p>")
+        for attachment in message.attachments:
+            if attachment.content_type and attachment.content_type.startswith('image/'):
+                parts.append(f'<div class="at"><a href="{attachment.url}" target="_blank"><img src="{attachment.url}" alt="Attachment"></a></div>')
+            else:
+                parts.append(f'<div class="at"><a href="{attachment.url}" target="_blank">{html.escape(attachment.filename)}</a></div>')
+        for embed in message.embeds:
+            parts.append('<div class="e">')
+            if embed.title:
+                parts.append(f'<b>{html.escape(embed.title)}</b>')
+            if embed.description:
+                parts.append(f'<div>{render_markdown(embed.description, self.mentions)}</div>')
+            for name, value in embed.fields:
+                parts.append(f'<div><b>{html.escape(name)}</b>{render_markdown(value, self.mentions)}</div>')
+            parts.append('</div>')
+        return "".join(parts)
+
+    def add_author(self, author_id: int) -> str:
+        # Derived from the id rather than numbered in order of appearance: stored
+        # fragments keep the avatar rules of earlier renders, and a later render
+        # must not give one of their classes to a different author.
+        css_class = self.authors[author_id] = f"u{author_id:x}"
+        return css_class
+
+    def close(self) -> str:
+        """Close the open group, so the output so far is self-contained."""
+        if self.last is None:
+            return ""
+        self.last = None
+        return "</div></div>"
+
+def render_batch(messages: list[MessageRecord], style: str = "full", authors: Optional[dict[int, str]] = None, mentions: Optional[dict[str, str]] = None) -> str:
+    """One self-contained chunk of HTML for ``messages``; a pure function, so it can run in another process.
+
+    For the compact style, ``authors`` are the CSS classes assigned by earlier
+    chunks, whose avatar rules are already in the document. ``mentions`` must
+    cover every mention in ``messages`` (see markdown.Mentions).
+    """
+    if style != "compact":
+        return "".join(render_record(message, mentions) for message in messages)
+    compact = CompactRenderer(authors, mentions)
+    return "".join(map(compact.render, messages)) + compact.close()
+
+async def history_records(channel: discord.TextChannel, after: Optional[int] = None) -> AsyncIterator[MessageRecord]:
+    async for message in channel.history(limit=None, oldest_first=True, after=discord.Object(id=after) if after else None):
+        yield record_from_message(message)
+
+async def render_chunks(messages: AsyncIterator[MessageRecord], chunk_size: int = CHUNK_SIZE, style: str = "full", pool: Optional["RenderPool"] = None, guild: Optional[discord.Guild] = None) -> AsyncIterator[tuple[str, int]]:
+    """Yield ``(html, last_message_id)`` chunks; chunks always end on a message boundary.
+
+    In the compact style every chunk also ends with its last group closed, so
+    chunks can be stored and concatenated on their own. With a ``pool``, long
+    transcripts are rendered off the event loop (see utils/render_pool.py).
+    Mentions are shown with their names in ``guild``.
+    """
+    mentions = Mentions(guild)
+    if pool is not None:
+        async for item in pool.render_chunks(messages, chunk_size, style, mentions):
+            yield item
+        return
+    compact = CompactRenderer(mentions=mentions.names) if style == "compact" else None
+    render = compact.render if compact else lambda message: render_record(message, mentions.names)
+    buffer = []
+    size = 0
+    last_id = None
+    async for message in messages:
+        mentions.scan(message)
+        part = render(message)
+        buffer.append(part)
+        size += len(part)
+        last_id = message.id
+        if size >= chunk_size:
+            if compact:
+                buffer.append(compact.close())
+            yield "".join(buffer), last_id
+            buffer.clear()
+            size = 0
+    if buffer:
+        if compact:
+            buffer.append(compact.close())
+        yield "".join(buffer), last_id
+
+async def stream_records(name: str, messages: AsyncIterator[MessageRecord], write: Callable[[str], Awaitable], chunk_size: int = CHUNK_SIZE, style: str = "full", pool: Optional["RenderPool"] = None, guild: Optional[discord.Guild] = None):
+    """Render a complete transcript titled ``name`` from ``messages`` into ``write``."""
+    for part in header_parts(name, style):
+        await write(part)
+    async for chunk, _ in render_chunks(messages, chunk_size, style, pool, guild):
+        await write(chunk)
+    await write(FOOTER)
+
+async def stream_transcript(channel: discord.TextChannel, write: Callable[[str], Awaitable], messages: Optional[AsyncIterator[MessageRecord]] = None, chunk_size: int = CHUNK_SIZE, style: str = "full", pool: Optional["RenderPool"] = None):
+    """Render the transcript of ``channel`` into ``write`` one chunk at a time."""
+    await stream_records(channel.name, messages if messages is not None else history_records(channel), write, chunk_size, style, pool, channel.guild)
+
+# --- Incremental transcripts ---
+# Each ticket keeps the HTML it has already rendered as numbered fragments. On
+# the next transcript only messages after the checkpoint are read, from the
+# local archive when one is available and from Discord otherwise; they are
+# rendered, appended and stored as new fragments. Messages edited or deleted
+# after they were checkpointed keep their archived form. Fragments rendered in
+# another style are discarded and the ticket is rendered again from the start.
+# Transcripts of one ticket are built one at a time: two overlapping ones
+# would both append after the same checkpoint. The second waits and then
+# reuses what the first stored.
+FRAGMENT_BATCH = 16
+
+# ticket_id -> lock, held only while some transcript of the ticket uses it.
+_fragment_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def _fragment_lock(ticket_id: int) -> asyncio.Lock:
+    lock = _fragment_locks.get(ticket_id)
+    if lock is None:
+        lock = _fragment_locks[ticket_id] = asyncio.Lock()
+    return lock
+
+async def stream_incremental_transcript(channel: discord.TextChannel, write: Callable[[str], Awaitable], db: Database, ticket_id: int, archive: Optional[MessageArchive] = None, chunk_size: int = CHUNK_SIZE, style: str = "full", pool: Optional["RenderPool"] = None):
+    async with _fragment_lock(ticket_id):
+        await db.execute("DELETE FROM transcript_fragments WHERE ticket_id = ? AND EXISTS (SELECT 1 FROM transcript_fragments WHERE ticket_id = ? AND style != ?)", (ticket_id, ticket_id, style))
+        for part in header_parts(channel.name, style):
+            await write(part)
+
+        seq, checkpoint = 0, None
+        while True:
+            rows = await db.fetchall("SELECT seq, last_message_id, html FROM transcript_fragments WHERE ticket_id = ? AND seq > ? ORDER BY seq LIMIT ?", (ticket_id, seq, FRAGMENT_BATCH))
+            for row in rows:
+                await write(row["html"])
+                seq, checkpoint = row["seq"], row["last_message_id"]
+            if len(rows) < FRAGMENT_BATCH:
+                break
+
+        messages = archive.iter_messages(channel, after=checkpoint) if archive else history_records(channel, after=checkpoint)
+        async for chunk, last_id in render_chunks(messages, chunk_size, style, pool, channel.guild):
+            seq += 1
+            await db.execute("INSERT INTO transcript_fragments (ticket_id, seq, last_message_id, html, style) VALUES (?, ?, ?, ?, ?)", (ticket_id, seq, last_id, chunk, style))
+            await write(chunk)
+        await write(FOOTER)
+
+async def _transcript_file(name: str, mode: str, render: Callable[[Callable[[str], Awaitable]], Awaitable], compress: bool, spill_threshold: int, tee: Optional[Callable[[str], Awaitable]] = None) -> discord.File:
+    start = time.perf_counter()
+    buffer = tempfile.SpooledTemporaryFile(max_size=spill_threshold, prefix="transcript-", suffix=".html")
+    sink = gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) if compress else buffer
+
+    async def write(chunk: str):
+        sink.write(chunk.encode("utf-8"))
+        if tee is not None:
+            await tee(chunk)
+
+    try:
+        await render(write)
+        if compress:
+            sink.close()  # flushes the gzip trailer; leaves buffer open
+    except BaseException:
+        buffer.close()
+        raise
+    metrics.TRANSCRIPT_SECONDS.observe(time.perf_counter() - start, mode)
+    metrics.TRANSCRIPT_BYTES.observe(buffer.tell(), mode)
+    buffer.seek(0)
+    filename = f"transcript-{name}.html" + (".gz" if compress else "")
+    # discord.File closes the buffer (and deletes any spilled file) after upload.
+    return discord.File(buffer, filename=filename)
+
+def _check_style(style: str):
+    if style not in STYLES:
+        raise ValueError(f"Unknown transcript style {style!r}")
+
+async def generate_transcript_file(channel: discord.TextChannel, compress: bool = False, spill_threshold: int = SPILL_THRESHOLD, db: Optional[Database] = None, ticket_id: Optional[int] = None, archive: Optional[MessageArchive] = None, style: str = "full", tee: Optional[Callable[[str], Awaitable]] = None, pool: Optional["RenderPool"] = None) -> discord.File:
+    """Render the transcript into an upload-ready ``discord.File``, optionally gzip-compressed.
+
+    When ``db`` and ``ticket_id`` are given the transcript is built incrementally
+    from the ticket's stored fragments plus any messages sent since, read from
+    ``archive`` if given. ``style`` is one of STYLES. Every piece of HTML
+    written is also passed to ``tee`` (see utils/transcript_store.py). Long
+    transcripts are rendered by ``pool`` when one is given.
+    """
+    _check_style(style)
+    if db is not None and ticket_id is not None:
+        return await _transcript_file(channel.name, "incremental", lambda write: stream_incremental_transcript(channel, write, db, ticket_id, archive, style=style, pool=pool), compress, spill_threshold, tee)
+    return await _transcript_file(channel.name, "full", lambda write: stream_transcript(channel, write, style=style, pool=pool), compress, spill_threshold, tee)
+
+async def records_transcript_file(name: str, messages: AsyncIterator[MessageRecord], compress: bool = False, spill_threshold: int = SPILL_THRESHOLD, style: str = "full", pool: Optional["RenderPool"] = None, guild: Optional[discord.Guild] = None) -> discord.File:
+    """Like ``generate_transcript_file``, from already captured messages (e.g. utils/ticket_archive.py).
+
+    Mentions are shown with their names in ``guild``, when given.
+    """
+    _check_style(style)
+    return await _transcript_file(name, "archived", lambda write: stream_records(name, messages, write, style=style, pool=pool, guild=guild), compress, spill_threshold)
+
+async def stored_transcript_file(name: str, chunks: AsyncIterator[str], compress: bool = False, spill_threshold: int = SPILL_THRESHOLD) -> discord.File:
+    """A ``discord.File`` from HTML rendered earlier (e.g. utils/transcript_store.py), without rendering again."""
+    async def render(write):
+        async for chunk in chunks:
+            await write(chunk)
+    return await _transcript_file(name, "stored", render, compress, spill_threshold)
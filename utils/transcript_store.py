@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import AsyncIterator, Optional
+import discord
+from utils.database import Database
+from utils.transcript import stored_transcript_file
+
+log = logging.getLogger(__name__)
+
+# Local copy of every uploaded transcript, so old transcripts are a disk read
+# rather than a search through a Discord channel. The HTML is stored as the
+# pieces the renderer wrote (the head, the stylesheet, one piece per chunk of
+# messages, the footer). Pieces under INLINE_LIMIT bytes are kept in the
+# transcript's manifest; larger ones are zlib-compressed files named by the
+# SHA-256 of their content, so the stylesheet shared by every transcript, and
+# any chunk that did not change when a ticket was closed again, are stored
+# once. transcript_objects counts how many stored transcripts use each file.
+#
+# Disk use is bounded by compact(), run as a recurring job: transcripts older
+# than the retention period are dropped, then the oldest ones until the files
+# still in use fit in max_bytes, then files nothing uses are deleted. A file is
+# only deleted once it has been unused, and untouched on disk, for GRACE
+# seconds, because a transcript being saved may already have written (or
+# found and touched) it without having committed its reference yet.
+
+INLINE_LIMIT = 512
+GRACE = 3600.0
+COMPACT_JOB = "transcript_store_compact"
+COMPACT_INTERVAL = 6 * 3600.0
+
+class StoreWriter:
+    """Collects one transcript as it is rendered; pass ``write`` as the ``tee`` of generate_transcript_file."""
+    def __init__(self, store: "TranscriptStore"):
+        self.store = store
+        self.manifest: list[list[str]] = []
+        self.objects: dict[str, tuple[int, int]] = {}  # hash -> (size, stored size)
+        self.size = 0
+
+    async def write(self, chunk: str):
+        data = chunk.encode("utf-8")
+        self.size += len(data)
+        if len(data) < INLINE_LIMIT:
+            self.manifest.append(["t", chunk])
+            return
+        digest, stored_size = await asyncio.to_thread(self.store._put, data)
+        self.manifest.append(["h", digest])
+        self.objects[digest] = (len(data), stored_size)
+
+def _release(conn, manifest: str, now: float):
+    # Drops one transcript's references to its objects.
+    for digest in {value for kind, value in json.loads(manifest) if kind == "h"}:
+        conn.execute("UPDATE transcript_objects SET refs = refs - 1, released_at = CASE WHEN refs <= 1 THEN ? ELSE released_at END WHERE hash = ?", (now, digest))
+
+class TranscriptStore:
+    def __init__(self, db: Database, root: str, retention_days: float = 0, max_bytes: int = 0, level: int = 6):
+        self.db = db
+        self.root = root
+        self.retention = retention_days * 86400
+        self.max_bytes = max_bytes
+        self.level = level
+
+    def writer(self) -> StoreWriter:
+        return StoreWriter(self)
+
+    # --- Objects (called on worker threads) ---
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest + ".z")
+
+    def _put(self, data: bytes) -> tuple[str, int]:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        try:
+            # Already stored; touching it keeps the sweep away while this transcript is saved.
+            os.utime(path)
+            return digest, os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        compressed = zlib.compress(data, self.level)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp, path)
+        return digest, len(compressed)
+
+    def _get(self, digest: str) -> str:
+        with open(self._path(digest), "rb") as f:
+            return zlib.decompress(f.read()).decode("utf-8")
+
+    def _missing(self, digests: set[str]) -> set[str]:
+        return {digest for digest in digests if not os.path.exists(self._path(digest))}
+
+    # --- Transcripts ---
+    async def save(self, writer: StoreWriter, ticket: dict, name: str, style: str) -> int:
+        """Store the transcript collected by ``writer`` as the copy of ``ticket``, replacing any earlier one."""
+        def store(conn) -> int:
+            now = time.time()
+            for row in conn.execute("SELECT manifest FROM transcript_store WHERE ticket_id = ?", (ticket["ticket_id"],)).fetchall():
+                _release(conn, row["manifest"], now)
+            conn.execute("DELETE FROM transcript_store WHERE ticket_id = ?", (ticket["ticket_id"],))
+            conn.executemany(
+                "INSERT INTO transcript_objects (hash, size, stored_size, refs) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT (hash) DO UPDATE SET refs = refs + 1, released_at = NULL",
+                [(digest, size, stored_size) for digest, (size, stored_size) in writer.objects.items()],
+            )
+            return conn.execute(
+                "INSERT INTO transcript_store (guild_id, panel_id, ticket_id, ticket_num, name, style, size, created_at, manifest) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (ticket["guild_id"], ticket["panel_id"], ticket["ticket_id"], ticket["ticket_num"], name, style, writer.size, now, json.dumps(writer.manifest, separators=(",", ":"))),
+            ).lastrowid
+        return await self.db.transaction(store)
+
+    async def find(self, guild_id: int, ticket_num: int) -> Optional[dict]:
+        row = await self.db.fetchone("SELECT * FROM transcript_store WHERE guild_id = ? AND ticket_num = ? ORDER BY created_at DESC LIMIT 1", (guild_id, ticket_num))
+        return dict(row) if row else None
+
+    async def file(self, transcript: dict, compress: bool = False) -> Optional[discord.File]:
+        """The stored transcript as an upload-ready file, or None if any of its objects is missing from disk."""
+        manifest = json.loads(transcript["manifest"])
+        missing = await asyncio.to_thread(self._missing, {value for kind, value in manifest if kind == "h"})
+        if missing:
+            log.warning("Stored transcript %d is missing %d object(s)", transcript["transcript_id"], len(missing))
+            return None
+
+        async def pieces() -> AsyncIterator[str]:
+            for kind, value in manifest:
+                yield value if kind == "t" else await asyncio.to_thread(self._get, value)
+        return await stored_transcript_file(transcript["name"], pieces(), compress=compress)
+
+    # --- Retention ---
+    async def schedule(self, jobs):
+        """Make sure a compaction job is queued; call once the job queue has started."""
+        if not await self.db.fetchone("SELECT 1 FROM jobs WHERE kind = ? AND status IN ('pending', 'running')", (COMPACT_JOB,)):
+            await jobs.enqueue(COMPACT_JOB, {})
+
+    def _evict(self, conn) -> int:
+        now = time.time()
+        evicted = 0
+        if self.retention:
+            for row in conn.execute("SELECT transcript_id, manifest FROM transcript_store WHERE created_at < ?", (now - self.retention,)).fetchall():
+                _release(conn, row["manifest"], now)
+                conn.execute("DELETE FROM transcript_store WHERE transcript_id = ?", (row["transcript_id"],))
+                evicted += 1
+        if self.max_bytes:
+            used = conn.execute("SELECT COALESCE(SUM(stored_size), 0) FROM transcript_objects WHERE refs > 0").fetchone()[0]
+            while used > self.max_bytes:
+                oldest = conn.execute("SELECT transcript_id, manifest FROM transcript_store ORDER BY created_at LIMIT 100").fetchall()
+                if not oldest:
+                    break
+                for row in oldest:
+                    _release(conn, row["manifest"], now)
+                    conn.execute("DELETE FROM transcript_store WHERE transcript_id = ?", (row["transcript_id"],))
+                    evicted += 1
+                    # Only objects no other transcript uses free any space.
+                    digests = [value for kind, value in json.loads(row["manifest"]) if kind == "h"]
+                    if digests:
+                        used -= conn.execute(
+                            f"SELECT COALESCE(SUM(stored_size), 0) FROM transcript_objects WHERE refs <= 0 AND released_at = ? AND hash IN ({', '.join('?' for _ in digests)})",
+                            (now, *digests),
+                        ).fetchone()[0]
+                    if used <= self.max_bytes:
+                        break
+        return evicted
+
+    def _unreferenced(self, conn, cutoff: float) -> list[str]:
+        digests = [row[0] for row in conn.execute("SELECT hash FROM transcript_objects WHERE refs <= 0 AND released_at < ?", (cutoff,))]
+        conn.executemany("DELETE FROM transcript_objects WHERE hash = ?", [(digest,) for digest in digests])
+        return digests
+
+    def _unlink(self, digests: list[str], cutoff: float) -> tuple[int, int]:
+        removed = freed = 0
+        for digest in digests:
+            path = self._path(digest)
+            try:
+                stat = os.stat(path)
+                # Touched since it was released: a transcript being saved is using it again.
+                if stat.st_mtime >= cutoff:
+                    continue
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += stat.st_size
+        return removed, freed
+
+    def _files(self, cutoff: float) -> tuple[dict[str, str], list[str]]:
+        # Object files and leftover temporary files last modified before cutoff.
+        objects, temporary = {}, []
+        base = os.path.join(self.root, "objects")
+        if not os.path.isdir(base):
+            return objects, temporary
+        for directory in os.scandir(base):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if entry.stat().st_mtime >= cutoff:
+                    continue
+                if entry.name.endswith(".tmp"):
+                    temporary.append(entry.path)
+                elif entry.name.endswith(".z"):
+                    objects[entry.name[:-2]] = entry.path
+        return objects, temporary
+
+    async def compact(self) -> dict:
+        """Apply the retention policy and delete object files no transcript uses."""
+        evicted = await self.db.transaction(self._evict)
+        cutoff = time.time() - GRACE
+        removed, freed = await asyncio.to_thread(self._unlink, await self.db.transaction(self._unreferenced, cutoff), cutoff)
+
+        # Files left behind by saves that never committed (e.g. a crash mid-close).
+        objects, temporary = await asyncio.to_thread(self._files, cutoff)
+        known = set()
+        digests = list(objects)
+        for i in range(0, len(digests), 500):
+            batch = digests[i:i + 500]
+            known.update(row[0] for row in await self.db.fetchall(f"SELECT hash FROM transcript_objects WHERE hash IN ({', '.join('?' for _ in batch)})", batch))
+        orphans, orphan_bytes = await asyncio.to_thread(self._unlink, [digest for digest in digests if digest not in known], cutoff)
+        await asyncio.to_thread(lambda: [os.unlink(path) for path in temporary if os.path.exists(path)])
+
+        result = {"evicted": evicted, "objects_removed": removed + orphans, "bytes_freed": freed + orphan_bytes}
+        if evicted or removed or orphans:
+            log.info("Transcript store compacted: %s", result)
+        return result
+
+    async def stats(self) -> dict:
+        transcripts = await self.db.fetchone("SELECT COUNT(*) AS n, COALESCE(SUM(size), 0) AS size FROM transcript_store")
+        objects = await self.db.fetchone("SELECT COUNT(*) AS n, COALESCE(SUM(stored_size), 0) AS stored FROM transcript_objects WHERE refs > 0")
+        return {
+            "transcripts": transcripts["n"],
+            "objects": objects["n"],
+            "html_bytes": transcripts["size"],
+            "stored_bytes": objects["stored"],
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,231 @@
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+from utils import metrics
+
+log = logging.getLogger(__name__)
+
+# Opt-in (WATCHDOG=1) detector for code that blocks the event loop. A
+# heartbeat task on the loop records when it last ran; a daemon thread checks
+# that timestamp and, once the loop has been stuck for longer than the
+# threshold, captures the loop thread's Python stack and the handler being run
+# by the current task (the command name or view custom_id, from
+# metrics.HANDLERS). The full stall duration is known when the heartbeat runs
+# again, which is when the report is logged. With profiling enabled the same
+# thread also samples the loop thread's stack while a handler is running, so
+# handlers that are slow without ever crossing the threshold show up too.
+
+LOOP_LAG_SECONDS = metrics.REGISTRY.histogram("ticketbot_loop_lag_seconds", "How late the watchdog heartbeat ran; time the event loop was busy.")
+LOOP_STALLS = metrics.REGISTRY.counter("ticketbot_loop_stalls_total", "Event loop stalls longer than the watchdog threshold, by handler.", ("handler",))
+
+STACK_LIMIT = 40
+
+def _frames(frame) -> list[traceback.FrameSummary]:
+    # Innermost STACK_LIMIT frames, outermost first, without the event loop's
+    # own frames (run_forever down to Handle._run) that every stack shares.
+    frames = traceback.StackSummary.extract(traceback.walk_stack(frame), limit=STACK_LIMIT, lookup_lines=True)[::-1]
+    for i in range(len(frames) - 1, -1, -1):
+        if frames[i].name == "_run" and frames[i].filename.endswith(os.path.join("asyncio", "events.py")):
+            return frames[i + 1:]
+    return frames
+
+def _fold(frames: list[traceback.FrameSummary]) -> str:
+    # Collapsed-stack format (outermost first), as read by flamegraph tools.
+    return ";".join(f"{os.path.basename(f.filename)}:{f.name}" for f in frames)
+
+class Profile:
+    """Stack samples for one handler label."""
+    max_stacks = 500
+
+    def __init__(self):
+        self.samples = 0
+        self.stacks: collections.Counter[str] = collections.Counter()
+        self.leaves: collections.Counter[str] = collections.Counter()
+
+    def add(self, frames: list[traceback.FrameSummary]):
+        self.samples += 1
+        if frames:
+            leaf = frames[-1]
+            self.leaves[f"{os.path.basename(leaf.filename)}:{leaf.lineno} {leaf.name}"] += 1
+        folded = _fold(frames)
+        if folded in self.stacks or len(self.stacks) < self.max_stacks:
+            self.stacks[folded] += 1
+
+class LoopWatchdog:
+    def __init__(self, threshold: float = 0.25, interval: float = 0.05, profile: bool = False, sample_interval: float = 0.01, log_path: Optional[str] = None, keep: int = 50):
+        self.threshold = threshold
+        self.interval = interval
+        self.profile = profile
+        self.sample_interval = sample_interval
+        self.log_path = log_path
+        self.stalls: collections.deque[dict] = collections.deque(maxlen=keep)
+        self.profiles: dict[str, Profile] = collections.defaultdict(Profile)
+        self.max_lag = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._beat = time.monotonic()
+        self._pending: Optional[dict] = None  # captured by the thread, finished by the heartbeat
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+        self._handler: Optional[logging.Handler] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["LoopWatchdog"]:
+        if os.getenv("WATCHDOG", "0") != "1":
+            return None
+        return cls(
+            threshold=float(os.getenv("WATCHDOG_THRESHOLD_MS", 250)) / 1000,
+            profile=os.getenv("WATCHDOG_PROFILE", "0") == "1",
+            sample_interval=float(os.getenv("WATCHDOG_SAMPLE_MS", 10)) / 1000,
+            log_path=os.getenv("WATCHDOG_LOG", os.path.join("logs", "watchdog.log")),
+        )
+
+    def start(self):
+        """Start watching the running loop; call from a coroutine on that loop."""
+        if self._task:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        if self.log_path:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            self._handler = logging.FileHandler(self.log_path, encoding="utf-8")
+            self._handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            log.addHandler(self._handler)
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def close(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+        if self._handler:
+            log.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
+
+    # --- Loop side ---
+    async def _heartbeat(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - before - self.interval)
+            self._beat = now
+            LOOP_LAG_SECONDS.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            with self._lock:
+                stall, self._pending = self._pending, None
+            if stall:
+                self._report(stall, lag)
+
+    def _report(self, stall: dict, lag: float):
+        stall["duration"] = lag
+        self.stalls.append(stall)
+        LOOP_STALLS.inc(stall["handler"])
+        log.warning(
+            "Event loop blocked for %.0fms in %s (task %s)\n%s",
+            lag * 1000, stall["handler"], stall["task"], "".join(traceback.format_list(stall["stack"])).rstrip(),
+        )
+
+    # --- Watchdog thread ---
+    def _current(self) -> tuple[Optional[str], Optional[str], list[traceback.FrameSummary]]:
+        """The loop thread's current task name, handler label and stack."""
+        frame = sys._current_frames().get(self._loop_thread)
+        task = asyncio.current_task(self._loop)
+        handler = metrics.HANDLERS.get(task) if task else None
+        return (task.get_name() if task else None), handler, _frames(frame) if frame else []
+
+    def _watch(self):
+        poll = min(self.sample_interval if self.profile else self.interval, self.interval)
+        while not self._stop.wait(poll):
+            try:
+                blocked = time.monotonic() - self._beat - self.interval
+                if blocked > self.threshold:
+                    with self._lock:
+                        if self._pending is None:
+                            self._pending = self._capture(blocked)
+                if self.profile:
+                    self._sample()
+            except Exception:
+                log.exception("Loop watchdog check failed")
+
+    def _capture(self, blocked: float) -> Optional[dict]:
+        task, handler, stack = self._current()
+        if not stack:
+            return None
+        return {
+            "at": time.time(),
+            "detected_after": blocked,
+            "duration": None,
+            # Work outside any task (gateway parsing, transport callbacks) has no handler.
+            "handler": handler or ("task " + task if task else "loop callback"),
+            "task": task,
+            "stack": stack,
+        }
+
+    def _sample(self):
+        task = asyncio.current_task(self._loop)
+        handler = metrics.HANDLERS.get(task) if task else None
+        if handler is None:
+            return
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is not None:
+            frames = _frames(frame)
+            with self._lock:
+                self.profiles[handler].add(frames)
+
+    # --- Reporting ---
+    def summary(self, top: int = 5) -> dict:
+        with self._lock:
+            profiles = sorted(self.profiles.items(), key=lambda item: item[1].samples, reverse=True)[:top]
+            hot = [{
+                "handler": handler,
+                "samples": profile.samples,
+                "seconds": profile.samples * self.sample_interval,
+                "leaves": profile.leaves.most_common(3),
+            } for handler, profile in profiles]
+        return {
+            "threshold": self.threshold,
+            "profile": self.profile,
+            "p50": LOOP_LAG_SECONDS.quantile(0.5),
+            "p99": LOOP_LAG_SECONDS.quantile(0.99),
+            "max": self.max_lag,
+            "stalls": sum(LOOP_STALLS.values.values()),
+            "recent": list(self.stalls)[-top:][::-1],
+            "hot": hot,
+        }
+
+    def dump(self) -> str:
+        """Every retained stall with its full stack, then the folded profile stacks."""
+        lines = []
+        for stall in reversed(self.stalls):
+            at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stall["at"]))
+            lines.append(f"=== {at} blocked {stall['duration'] * 1000:.0f}ms in {stall['handler']} (task {stall['task']})")
+            lines.extend(line.rstrip("\n") for line in traceback.format_list(stall["stack"]))
+            lines.append("")
+        with self._lock:
+            profiles = sorted(((handler, profile.stacks.most_common()) for handler, profile in self.profiles.items()), key=lambda item: -sum(n for _, n in item[1]))
+        if profiles:
+            lines.append(f"=== profile: one sample every {self.sample_interval * 1000:.0f}ms while a handler runs (folded stacks)")
+            for handler, stacks in profiles:
+                lines.extend(f"{handler};{stack} {count}" for stack, count in stacks)
+        return "\n".join(lines) + "\n"